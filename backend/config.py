@@ -4,7 +4,7 @@ Charge toutes les variables d'environnement et fournit une validation automatiqu
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -17,6 +17,26 @@ class Settings(BaseSettings):
     mongodb_url: str
     mongodb_db_name: str
 
+    # Pool de connexions et options du driver MongoDB
+    mongodb_min_pool_size: int = 0
+    mongodb_max_pool_size: int = 50
+    mongodb_max_idle_time_ms: int = 300000  # 5 minutes
+    mongodb_wait_queue_timeout_ms: int = 10000
+    mongodb_compressors: str = ""  # ex: "zstd,snappy,zlib" (zstd/snappy: paquets optionnels)
+    mongodb_analytics_read_preference: str = "secondaryPreferred"
+
+    # Temps maximal d'exécution côté serveur (maxTimeMS) par classe d'opération
+    mongodb_max_time_ms_read: int = 5000
+    mongodb_max_time_ms_analytics: int = 30000
+
+    # Journal des requêtes lentes et détection N+1 (nécessite METRICS_ENABLED)
+    mongodb_slow_query_threshold_ms: int = 200
+    mongodb_n_plus_one_threshold: int = 10  # 0 pour désactiver
+
+    # Création des index au démarrage: background (tâche de fond), blocking ou off ;
+    # ignorée si le manifeste des index n'a pas changé depuis la dernière création
+    mongodb_index_creation: str = "background"
+
     # Configuration JWT
     jwt_secret_key: str
     jwt_algorithm: str = "HS256"
@@ -30,6 +50,11 @@ class Settings(BaseSettings):
     sendgrid_api_key: str = ""
     sendgrid_from_email: str = "noreply@sap.ht"
     sendgrid_from_name: str = "Système d'Alerte Précoce"
+    sendgrid_api_url: str = "https://api.sendgrid.com/v3/mail/send"
+
+    # Passerelle SMS HTTP (POST {"to", "message"}), ex: sentinelles
+    sms_gateway_url: str = ""
+    sms_gateway_token: str = ""
 
     # Configuration Application
     app_env: str = "development"
@@ -37,17 +62,127 @@ class Settings(BaseSettings):
     app_host: str = "0.0.0.0"
     app_port: int = 8000
 
+    # Sondes de santé : ping MongoDB en tâche de fond, état en cache
+    health_check_interval_seconds: int = 10  # 0 = ping à chaque appel de /health
+    health_check_timeout_ms: int = 2000
+    health_pool_saturation: float = 0.9  # Utilisation du pool (avec attente) rendant le worker indisponible
+    health_queue_saturation: float = 0.8  # Remplissage de la file d'audit rendant le worker indisponible
+
+    # Lanceur de production (python -m backend.server)
+    server_workers: int = 0  # 0 = nombre de CPU disponibles (quota cgroup compris)
+    server_max_workers: int = 8  # Plafond du calcul automatique
+    server_loop: str = "auto"  # auto (uvloop si installé) | uvloop | asyncio
+    server_http: str = "auto"  # auto (httptools si installé) | httptools | h11
+    server_max_requests: int = 10000  # Recyclage d'un worker après N requêtes (0 = jamais)
+    server_max_requests_jitter: int = 1000  # Écart aléatoire pour ne pas recycler tous les workers ensemble
+    server_graceful_timeout_seconds: int = 30  # Attente des requêtes en cours à l'arrêt
+    server_keep_alive_seconds: int = 5
+
     # Configuration CORS
     cors_origins: str = "http://localhost:3000,http://localhost:8000,http://127.0.0.1:3000,https://sap-minimaliste.vercel.app,https://*.vercel.app"
 
+    # Configuration de la compression des réponses HTTP
+    gzip_minimum_size: int = 1000  # Taille minimale (octets) avant compression
+    gzip_compresslevel: int = 6
+
+    # Configuration de l'instrumentation (métriques Prometheus sur /metrics)
+    metrics_enabled: bool = True
+
     # Configuration des Tâches Planifiées
     scheduler_enabled: bool = True
     alert_calculation_hour: int = 2
+    scheduler_timezone: str = "America/Port-au-Prince"
+    scheduler_lock_ttl_seconds: int = 3600  # Expiration du verrou d'une tâche
+    scheduler_runs_retention_days: int = 90  # Historique des exécutions
+    rollup_refresh_days: int = 7  # Jours d'agrégats journaliers recalculés
+    alert_stale_days: int = 14  # Résolution des alertes sans collecte récente
 
     # Configuration des Seuils d'Alerte (en pourcentage)
     alert_threshold_surveillance: int = 15
     alert_threshold_alerte: int = 30
     alert_threshold_urgence: int = 50
+    # Intervalle de vérification des surcharges de seuils modifiées par un autre worker
+    thresholds_refresh_seconds: int = 30
+
+    # Détection des anomalies de prix : mode par type d'alerte
+    # (seuils | robuste | saisonnier), ex: "prix_eleve:saisonnier"
+    alert_detection_modes: str = "prix_eleve:seuils"
+    anomaly_window_days: int = 30  # Fenêtre glissante médiane/MAD
+    anomaly_min_observations: int = 8  # Jours collectés minimum dans la fenêtre
+    anomaly_history_days: int = 1100  # Historique chargé pour le mode saisonnier
+    # Scores z par niveau (calibrés par backtest sur séries simulées)
+    anomaly_z_surveillance: float = 3.5
+    anomaly_z_alerte: float = 5.0
+    anomaly_z_urgence: float = 7.0
+
+    # Prévisions de prix (lissage exponentiel par produit × département)
+    forecast_horizon_weeks: int = 13  # 3 mois
+    forecast_history_days: int = 1100
+    forecast_min_weeks: int = 26  # Semaines observées minimum pour prévoir
+    forecast_refit_days: int = 28  # Âge maximal des paramètres avant réajustement
+    forecast_workers: int = 2  # Processus d'ajustement
+
+    # Cache du tableau de bord (secondes, 0 pour désactiver)
+    dashboard_cache_ttl_seconds: int = 30
+    # Cache des statistiques /statistiques/resume (secondes, 0 pour désactiver)
+    statistics_cache_ttl_seconds: int = 60
+    # Propagation des invalidations de cache entre workers (secondes, 0 = locale)
+    cache_sync_seconds: int = 2
+
+    # Flux temps réel des alertes (Server-Sent Events, GET /api/alertes/flux)
+    alert_stream_source: str = "local"  # local | change_stream (replica set requis)
+    alert_stream_heartbeat_seconds: int = 15
+    alert_stream_retry_ms: int = 5000  # Délai de reconnexion suggéré aux clients
+    alert_stream_buffer_size: int = 5000  # Événements gardés pour la reprise (Last-Event-ID)
+    alert_stream_queue_size: int = 1000  # File par client avant déconnexion d'un client lent
+    alert_stream_max_clients: int = 10000  # Par worker
+    alert_stream_ticket_seconds: int = 30  # Validité d'un ticket de connexion (usage unique)
+
+    # Notifications des alertes (boîte d'envoi notifications_outbox)
+    notifications_enabled: bool = True  # Canaux activés par leur configuration
+    notification_roles: str = "décideur,bailleur"
+    notification_email_min_niveau: str = "alerte"
+    notification_sms_min_niveau: str = "urgence"
+    notification_webhook_urls: str = ""
+    notification_digest_seconds: int = 300  # Fenêtre de regroupement par destinataire
+    notification_urgent_digest_seconds: int = 30  # Fenêtre si le résumé contient une urgence
+    notification_workers: int = 8  # Envois simultanés par processus
+    notification_poll_seconds: float = 5
+    notification_lease_seconds: int = 120  # Reprise d'un envoi interrompu
+    notification_max_attempts: int = 6
+    notification_retry_base_seconds: int = 30  # Délai exponentiel : 30 s, 1 min, 2 min...
+    notification_max_per_hour: int = 6  # Par destinataire et par canal (0 = illimité)
+    notification_channel_rate_per_second: float = 10  # Par canal et par processus
+    notification_http_timeout_seconds: float = 10
+    notification_retention_days: int = 30
+
+    # Écriture différée des logs d'audit (file mémoire, insert_many par lots)
+    audit_buffer_enabled: bool = True
+    audit_queue_size: int = 10000  # Au-delà, débordement sur disque
+    audit_batch_size: int = 500
+    audit_flush_ms: int = 200
+    audit_spill_dir: str = "data/audit_spill"  # Lots non écrits si MongoDB est injoignable
+    # Rétention des logs d'audit (purge des mois archivés, 0 = conservés indéfiniment) et archives mensuelles
+    audit_retention_days: int = 180
+    audit_archive_storage: str = "gridfs"  # gridfs (MongoDB, durable) | local (AUDIT_ARCHIVE_DIR)
+    audit_archive_dir: str = "data/audit_archive"
+    audit_archive_format: str = "ndjson"  # ndjson (gzip) | parquet (pyarrow requis)
+
+    # Limitation de débit des connexions (fenêtre glissante, 0 = règle désactivée)
+    rate_limit_enabled: bool = True
+    rate_limit_store: str = "memory"  # memory (par processus) | mongodb (partagé entre workers)
+    rate_limit_max_keys: int = 100000  # Clés suivies en mémoire
+    login_rate_limit_window_seconds: int = 300
+    login_rate_limit_ip: int = 30  # Tentatives par IP et par fenêtre
+    login_rate_limit_email: int = 10  # Tentatives par email et par fenêtre
+    mfa_rate_limit_ip: int = 10  # Vérifications MFA par IP et par fenêtre
+    mfa_rate_limit_user: int = 5  # Vérifications MFA par utilisateur et par fenêtre
+    # Proxies de confiance devant l'API (X-Forwarded-For ; 0 = connexion directe, Render = 1)
+    trusted_proxy_count: int = 0
+
+    # Révocation des tokens (liste en mémoire synchronisée depuis revoked_tokens)
+    token_revocation_refresh_seconds: int = 5  # Délai de propagation entre workers
+    token_revocation_rebuild_seconds: int = 3600  # Reconstruction (retrait des entrées expirées)
 
     class Config:
         env_file = ".env"
@@ -58,6 +193,31 @@ class Settings(BaseSettings):
         """Convertir la chaîne CORS_ORIGINS en liste"""
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
+    @property
+    def mongodb_compressors_list(self) -> List[str]:
+        """Convertir la chaîne MONGODB_COMPRESSORS en liste"""
+        return [c.strip() for c in self.mongodb_compressors.split(",") if c.strip()]
+
+    @property
+    def notification_roles_list(self) -> List[str]:
+        """Convertir la chaîne NOTIFICATION_ROLES en liste"""
+        return [r.strip() for r in self.notification_roles.split(",") if r.strip()]
+
+    @property
+    def notification_webhook_urls_list(self) -> List[str]:
+        """Convertir la chaîne NOTIFICATION_WEBHOOK_URLS en liste"""
+        return [u.strip() for u in self.notification_webhook_urls.split(",") if u.strip()]
+
+    @property
+    def alert_detection_modes_map(self) -> Dict[str, str]:
+        """Convertir ALERT_DETECTION_MODES ("type:mode,...") en dictionnaire"""
+        modes = {}
+        for item in self.alert_detection_modes.split(","):
+            if ":" in item:
+                type_alerte, mode = item.split(":", 1)
+                modes[type_alerte.strip()] = mode.strip()
+        return modes
+
     @property
     def is_production(self) -> bool:
         """Vérifier si l'environnement est en production"""
@@ -4,10 +4,19 @@ Fournit une instance singleton de la base de données.
 """
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+from bson import ObjectId, json_util
+from pymongo import IndexModel
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+import asyncio
+import hashlib
+import json
 import logging
+import time
 
 from backend.config import settings
+from backend.services.mongo_monitoring import pool_stats, command_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -18,37 +27,78 @@ class Database:
     """
     client: Optional[AsyncIOMotorClient] = None
     db: Optional[AsyncIOMotorDatabase] = None
+    analytics_db: Optional[AsyncIOMotorDatabase] = None
+
+
+# Classes d'opération -> maxTimeMS appliqué côté serveur
+MAX_TIME_MS = {
+    "read": settings.mongodb_max_time_ms_read,
+    "analytics": settings.mongodb_max_time_ms_analytics,
+}
 
 
 # Instance globale
 database = Database()
 
+# Document de config_versions mémorisant l'empreinte des index créés
+INDEX_MANIFEST_ID = "index_manifest"
+
+# Création des index en cours (tâche de fond lancée par connect_to_mongo)
+_index_task: Optional[asyncio.Task] = None
+
+# État de la dernière création des index (exposé par /internal/db/pool)
+index_status: dict = {"etat": "en_attente"}
+
 
 async def connect_to_mongo() -> None:
     """
     Établir la connexion à MongoDB au démarrage de l'application.
     Lève une exception si la connexion échoue.
     """
+    global _index_task
     try:
         logger.info(f"Connexion à MongoDB: {settings.mongodb_url}")
 
+        client_options = {
+            "serverSelectionTimeoutMS": 5000,  # Timeout de 5 secondes
+            "connectTimeoutMS": 5000,
+            "minPoolSize": settings.mongodb_min_pool_size,
+            "maxPoolSize": settings.mongodb_max_pool_size,
+            "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+            "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms,
+            "event_listeners": [pool_stats, command_metrics],
+        }
+        if settings.mongodb_compressors_list:
+            client_options["compressors"] = settings.mongodb_compressors_list
+
         # Créer le client Motor
-        database.client = AsyncIOMotorClient(
-            settings.mongodb_url,
-            serverSelectionTimeoutMS=5000,  # Timeout de 5 secondes
-            connectTimeoutMS=5000
-        )
+        database.client = AsyncIOMotorClient(settings.mongodb_url, **client_options)
 
         # Sélectionner la base de données
         database.db = database.client[settings.mongodb_db_name]
 
+        # Vue de la base pour les lectures analytiques (secondaires tolérés)
+        database.analytics_db = database.client.get_database(
+            settings.mongodb_db_name,
+            read_preference=make_read_preference(
+                read_pref_mode_from_name(settings.mongodb_analytics_read_preference),
+                None
+            )
+        )
+
         # Ping pour vérifier la connexion
         await database.client.admin.command('ping')
 
         logger.info(f"✅ Connecté à MongoDB: {settings.mongodb_db_name}")
 
-        # Créer les index au démarrage
-        await create_indexes()
+        # Créer les index au démarrage, sans retarder l'ouverture du service
+        # (les index uniques existent déjà hors premier démarrage)
+        if settings.mongodb_index_creation == "background":
+            _index_task = asyncio.create_task(create_indexes())
+        elif settings.mongodb_index_creation == "blocking":
+            await create_indexes()
+        else:
+            index_status["etat"] = "desactive"
 
     except Exception as e:
         logger.error(f"❌ Erreur de connexion à MongoDB: {e}")
@@ -59,6 +109,11 @@ async def close_mongo_connection() -> None:
     """
     Fermer proprement la connexion MongoDB au shutdown de l'application.
     """
+    global _index_task
+    if _index_task is not None:
+        _index_task.cancel()
+        await asyncio.gather(_index_task, return_exceptions=True)
+        _index_task = None
     try:
         if database.client:
             database.client.close()
@@ -67,69 +122,214 @@ async def close_mongo_connection() -> None:
         logger.error(f"Erreur lors de la fermeture de MongoDB: {e}")
 
 
-async def create_indexes() -> None:
+def index_manifest() -> Dict[str, List[IndexModel]]:
     """
-    Créer les index MongoDB nécessaires pour les performances.
-    Appelé automatiquement au démarrage.
-    """
-    try:
-        db = get_database()
-
-        # Index pour la collection users
-        await db.users.create_index("email", unique=True)
-        await db.users.create_index("role")
-
-        # Index pour la collection collectes_prix
-        await db.collectes_prix.create_index("marche_id")
-        await db.collectes_prix.create_index("produit_id")
-        await db.collectes_prix.create_index("date")
-        await db.collectes_prix.create_index("agent_id")
-        await db.collectes_prix.create_index("statut")
-        await db.collectes_prix.create_index("periode")
-
-        # Index pour la collection audit_logs
-        await db.audit_logs.create_index("user_id")
-        await db.audit_logs.create_index("timestamp")
-        await db.audit_logs.create_index("action")
-
-        # Index pour la collection produits
-        await db.produits.create_index("code", unique=True)
-        await db.produits.create_index("actif")
-
-        # Index pour la collection marches
-        await db.marches.create_index("code", unique=True)
-        await db.marches.create_index("commune_id")
-        await db.marches.create_index("actif")
-        # Index géospatial pour la recherche par proximité
-        await db.marches.create_index([("location", "2dsphere")])
+    Index MongoDB nécessaires pour les performances, par collection.
 
-        # Index pour la collection unites_mesure
-        await db.unites_mesure.create_index("unite", unique=True)
-
-        # Index pour la collection categories_produit
-        await db.categories_produit.create_index("nom")
+    Returns:
+        Dict {collection: index à créer}
+    """
+    from backend.services.audit_archive import audit_indexes
+    from backend.services.rate_limit import rate_limit_indexes
+    from backend.services.token_revocation import revocation_indexes
+    from backend.services.alert_stream import ticket_indexes
+
+    manifeste = {
+        "users": [
+            IndexModel("email", unique=True),
+            IndexModel("role"),
+        ],
+        "collectes_prix": [
+            IndexModel("marche_id"),
+            IndexModel("produit_id"),
+            IndexModel("date"),
+            IndexModel("agent_id"),
+            IndexModel("statut"),
+            IndexModel("periode"),
+            # Collectes modifiées depuis la dernière prévision (services.forecasting)
+            IndexModel("created_at"),
+            IndexModel("updated_at", sparse=True),
+        ],
+        # Index composés (sans TTL, purge par archivage), voir services.audit_archive
+        "audit_logs": audit_indexes(),
+        "audit_archives": [IndexModel("debut")],
+        "produits": [
+            IndexModel("code", unique=True),
+            IndexModel("actif"),
+        ],
+        "marches": [
+            IndexModel("code", unique=True),
+            IndexModel("commune_id"),
+            IndexModel("actif"),
+            # Multikey : marchés proposant un produit
+            IndexModel("produits.id_produit"),
+            # Index géospatial pour la recherche par proximité
+            IndexModel([("location", "2dsphere")]),
+        ],
+        "unites_mesure": [IndexModel("unite", unique=True)],
+        "categories_produit": [IndexModel("nom")],
+        "categories_user": [IndexModel("nom")],
+        "permissions": [IndexModel([("nom", 1), ("action", 1)], unique=True)],
+        "roles": [IndexModel("nom", unique=True)],
+        "departements": [
+            IndexModel("code", unique=True),
+            IndexModel("actif"),
+        ],
+        "communes": [
+            IndexModel("code", unique=True),
+            IndexModel("departement_id"),
+            IndexModel("actif"),
+        ],
+        "alertes": [
+            # Recherche de l'alerte active d'un couple
+            IndexModel([("statut", 1), ("marche_id", 1), ("produit_id", 1)]),
+            # Une seule alerte active par couple (upserts concurrents des workers)
+            IndexModel(
+                [("marche_id", 1), ("produit_id", 1), ("statut", 1)],
+                name="alerte_active_unique",
+                unique=True,
+                partialFilterExpression={"statut": "active"}
+            ),
+        ],
+        # Surcharges de seuils d'alerte (une par catégorie ou produit)
+        "seuils_alertes": [IndexModel([("portee", 1), ("cible_id", 1)], unique=True)],
+        # Prévisions de prix en cache (_id = "produit_id:departement_id")
+        "previsions_prix": [IndexModel([("produit_id", 1), ("departement_id", 1)])],
+        # Agrégats journaliers (_id = marché, produit, unité, jour) lus par
+        # l'historique des anomalies, rafraîchis par fenêtre de jours
+        "prix_journaliers": [IndexModel([("_id.date", 1), ("_id.produit_id", 1)])],
+        # Historique des tâches planifiées (purgé après la période de rétention)
+        "scheduler_runs": [
+            IndexModel([("job", 1), ("started_at", -1)]),
+            IndexModel(
+                "started_at",
+                name="started_at_ttl",
+                expireAfterSeconds=settings.scheduler_runs_retention_days * 86400
+            ),
+        ],
+        # Tokens révoqués (purgés à l'expiration des tokens)
+        "revoked_tokens": revocation_indexes(),
+        "stream_tickets": ticket_indexes(),
+        # Compteurs partagés du limiteur de débit (RATE_LIMIT_STORE=mongodb)
+        "rate_limits": rate_limit_indexes(),
+        # Boîte d'envoi des notifications : un seul résumé ouvert par
+        # destinataire et canal, messages dus, limite horaire, purge
+        "notifications_outbox": [
+            IndexModel(
+                [("canal", 1), ("adresse", 1)],
+                name="resume_ouvert_unique",
+                unique=True,
+                partialFilterExpression={"statut": "en_attente"}
+            ),
+            IndexModel([("statut", 1), ("prochain_essai", 1)]),
+            IndexModel([("canal", 1), ("adresse", 1), ("envoye_at", -1)]),
+            IndexModel(
+                "termine_at",
+                name="termine_at_ttl",
+                expireAfterSeconds=settings.notification_retention_days * 86400
+            ),
+        ],
+    }
+    return {nom: modeles for nom, modeles in manifeste.items() if modeles}
+
+
+def empreinte_manifeste(manifeste: Dict[str, List[IndexModel]]) -> str:
+    """Empreinte SHA-256 des spécifications d'index (clés, noms et options)"""
+    specifications = {
+        nom: [json_util.dumps(modele.document, sort_keys=True) for modele in modeles]
+        for nom, modeles in sorted(manifeste.items())
+    }
+    return hashlib.sha256(json.dumps(specifications, sort_keys=True).encode()).hexdigest()
+
+
+async def _dedoublonner_alertes_actives() -> int:
+    """
+    Résoudre les alertes actives en double d'un même couple (marché, produit),
+    créées avant l'index unique : la plus récente est gardée.
+    """
+    collection = get_collection("alertes")
+    doublons = await collection.aggregate([
+        {"$match": {"statut": "active"}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {"_id": {"marche_id": "$marche_id", "produit_id": "$produit_id"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ]).to_list(None)
+    a_resoudre = [alerte_id for groupe in doublons for alerte_id in groupe["ids"][1:]]
+    if a_resoudre:
+        maintenant = datetime.utcnow()
+        await collection.update_many(
+            {"_id": {"$in": a_resoudre}},
+            {"$set": {"statut": "resolue", "doublon": True, "resolved_at": maintenant, "updated_at": maintenant}}
+        )
+        logger.warning(f"⚠️  {len(a_resoudre)} alerte(s) active(s) en double résolue(s)")
+    return len(a_resoudre)
 
-        # Index pour la collection categories_user
-        await db.categories_user.create_index("nom")
 
-        # Index pour la collection permissions
-        await db.permissions.create_index([("nom", 1), ("action", 1)], unique=True)
+async def _creer_index_collection(nom: str, modeles: List[IndexModel]) -> None:
+    """Un seul createIndexes par collection (construits en une passe)"""
+    if nom == "audit_logs":
+        # Migration du TTL et des index remplacés, voir services.audit_archive
+        from backend.services.audit_archive import create_audit_indexes
+        await create_audit_indexes(modeles)
+    elif nom == "alertes":
+        await _dedoublonner_alertes_actives()
+        await get_collection(nom).create_indexes(modeles)
+    else:
+        await get_collection(nom).create_indexes(modeles)
 
-        # Index pour la collection roles
-        await db.roles.create_index("nom", unique=True)
 
-        # Index pour la collection departements
-        await db.departements.create_index("code", unique=True)
-        await db.departements.create_index("actif")
+async def create_indexes(force: bool = False) -> None:
+    """
+    Créer les index MongoDB nécessaires pour les performances.
 
-        # Index pour la collection communes
-        await db.communes.create_index("code", unique=True)
-        await db.communes.create_index("departement_id")
-        await db.communes.create_index("actif")
+    Appelé au démarrage (en tâche de fond, voir MONGODB_INDEX_CREATION).
+    Les collections sont traitées en parallèle ; rien n'est envoyé au
+    serveur si l'empreinte du manifeste est celle de la dernière création
+    réussie.
 
-        logger.info("✅ Index MongoDB créés avec succès")
+    Args:
+        force: Recréer même si le manifeste n'a pas changé
+    """
+    debut = time.perf_counter()
+    index_status.update(etat="en_cours", erreurs={})
+    try:
+        db = get_database()
+        manifeste = index_manifest()
+        empreinte = empreinte_manifeste(manifeste)
+
+        if not force:
+            dernier = await db.config_versions.find_one({"_id": INDEX_MANIFEST_ID})
+            if dernier and dernier.get("empreinte") == empreinte:
+                index_status.update(etat="inchange", empreinte=empreinte,
+                                    duree_ms=round((time.perf_counter() - debut) * 1000, 1))
+                logger.info("✅ Index MongoDB à jour (manifeste inchangé)")
+                return
+
+        noms = list(manifeste)
+        resultats = await asyncio.gather(
+            *(_creer_index_collection(nom, manifeste[nom]) for nom in noms),
+            return_exceptions=True
+        )
+        erreurs = {nom: str(r) for nom, r in zip(noms, resultats) if isinstance(r, Exception)}
+        duree_ms = round((time.perf_counter() - debut) * 1000, 1)
+
+        if erreurs:
+            # Empreinte non enregistrée : nouvelle tentative au prochain démarrage
+            index_status.update(etat="erreur", empreinte=empreinte, duree_ms=duree_ms, erreurs=erreurs)
+            for nom, erreur in erreurs.items():
+                logger.warning(f"⚠️  Erreur lors de la création des index de {nom}: {erreur}")
+            return
+
+        await db.config_versions.update_one(
+            {"_id": INDEX_MANIFEST_ID},
+            {"$set": {"empreinte": empreinte, "collections": noms, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        index_status.update(etat="a_jour", empreinte=empreinte, duree_ms=duree_ms)
+        logger.info(f"✅ Index MongoDB créés avec succès ({len(noms)} collections, {duree_ms} ms)")
 
     except Exception as e:
+        index_status.update(etat="erreur", erreurs={"*": str(e)})
         logger.warning(f"⚠️  Erreur lors de la création des index: {e}")
 
 
@@ -151,6 +351,58 @@ def get_database() -> AsyncIOMotorDatabase:
     return database.db
 
 
+def get_analytics_database() -> AsyncIOMotorDatabase:
+    """
+    Obtenir la base de données configurée pour les lectures analytiques.
+    Utilise MONGODB_ANALYTICS_READ_PREFERENCE (secondaryPreferred par défaut)
+    afin de décharger le primaire des agrégations de statistiques.
+
+    Returns:
+        AsyncIOMotorDatabase: Instance avec la préférence de lecture analytique
+
+    Raises:
+        RuntimeError: Si la connexion n'est pas établie
+    """
+    if database.analytics_db is None:
+        return get_database()
+    return database.analytics_db
+
+
+def max_time_ms(operation_class: str = "read") -> int:
+    """
+    Obtenir le maxTimeMS configuré pour une classe d'opération.
+
+    Args:
+        operation_class: "read" (listes, lookups) ou "analytics" (agrégations)
+
+    Returns:
+        Durée maximale en millisecondes
+    """
+    return MAX_TIME_MS.get(operation_class, settings.mongodb_max_time_ms_read)
+
+
+def get_pool_stats() -> dict:
+    """
+    Obtenir les statistiques d'utilisation du pool de connexions.
+
+    Returns:
+        dict: Configuration du pool et état par serveur
+    """
+    return {
+        "config": {
+            "min_pool_size": settings.mongodb_min_pool_size,
+            "max_pool_size": settings.mongodb_max_pool_size,
+            "max_idle_time_ms": settings.mongodb_max_idle_time_ms,
+            "wait_queue_timeout_ms": settings.mongodb_wait_queue_timeout_ms,
+            "compressors": settings.mongodb_compressors_list,
+            "analytics_read_preference": settings.mongodb_analytics_read_preference,
+            "max_time_ms": MAX_TIME_MS,
+        },
+        "index": index_status,
+        "servers": pool_stats.snapshot()
+    }
+
+
 async def ping_database() -> bool:
     """
     Vérifier que la connexion à MongoDB est active.
@@ -183,6 +435,35 @@ def get_collection(collection_name: str):
     return db[collection_name]
 
 
+async def find_by_ids(
+    collection_name: str,
+    ids: Iterable[Optional[str]],
+    projection: Optional[dict] = None
+) -> Dict[str, dict]:
+    """
+    Récupérer plusieurs documents par leurs IDs en une seule requête ($in).
+    Remplace les find_one répétés dans les boucles d'enrichissement.
+
+    Args:
+        collection_name: Nom de la collection
+        ids: IDs (string) à récupérer; les IDs vides ou invalides sont ignorés
+        projection: Projection MongoDB optionnelle
+
+    Returns:
+        Dict {id string: document}
+    """
+    object_ids = list({ObjectId(i) for i in ids if i and ObjectId.is_valid(i)})
+    if not object_ids:
+        return {}
+
+    documents = await get_collection(collection_name).find(
+        {"_id": {"$in": object_ids}},
+        projection
+    ).max_time_ms(max_time_ms("read")).to_list(None)
+
+    return {str(doc["_id"]): doc for doc in documents}
+
+
 # Alias pour compatibilité avec les routers
 # Utiliser db.collection au lieu de get_database().collection
 class DatabaseProxy:
@@ -191,3 +472,11 @@ class DatabaseProxy:
         return getattr(get_database(), name)
 
 db = DatabaseProxy()
+
+
+class AnalyticsDatabaseProxy:
+    """Proxy vers la base analytique (préférence de lecture secondaire)"""
+    def __getattr__(self, name):
+        return getattr(get_analytics_database(), name)
+
+analytics_db = AnalyticsDatabaseProxy()
@@ -3,19 +3,40 @@ Application principale FastAPI pour le Système d'Alerte Précoce (SAP).
 Point d'entrée de l'API backend.
 """
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import logging
 from datetime import datetime
+from typing import Optional
 
 from backend.config import settings
 from backend.database import (
     connect_to_mongo,
     close_mongo_connection,
-    ping_database
+    get_pool_stats
 )
+from backend.middleware.rbac import require_role
+from backend.middleware.metrics import MetricsMiddleware
+from backend.services.metrics import registry as metrics_registry
+from backend.services.mongo_monitoring import get_n_plus_one_reports
+from backend.services.scheduler import (
+    JOBS as SCHEDULED_JOBS,
+    start_scheduler,
+    shutdown_scheduler,
+    get_scheduler_status,
+    get_job_runs,
+    run_job
+)
+from backend.services.thresholds import start_thresholds, stop_thresholds
+from backend.services.cache import start_cache_sync, stop_cache_sync
+from backend.services.alert_stream import start_alert_stream, stop_alert_stream
+from backend.services.notifications import start_notifications, stop_notifications, get_outbox_stats
+from backend.services.audit_sink import start_audit_sink, stop_audit_sink
+from backend.services.token_revocation import start_revocation, stop_revocation
+from backend.services.health import start_health_monitor, stop_health_monitor, etat_base, disponibilite
 from backend.models import HealthCheckResponse, MessageResponse
 from backend.routers import (
     auth as auth_router,
@@ -25,7 +46,10 @@ from backend.routers import (
     marches as marches_router,
     collectes as collectes_router,
     alertes as alertes_router,
-    import_collectes as import_collectes_router
+    import_collectes as import_collectes_router,
+    prix as prix_router,
+    dashboard as dashboard_router,
+    audit as audit_router
 )
 
 # Configuration du logging
@@ -55,6 +79,14 @@ async def lifespan(app: FastAPI):
     logger.info(f"  MongoDB DB: {settings.mongodb_db_name}")
     try:
         await connect_to_mongo()
+        await start_audit_sink()
+        await start_revocation()
+        await start_thresholds()
+        await start_cache_sync()
+        start_alert_stream()
+        await start_notifications()
+        start_scheduler()
+        await start_health_monitor()
         logger.info("✅ Application SAP démarrée avec succès")
     except Exception as e:
         logger.error(f"❌ Erreur au démarrage: {e}")
@@ -64,6 +96,15 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("⏹️  Arrêt de l'application SAP...")
+    await stop_health_monitor()
+    shutdown_scheduler()
+    await stop_alert_stream()
+    await stop_notifications()
+    await stop_cache_sync()
+    await stop_thresholds()
+    await stop_revocation()
+    # Écrire les logs d'audit en file avant de fermer la connexion
+    await stop_audit_sink()
     await close_mongo_connection()
     logger.info("✅ Application SAP arrêtée proprement")
 
@@ -92,14 +133,14 @@ app = FastAPI(
     * **4 niveaux**: Normal, Surveillance (+15%), Alerte (+30%), Urgence (+50%)
     * **Calcul automatique** basé sur les variations de prix
     * **Prix de référence** calculé sur 30 jours glissants
-    * **Notifications** aux décideurs et bailleurs (à venir)
+    * **Notifications** aux décideurs et bailleurs (résumés email, SMS, webhooks)
 
     ## Stack Technique:
 
     * **Backend**: FastAPI + Python 3.13
     * **Base de données**: MongoDB 8.23
     * **Authentification**: JWT + MFA (TOTP)
-    * **Notifications**: SendGrid (email) - à venir
+    * **Notifications**: SendGrid (email), passerelle SMS HTTP, webhooks
     * **RBAC**: Contrôle d'accès basé sur les rôles (agent, décideur, bailleur)
     """,
     version="0.1.0",
@@ -130,6 +171,32 @@ app.add_middleware(
 )
 
 
+# ============================================================================
+# Compression des réponses
+# ============================================================================
+
+# Compression GZip négociée via Accept-Encoding, uniquement au-delà du seuil
+# (les petites réponses ne gagnent rien à être compressées)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.gzip_minimum_size,
+    compresslevel=settings.gzip_compresslevel
+)
+
+
+# ============================================================================
+# Instrumentation des performances
+# ============================================================================
+
+# Ajouté en dernier pour englober les autres middlewares (taille mesurée
+# après compression, latence de bout en bout)
+if settings.metrics_enabled:
+    app.add_middleware(
+        MetricsMiddleware,
+        server_timing=settings.is_development
+    )
+
+
 # ============================================================================
 # Inclusion des routers
 # ============================================================================
@@ -142,6 +209,9 @@ app.include_router(marches_router.router)
 app.include_router(collectes_router.router)
 app.include_router(alertes_router.router)
 app.include_router(import_collectes_router.router)
+app.include_router(prix_router.router)
+app.include_router(dashboard_router.router)
+app.include_router(audit_router.router)
 
 
 # ============================================================================
@@ -202,9 +272,12 @@ async def health_check():
     - L'environnement d'exécution
 
     Utilisé par les outils de monitoring et d'orchestration (Docker, Kubernetes, etc.)
+
+    Le statut MongoDB provient de la surveillance de fond (ping toutes les
+    HEALTH_CHECK_INTERVAL_SECONDS secondes) : aucune requête vers la base
+    par sonde.
     """
-    # Vérifier la connexion à MongoDB
-    db_status = "connected" if await ping_database() else "disconnected"
+    db_status = await etat_base()
 
     return HealthCheckResponse(
         status="healthy" if db_status == "connected" else "degraded",
@@ -213,6 +286,41 @@ async def health_check():
     )
 
 
+@app.get(
+    "/health/live",
+    response_model=dict,
+    tags=["Health"],
+    summary="Sonde de vivacité (liveness)"
+)
+async def health_live():
+    """
+    Le processus répond (boucle d'événements active). Aucune dépendance
+    vérifiée : un échec doit entraîner le redémarrage du conteneur.
+    """
+    return {"status": "alive"}
+
+
+@app.get(
+    "/health/ready",
+    response_model=dict,
+    tags=["Health"],
+    summary="Sonde de disponibilité (readiness)",
+    responses={503: {"description": "Worker non disponible"}}
+)
+async def health_ready():
+    """
+    Le worker peut recevoir du trafic : MongoDB joignable (état en cache),
+    pool de connexions non saturé, planificateur démarré, file d'audit sous
+    HEALTH_QUEUE_SATURATION. Retourne 503 sinon, avec le résultat (booléen)
+    de chaque vérification ; le détail est sur /internal/health.
+    """
+    resultat = await disponibilite()
+    return ORJSONResponse(
+        {"status": "ready" if resultat["ready"] else "not_ready", **resultat},
+        status_code=status.HTTP_200_OK if resultat["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
 @app.get(
     "/version",
     response_model=dict,
@@ -242,6 +350,160 @@ async def version_info():
     }
 
 
+@app.get(
+    "/internal/health",
+    response_model=dict,
+    tags=["Health"],
+    summary="Détail de la disponibilité du worker"
+)
+async def health_details(current_user: dict = Depends(require_role(["décideur"]))):
+    """
+    Détail des vérifications de /health/ready pour ce worker : état et
+    latence de MongoDB, utilisation du pool par serveur, planificateur,
+    files (audit, notifications en attente, abonnés SSE) et index.
+    Réservé aux décideurs.
+    """
+    return ORJSONResponse(await disponibilite(details=True))
+
+
+@app.get(
+    "/internal/db/pool",
+    response_model=dict,
+    tags=["Health"],
+    summary="Statistiques du pool de connexions MongoDB"
+)
+async def db_pool_stats(current_user: dict = Depends(require_role(["décideur"]))):
+    """
+    Statistiques d'utilisation du pool de connexions MongoDB de ce worker.
+    Réservé aux décideurs.
+
+    Permet de dimensionner MONGODB_MAX_POOL_SIZE et le nombre de workers:
+    - checked_out / max_checked_out: connexions utilisées (instantané / pic)
+    - waiting, checkout_wait_ms_*: attente pour obtenir une connexion
+    - utilisation: checked_out / max_pool_size
+    """
+    return get_pool_stats()
+
+
+@app.get(
+    "/internal/db/queries",
+    response_model=dict,
+    tags=["Health"],
+    summary="Rapports N+1 des requêtes MongoDB"
+)
+async def db_query_reports(current_user: dict = Depends(require_role(["décideur"]))):
+    """
+    Routes ayant exécuté plus de MONGODB_N_PLUS_ONE_THRESHOLD requêtes MongoDB
+    de même forme (même commande, collection et filtre aux valeurs près).
+    Réservé aux décideurs.
+    """
+    reports = get_n_plus_one_reports()
+    return {
+        "threshold": settings.mongodb_n_plus_one_threshold,
+        "slow_query_threshold_ms": settings.mongodb_slow_query_threshold_ms,
+        "total": len(reports),
+        "reports": reports
+    }
+
+
+@app.get(
+    "/internal/scheduler",
+    response_model=dict,
+    tags=["Health"],
+    summary="État des tâches planifiées"
+)
+async def scheduler_status(
+    job: Optional[str] = Query(None, description="Filtrer l'historique par tâche"),
+    limit: int = Query(50, le=500),
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    État du planificateur de ce worker et historique des exécutions
+    (tous workers confondus, avec durées). Réservé aux décideurs.
+    """
+    return {
+        **get_scheduler_status(),
+        "runs": await get_job_runs(job, limit)
+    }
+
+
+@app.post(
+    "/internal/scheduler/{job}/run",
+    response_model=dict,
+    tags=["Health"],
+    summary="Exécuter une tâche planifiée immédiatement"
+)
+async def scheduler_run_job(
+    job: str,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Exécuter immédiatement une tâche planifiée (sous le même verrou distribué).
+    Réservé aux décideurs.
+    """
+    if job not in SCHEDULED_JOBS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tâche inconnue. Tâches disponibles: {', '.join(SCHEDULED_JOBS)}"
+        )
+
+    run = await run_job(job, SCHEDULED_JOBS[job][0])
+    if run is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Tâche déjà en cours d'exécution sur un autre worker"
+        )
+    run.pop("_id", None)
+    return run
+
+
+@app.get(
+    "/internal/notifications",
+    response_model=dict,
+    tags=["Health"],
+    summary="État de la boîte d'envoi des notifications"
+)
+async def notifications_status(
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    État des canaux de notification et de la boîte d'envoi (messages par
+    canal et statut, plus ancien message dû). Réservé aux décideurs.
+    """
+    return await get_outbox_stats()
+
+
+mongodb_pool_connections = metrics_registry.gauge(
+    "sap_mongodb_pool_connections",
+    "Connexions du pool MongoDB par état",
+    ["server", "state"]
+)
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False
+)
+async def metrics():
+    """
+    Exposition des métriques au format Prometheus.
+    Latences par route, requêtes en cours, tailles de réponse,
+    commandes MongoDB par requête et état du pool de connexions.
+
+    Le registre est propre au processus : avec plusieurs workers
+    (backend.server), chaque scrape ne voit que le worker qui répond.
+    """
+    for server, pool in get_pool_stats()["servers"].items():
+        for state in ("open", "checked_out", "waiting"):
+            mongodb_pool_connections.set(pool[state], server=server, state=state)
+
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
 # ============================================================================
 # Point d'entrée pour démarrage direct
 # ============================================================================
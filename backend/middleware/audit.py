@@ -1,18 +1,29 @@
 """
 Middleware d'audit pour SAP.
 Enregistre les actions des utilisateurs dans la base de données.
+Les enregistrements passent par l'écriture différée par lots
+(backend.services.audit_sink) : la requête n'attend pas MongoDB.
 """
 
 from datetime import datetime
 from typing import Optional
 import logging
 
+from backend.config import settings
 from backend.database import get_collection
 from backend.models import UserInDB
+from backend.services.audit_sink import enregistrer
 
 logger = logging.getLogger(__name__)
 
 
+async def _ecrire(audit_log: dict) -> None:
+    """Déposer un log dans la file d'audit, ou l'insérer directement si
+    l'écriture différée n'est pas démarrée (scripts, tests)"""
+    if not enregistrer(audit_log):
+        await get_collection("audit_logs").insert_one(audit_log)
+
+
 async def log_action(
     user_id: str,
     action: str,
@@ -35,8 +46,6 @@ async def log_action(
         user_agent: User agent du navigateur
     """
     try:
-        audit_collection = get_collection("audit_logs")
-
         audit_log = {
             "user_id": user_id,
             "action": action,
@@ -49,7 +58,7 @@ async def log_action(
             "success": True
         }
 
-        await audit_collection.insert_one(audit_log)
+        await _ecrire(audit_log)
 
         logger.info(
             f"Audit: user={user_id} action={action} "
@@ -79,8 +88,6 @@ async def log_failed_action(
         ip_address: Adresse IP de l'utilisateur
     """
     try:
-        audit_collection = get_collection("audit_logs")
-
         audit_log = {
             "user_id": user_id,
             "action": action,
@@ -91,7 +98,7 @@ async def log_failed_action(
             "success": False
         }
 
-        await audit_collection.insert_one(audit_log)
+        await _ecrire(audit_log)
 
         logger.warning(
             f"Audit échec: user={user_id} action={action} reason={reason}"
@@ -117,8 +124,6 @@ async def log_auth_attempt(
         reason: Raison de l'échec si applicable
     """
     try:
-        audit_collection = get_collection("audit_logs")
-
         audit_log = {
             "email": email,
             "action": "login_attempt",
@@ -128,7 +133,7 @@ async def log_auth_attempt(
             "timestamp": datetime.utcnow()
         }
 
-        await audit_collection.insert_one(audit_log)
+        await _ecrire(audit_log)
 
         if success:
             logger.info(f"Login réussi: {email} from {ip_address}")
@@ -194,20 +199,26 @@ def get_client_ip(request) -> Optional[str]:
     """
     Extraire l'adresse IP du client depuis la requête.
 
+    X-Forwarded-For n'est lu que derrière TRUSTED_PROXY_COUNT proxies de
+    confiance : chacun ajoute l'adresse de son pair à droite de l'en-tête,
+    seule l'entrée ajoutée par le premier proxy (à TRUSTED_PROXY_COUNT
+    positions de la fin) est fiable. Les entrées plus à gauche sont
+    fournies par le client et ignorées (sinon une valeur différente à
+    chaque requête contournerait la limitation de débit par IP).
+
     Args:
         request: Objet Request FastAPI
 
     Returns:
         Adresse IP du client
     """
-    # Vérifier d'abord les headers de proxy
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        return forwarded.split(",")[0].strip()
-
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
+    proxies = settings.trusted_proxy_count
+    if proxies > 0:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            adresses = [a.strip() for a in forwarded.split(",") if a.strip()]
+            if adresses:
+                return adresses[-min(proxies, len(adresses))]
 
     # Sinon utiliser l'adresse directe
     if request.client:
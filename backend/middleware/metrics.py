@@ -0,0 +1,126 @@
+"""
+Middleware ASGI d'instrumentation des performances pour SAP.
+Mesure par route: latence, requêtes en cours, taille des réponses et
+nombre/durée des commandes MongoDB déclenchées par la requête.
+Signale les routes qui répètent une même requête MongoDB (N+1).
+"""
+
+import time
+
+from backend.services.metrics import registry
+from backend.services.mongo_monitoring import (
+    RequestDbStats,
+    current_request_db_stats,
+    check_n_plus_one
+)
+
+
+# Buckets pour les tailles de réponse (octets) et le nombre de commandes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+http_requests_total = registry.counter(
+    "sap_http_requests_total",
+    "Nombre de requêtes HTTP traitées",
+    ["method", "route", "status"]
+)
+http_request_duration = registry.histogram(
+    "sap_http_request_duration_seconds",
+    "Latence des requêtes HTTP par route",
+    ["method", "route"]
+)
+http_requests_in_flight = registry.gauge(
+    "sap_http_requests_in_flight",
+    "Nombre de requêtes HTTP en cours de traitement"
+)
+http_response_size = registry.histogram(
+    "sap_http_response_size_bytes",
+    "Taille des corps de réponse HTTP (après compression)",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS
+)
+http_request_db_commands = registry.histogram(
+    "sap_http_request_db_commands",
+    "Nombre de commandes MongoDB par requête HTTP",
+    ["method", "route"],
+    buckets=COUNT_BUCKETS
+)
+http_request_db_duration = registry.histogram(
+    "sap_http_request_db_duration_seconds",
+    "Temps cumulé des commandes MongoDB par requête HTTP",
+    ["method", "route"]
+)
+
+
+def get_route_label(scope) -> str:
+    """
+    Obtenir le gabarit de route (ex: /api/collectes/{collecte_id}) d'une requête.
+    Les chemins non routés sont regroupés pour borner la cardinalité.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI qui alimente le registre de métriques.
+
+    Args:
+        app: Application ASGI
+        server_timing: Ajouter l'en-tête Server-Timing (développement)
+        exclude_paths: Chemins non instrumentés (ex: /metrics)
+    """
+
+    def __init__(self, app, server_timing: bool = False, exclude_paths=("/metrics",)):
+        self.app = app
+        self.server_timing = server_timing
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        db_stats = RequestDbStats()
+        token = current_request_db_stats.set(db_stats)
+        start = time.perf_counter()
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((
+                        b"server-timing",
+                        (
+                            f"app;dur={elapsed_ms:.1f}, "
+                            f'db;dur={db_stats.duration_ms:.1f};desc="{db_stats.count} cmd"'
+                        ).encode()
+                    ))
+                    message["headers"] = headers
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            current_request_db_stats.reset(token)
+
+            duration = time.perf_counter() - start
+            method = scope["method"]
+            route = get_route_label(scope)
+
+            http_requests_total.inc(method=method, route=route, status=str(status_code))
+            http_request_duration.observe(duration, method=method, route=route)
+            http_response_size.observe(response_size, method=method, route=route)
+            http_request_db_commands.observe(db_stats.count, method=method, route=route)
+            http_request_db_duration.observe(db_stats.duration_ms / 1000, method=method, route=route)
+
+            check_n_plus_one(method, route, db_stats)
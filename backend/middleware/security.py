@@ -3,9 +3,9 @@ Middleware de sécurité pour SAP.
 Gère l'authentification JWT et la protection des routes.
 """
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Optional, Tuple
 
 from backend.services.auth import decode_token
 from backend.database import get_collection
@@ -51,6 +51,16 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    return await utilisateur_du_payload(payload)
+
+
+async def utilisateur_du_payload(payload: dict) -> UserInDB:
+    """
+    Charger l'utilisateur (actif) d'un payload de token d'accès déjà vérifié.
+
+    Raises:
+        HTTPException: Si l'utilisateur n'existe pas ou est désactivé
+    """
     # Extraire l'ID utilisateur
     user_id: Optional[str] = payload.get("sub")
 
@@ -87,6 +97,65 @@ async def get_current_user(
     return user
 
 
+def get_token_payload(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> dict:
+    """
+    Dépendance FastAPI retournant le payload du token d'accès courant
+    (jti, exp...), par exemple pour le révoquer.
+
+    Args:
+        credentials: Credentials HTTP Bearer (token JWT)
+
+    Returns:
+        Payload décodé du token d'accès
+
+    Raises:
+        HTTPException: Si le token est invalide, expiré ou révoqué
+    """
+    payload = decode_token(credentials.credentials)
+    if payload is None or payload.get("type") != "access":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide ou expiré",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
+async def get_current_user_stream(
+    ticket: Optional[str] = Query(None, description="Ticket de flux (POST /api/alertes/flux/ticket)"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+) -> Tuple[UserInDB, dict]:
+    """
+    Dépendance d'authentification des flux Server-Sent Events.
+    L'API EventSource des navigateurs n'envoie pas d'en-tête Authorization :
+    elle présente alors un ticket à usage unique et de courte durée, pour
+    que le token d'accès n'apparaisse jamais dans une URL (logs de proxy).
+
+    Args:
+        ticket: Ticket de flux en paramètre de requête
+        credentials: Credentials HTTP Bearer (prioritaires)
+
+    Returns:
+        Utilisateur authentifié et payload du token d'accès (expiration et
+        révocation vérifiées pendant toute la durée du flux)
+    """
+    if credentials is not None:
+        payload = get_token_payload(credentials)
+    else:
+        from backend.services.alert_stream import consommer_ticket
+
+        payload = await consommer_ticket(ticket) if ticket else None
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Ticket de flux manquant, expiré ou déjà utilisé",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    return await utilisateur_du_payload(payload), payload
+
+
 async def get_current_active_user(
     current_user: UserInDB = Depends(get_current_user)
 ) -> UserInDB:
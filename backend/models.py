@@ -3,7 +3,7 @@ Modèles Pydantic pour la validation et la sérialisation des données.
 Utilisés pour la documentation automatique et la validation des requêtes/réponses.
 """
 
-from pydantic import BaseModel, Field, EmailStr, field_validator
+from pydantic import BaseModel, Field, EmailStr, field_validator, model_validator
 from typing import Optional, Literal
 from datetime import datetime
 from bson import ObjectId
@@ -337,6 +337,21 @@ class MarcheResponse(MarcheBase):
         populate_by_name = True
 
 
+class ProduitMarcheAffectation(BaseModel):
+    """Produit proposé sur un marché, avec son unité de mesure"""
+    produit_id: str = Field(..., description="ID du produit")
+    unite_id: str = Field(..., description="ID de l'unité de mesure")
+
+
+class MarchesProduitsBatch(BaseModel):
+    """Affectation en lot de produits à des marchés (chaque produit à chaque marché)"""
+    marche_ids: list[str] = Field(..., min_length=1, max_length=500, description="IDs des marchés")
+    produits: list[ProduitMarcheAffectation] = Field(..., min_length=1, max_length=200)
+    mettre_a_jour: bool = Field(
+        True, description="Réactiver les produits déjà présents et mettre à jour leur unité"
+    )
+
+
 # ============================================================================
 # Modèles Permission
 # ============================================================================
@@ -470,6 +485,30 @@ class CollecteBatchCreate(BaseModel):
     collectes: list[CollecteCreate] = Field(..., description="Liste de collectes à créer")
 
 
+class CollecteBatchDecision(BaseModel):
+    """
+    Sélection de collectes à valider ou rejeter en lot : liste d'IDs et/ou
+    filtres (combinés).
+    """
+    ids: Optional[list[str]] = Field(None, max_length=5000, description="IDs de collectes")
+    marche_id: Optional[str] = None
+    produit_id: Optional[str] = None
+    agent_id: Optional[str] = None
+    date_debut: Optional[datetime] = Field(None, description="Premier jour inclus")
+    date_fin: Optional[datetime] = Field(None, description="Dernier jour inclus")
+    motif: Optional[str] = Field(None, min_length=1, description="Motif du rejet")
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        """Au moins une liste d'IDs ou un filtre (pas de lot sur toute la base)"""
+        filtres = (self.marche_id, self.produit_id, self.agent_id, self.date_debut, self.date_fin)
+        if not self.ids and all(f is None for f in filtres):
+            raise ValueError("Indiquer des IDs de collectes ou au moins un filtre")
+        if self.date_debut and self.date_fin and self.date_debut > self.date_fin:
+            raise ValueError("date_debut doit précéder date_fin")
+        return self
+
+
 class CollecteInDB(CollecteBase):
     """Modèle pour une collecte en base de données"""
     id: str = Field(alias="_id")
@@ -542,6 +581,28 @@ class AlerteInDB(AlerteBase):
         json_encoders = {ObjectId: str}
 
 
+class SeuilsAlerte(BaseModel):
+    """Seuils de déclenchement (écart en % au prix de référence)"""
+    surveillance: float = Field(..., gt=0, description="Seuil de surveillance (%)")
+    alerte: float = Field(..., gt=0, description="Seuil d'alerte (%)")
+    urgence: float = Field(..., gt=0, description="Seuil d'urgence (%)")
+
+    @model_validator(mode="after")
+    def validate_ordre(self):
+        """Les seuils doivent être strictement croissants"""
+        if not self.surveillance < self.alerte < self.urgence:
+            raise ValueError("Les seuils doivent respecter surveillance < alerte < urgence")
+        return self
+
+
+class SeuilsAlerteOverride(SeuilsAlerte):
+    """Surcharge des seuils pour une catégorie ou un produit"""
+    portee: Literal["categorie", "produit"]
+    cible_id: str
+    updated_by: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+
 # ============================================================================
 # Modèles de Réponse Génériques
 # ============================================================================
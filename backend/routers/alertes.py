@@ -3,25 +3,45 @@ Router pour le système d'alertes de sécurité alimentaire.
 Calcul automatique basé sur les variations de prix et seuils.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Iterable, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
+import asyncio
+import logging
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
-from backend.models import MessageResponse
-from backend.middleware.security import get_current_user
+from backend.models import MessageResponse, SeuilsAlerte, SeuilsAlerteOverride
+from backend.config import settings
+from backend.middleware.security import get_current_user, get_current_user_stream, get_token_payload
 from backend.middleware.rbac import require_role
-from backend.database import db
+from backend.database import db, analytics_db, find_by_ids, max_time_ms
+from backend.routers.collectes import STATUTS_VALIDES
+from backend.services.alert_stream import broadcaster, creer_ticket, flux_sse, publier_alertes_par_ids
+from backend.services.cache import invalidate_aggregates, statistiques_cache
+from backend.services.notifications import notifier_alertes_par_ids, rang_niveau
+from backend.services.statistiques import (
+    calculer_repartitions,
+    filtre_periode,
+    normaliser_date,
+    ventiler_par_nom
+)
+from backend.services.thresholds import (
+    get_threshold_table,
+    list_overrides,
+    upsert_override,
+    delete_override,
+    target_exists
+)
 
 router = APIRouter(prefix="/api/alertes", tags=["Alertes"])
+logger = logging.getLogger(__name__)
 
 
-# Seuils de variation de prix pour déclenchement des alertes
-SEUILS_ALERTES = {
-    "surveillance": 15,  # +15% par rapport au prix de référence
-    "alerte": 30,        # +30%
-    "urgence": 50        # +50%
-}
+# Portées de surcharge des seuils dans les URL (pluriel) -> portée stockée
+PORTEES_SEUILS = {"categories": "categorie", "produits": "produit"}
 
 
 async def calculer_prix_reference(produit_id: str, marche_id: Optional[str] = None) -> Optional[float]:
@@ -51,7 +71,7 @@ async def calculer_prix_reference(produit_id: str, marche_id: Optional[str] = No
         }}
     ]
 
-    result = await db.collectes_prix.aggregate(pipeline).to_list(None)
+    result = await db.collectes_prix.aggregate(pipeline, maxTimeMS=max_time_ms("read")).to_list(None)
 
     if result and result[0]["count"] >= 3:  # Minimum 3 collectes pour calculer
         return result[0]["prix_moyen"]
@@ -59,23 +79,61 @@ async def calculer_prix_reference(produit_id: str, marche_id: Optional[str] = No
     return None
 
 
-def determiner_niveau_alerte(prix_actuel: float, prix_reference: float) -> str:
+def determiner_niveau_alerte(prix_actuel: float, prix_reference: float,
+                             produit_id: Optional[str] = None) -> str:
     """
     Déterminer le niveau d'alerte basé sur l'écart entre prix actuel et référence.
+    Les seuils (défaut, catégorie ou produit) viennent de la table en mémoire.
     """
     if prix_reference <= 0:
         return "normal"
 
     ecart_pourcent = ((prix_actuel - prix_reference) / prix_reference) * 100
 
-    if ecart_pourcent >= SEUILS_ALERTES["urgence"]:
-        return "urgence"
-    elif ecart_pourcent >= SEUILS_ALERTES["alerte"]:
-        return "alerte"
-    elif ecart_pourcent >= SEUILS_ALERTES["surveillance"]:
-        return "surveillance"
-    else:
-        return "normal"
+    return get_threshold_table().classify(ecart_pourcent, produit_id)
+
+
+def upsert_alerte_active(marche_id: str, produit_id: str, champs: dict,
+                         maintenant: datetime, nouvel_id: ObjectId) -> UpdateOne:
+    """
+    Mise à jour de l'alerte active d'un couple, créée (avec `nouvel_id`) si
+    aucune n'existe. L'index unique partiel alerte_active_unique garantit
+    une seule alerte active par couple même si plusieurs recalculs (workers,
+    tâche nocturne, /generer) tournent en même temps ; l'upsert perdant est
+    rejoué en mise à jour par ecrire_alertes.
+    """
+    return UpdateOne(
+        {"marche_id": marche_id, "produit_id": produit_id, "statut": "active"},
+        {
+            "$set": {**champs, "updated_at": maintenant},
+            "$setOnInsert": {
+                "_id": nouvel_id,
+                "type_alerte": "prix_eleve",
+                "vue_par": [],
+                "created_at": maintenant
+            }
+        },
+        upsert=True
+    )
+
+
+async def ecrire_alertes(operations: list) -> set:
+    """
+    Exécuter des écritures d'alertes (bulk_write non ordonné).
+
+    Returns:
+        set: IDs des alertes créées par upsert
+    """
+    try:
+        bulk = await db.alertes.bulk_write(operations, ordered=False)
+        return set(bulk.upserted_ids.values())
+    except BulkWriteError as e:
+        erreurs = e.details.get("writeErrors", [])
+        if any(erreur.get("code") != 11000 for erreur in erreurs):
+            raise
+        # Upsert concurrent perdu : rejoué, il met à jour l'alerte créée par l'autre
+        await db.alertes.bulk_write([operations[erreur["index"]] for erreur in erreurs], ordered=False)
+        return {u["_id"] for u in e.details.get("upserted", [])}
 
 
 async def generer_alertes_pour_collecte(collecte_id: str):
@@ -84,7 +142,7 @@ async def generer_alertes_pour_collecte(collecte_id: str):
     Appelé par le endpoint de validation des collectes.
     """
     collecte = await db.collectes_prix.find_one({"_id": ObjectId(collecte_id)})
-    if not collecte or collecte["statut"] != "validée":
+    if not collecte or collecte["statut"] not in STATUTS_VALIDES:
         return
 
     # Calculer le prix de référence
@@ -97,7 +155,7 @@ async def generer_alertes_pour_collecte(collecte_id: str):
         return  # Pas assez de données historiques
 
     # Déterminer le niveau d'alerte
-    niveau = determiner_niveau_alerte(collecte["prix"], prix_ref)
+    niveau = determiner_niveau_alerte(collecte["prix"], prix_ref, collecte["produit_id"])
 
     if niveau == "normal":
         # Prix revenu à la normale : fermer l'alerte existante si elle existe
@@ -118,6 +176,7 @@ async def generer_alertes_pour_collecte(collecte_id: str):
                     }
                 }
             )
+            await publier_alertes_par_ids([existing_alerte["_id"]])
 
         return  # Pas besoin de créer une nouvelle alerte
 
@@ -147,74 +206,65 @@ async def generer_alertes_pour_collecte(collecte_id: str):
             }
         )
     else:
-        # Créer une nouvelle alerte
-        alerte = {
-            "niveau": niveau,
-            "type_alerte": "prix_eleve",
-            "marche_id": collecte["marche_id"],
-            "produit_id": collecte["produit_id"],
-            "prix_actuel": collecte["prix"],
-            "prix_reference": prix_ref,
-            "ecart_pourcentage": ecart_pourcent,
-            "statut": "active",
-            "vue_par": [],
-            "created_at": datetime.utcnow()
-        }
+        # Créer une nouvelle alerte (upsert : une seule alerte active par couple)
+        nouvel_id = ObjectId()
+        inserees = await ecrire_alertes([upsert_alerte_active(
+            collecte["marche_id"], collecte["produit_id"], {
+                "niveau": niveau,
+                "prix_actuel": collecte["prix"],
+                "prix_reference": prix_ref,
+                "ecart_pourcentage": ecart_pourcent
+            }, datetime.utcnow(), nouvel_id
+        )])
+        if nouvel_id not in inserees:
+            # Créée entre-temps par un recalcul concurrent, mise à jour à la place
+            existing_alerte = await db.alertes.find_one({
+                "marche_id": collecte["marche_id"],
+                "produit_id": collecte["produit_id"],
+                "statut": "active"
+            }, {"niveau": 1}) or {"_id": nouvel_id, "niveau": niveau}
 
-        await db.alertes.insert_one(alerte)
+    # Diffusion temps réel (flux SSE) et notification si l'alerte est
+    # nouvelle ou aggravée
+    if existing_alerte:
+        await publier_alertes_par_ids([existing_alerte["_id"]])
+        if rang_niveau(niveau) > rang_niveau(existing_alerte.get("niveau")):
+            await notifier_alertes_par_ids([existing_alerte["_id"]])
+    else:
+        await publier_alertes_par_ids([nouvel_id], creees=[nouvel_id])
+        await notifier_alertes_par_ids([nouvel_id])
 
 
-@router.get("", response_model=List[dict])
-async def get_alertes(
-    niveau: Optional[str] = Query(None, description="Filtrer par niveau (surveillance, alerte, urgence)"),
-    statut: Optional[str] = Query(None, description="Filtrer par statut (active, resolue, fermee)"),
-    marche_id: Optional[str] = Query(None, description="Filtrer par marché"),
-    produit_id: Optional[str] = Query(None, description="Filtrer par produit"),
-    limit: int = Query(50, le=200, description="Nombre max de résultats"),
-    current_user: dict = Depends(get_current_user)
-):
+async def enrichir_alertes(alertes: List[dict], user_id) -> List[dict]:
     """
-    Liste les alertes avec filtres optionnels.
-    Accessible à tous les rôles authentifiés.
-    """
-    query = {}
-
-    if niveau:
-        query["niveau"] = niveau
-    if statut:
-        query["statut"] = statut
-    else:
-        query["statut"] = "active"  # Par défaut, alertes actives uniquement
+    Enrichir des alertes avec les noms de marché, commune, département et
+    produit (une requête $in par collection) pour les listes et le tableau
+    de bord.
 
-    if marche_id:
-        query["marche_id"] = marche_id
-    if produit_id:
-        query["produit_id"] = produit_id
-
-    alertes = await db.alertes.find(query).sort("created_at", -1).limit(limit).to_list(None)
+    Args:
+        alertes: Documents d'alertes
+        user_id: Utilisateur courant (champ "vue")
+    """
+    marches, produits = await asyncio.gather(
+        find_by_ids(
+            "marches", {a["marche_id"] for a in alertes},
+            {"nom": 1, "commune_id": 1, "latitude": 1, "longitude": 1, "location": 1}
+        ),
+        find_by_ids("produits", {a["produit_id"] for a in alertes}, {"nom": 1})
+    )
+    communes = await find_by_ids(
+        "communes", {m.get("commune_id") for m in marches.values()}, {"nom": 1, "departement_id": 1}
+    )
+    departements = await find_by_ids(
+        "departements", {c.get("departement_id") for c in communes.values()}, {"nom": 1}
+    )
 
-    # Enrichir avec les noms de marché et produit
     result = []
     for alerte in alertes:
-        # Récupérer le nom du marché
-        marche = await db.marches.find_one({"_id": ObjectId(alerte["marche_id"])})
-        marche_nom = marche["nom"] if marche else "Inconnu"
-
-        # Récupérer le nom du produit
-        produit = await db.produits.find_one({"_id": ObjectId(alerte["produit_id"])})
-        produit_nom = produit["nom"] if produit else "Inconnu"
-
-        # Récupérer la commune via le marché
-        commune_nom = None
-        departement_nom = None
-        if marche and marche.get("commune_id"):
-            commune = await db.communes.find_one({"_id": ObjectId(marche["commune_id"])})
-            if commune:
-                commune_nom = commune["nom"]
-                if commune.get("departement_id"):
-                    dept = await db.departements.find_one({"_id": ObjectId(commune["departement_id"])})
-                    if dept:
-                        departement_nom = dept["nom"]
+        marche = marches.get(alerte["marche_id"])
+        produit = produits.get(alerte["produit_id"])
+        commune = communes.get(marche.get("commune_id")) if marche else None
+        dept = departements.get(commune.get("departement_id")) if commune else None
 
         # Extraire les coordonnées GPS du marché
         marche_gps = None
@@ -237,25 +287,194 @@ async def get_alertes(
             "niveau": alerte["niveau"],
             "type_alerte": alerte["type_alerte"],
             "marche_id": alerte["marche_id"],
-            "marche_nom": marche_nom,
+            "marche_nom": marche["nom"] if marche else "Inconnu",
             "marche_gps": marche_gps,
             "commune_id": marche.get('commune_id') if marche else None,
-            "commune_nom": commune_nom,
+            "commune_nom": commune["nom"] if commune else None,
             "departement_id": commune.get('departement_id') if commune else None,
-            "departement_nom": departement_nom,
+            "departement_nom": dept["nom"] if dept else None,
             "produit_id": alerte["produit_id"],
-            "produit_nom": produit_nom,
+            "produit_nom": produit["nom"] if produit else "Inconnu",
             "prix_actuel": alerte["prix_actuel"],
             "prix_reference": alerte["prix_reference"],
             "ecart_pourcentage": alerte["ecart_pourcentage"],
+            "detection": alerte.get("detection"),
             "statut": alerte["statut"],
             "created_at": alerte["created_at"],
-            "vue": current_user.id in alerte.get("vue_par", [])
+            "vue": user_id in alerte.get("vue_par", [])
         })
 
     return result
 
 
+@router.get("", response_model=List[dict], response_class=ORJSONResponse)
+async def get_alertes(
+    niveau: Optional[str] = Query(None, description="Filtrer par niveau (surveillance, alerte, urgence)"),
+    statut: Optional[str] = Query(None, description="Filtrer par statut (active, resolue, fermee)"),
+    marche_id: Optional[str] = Query(None, description="Filtrer par marché"),
+    produit_id: Optional[str] = Query(None, description="Filtrer par produit"),
+    limit: int = Query(50, le=200, description="Nombre max de résultats"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Liste les alertes avec filtres optionnels.
+    Accessible à tous les rôles authentifiés.
+    """
+    query = {}
+
+    if niveau:
+        query["niveau"] = niveau
+    if statut:
+        query["statut"] = statut
+    else:
+        query["statut"] = "active"  # Par défaut, alertes actives uniquement
+
+    if marche_id:
+        query["marche_id"] = marche_id
+    if produit_id:
+        query["produit_id"] = produit_id
+
+    alertes = await (
+        db.alertes.find(query)
+        .sort("created_at", -1)
+        .limit(limit)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
+
+    return await enrichir_alertes(alertes, current_user.id)
+
+
+@router.get("/seuils", response_model=dict)
+async def get_seuils(current_user: dict = Depends(get_current_user)):
+    """
+    Seuils d'alerte en vigueur : seuils par défaut et surcharges par
+    catégorie de produit ou par produit (le produit l'emporte).
+    """
+    table = get_threshold_table()
+    surveillance, alerte, urgence = table.defaut
+    return {
+        "defaut": {"surveillance": surveillance, "alerte": alerte, "urgence": urgence},
+        "surcharges": await list_overrides(),
+        "version": table.version
+    }
+
+
+@router.put("/seuils/{portee}/{cible_id}", response_model=SeuilsAlerteOverride)
+async def set_seuils(
+    portee: str,
+    cible_id: str,
+    seuils: SeuilsAlerte,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Définir les seuils d'une catégorie (portee=categories) ou d'un produit
+    (portee=produits). Pris en compte immédiatement par tous les workers
+    au prochain rafraîchissement de la table.
+    Réservé aux décideurs.
+    """
+    if portee not in PORTEES_SEUILS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portée inconnue (categories ou produits)"
+        )
+    if not await target_exists(PORTEES_SEUILS[portee], cible_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Catégorie ou produit non trouvé"
+        )
+
+    override = await upsert_override(
+        PORTEES_SEUILS[portee], cible_id, seuils.model_dump(), str(current_user.id)
+    )
+    return SeuilsAlerteOverride(**override)
+
+
+@router.delete("/seuils/{portee}/{cible_id}", response_model=MessageResponse)
+async def delete_seuils(
+    portee: str,
+    cible_id: str,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Supprimer la surcharge d'une catégorie ou d'un produit (retour aux seuils hérités).
+    Réservé aux décideurs.
+    """
+    if portee not in PORTEES_SEUILS or not await delete_override(PORTEES_SEUILS[portee], cible_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Surcharge de seuils non trouvée"
+        )
+
+    return MessageResponse(message="Seuils réinitialisés")
+
+
+@router.post("/flux/ticket", response_model=dict)
+async def creer_ticket_flux(
+    payload: dict = Depends(get_token_payload),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Échanger le token d'accès contre un ticket de connexion au flux
+    (EventSource ne peut pas envoyer d'en-tête Authorization).
+
+    Le ticket est à usage unique et valable ALERT_STREAM_TICKET_SECONDS
+    secondes ; le flux ouvert reste lié à l'expiration du token d'accès.
+    Accessible à tous les rôles authentifiés.
+    """
+    return {
+        "ticket": await creer_ticket(payload),
+        "expires_in": settings.alert_stream_ticket_seconds
+    }
+
+
+@router.get("/flux")
+async def flux_alertes(
+    request: Request,
+    departement_id: Optional[str] = Query(None, description="Ne suivre qu'un département"),
+    niveaux: Optional[str] = Query(None, description="Niveaux suivis, séparés par des virgules"),
+    last_event_id: Optional[str] = Query(None, description="Reprise (si l'en-tête Last-Event-ID est absent)"),
+    session: tuple = Depends(get_current_user_stream)
+):
+    """
+    Flux temps réel des alertes (Server-Sent Events).
+
+    Événements: alerte.creee, alerte.mise_a_jour, alerte.resolue ; données au
+    format de GET /api/alertes. Un commentaire de maintien de connexion est
+    envoyé toutes les ALERT_STREAM_HEARTBEAT_SECONDS secondes. À la
+    reconnexion, l'en-tête Last-Event-ID (envoyé automatiquement par
+    EventSource) permet de recevoir les événements manqués.
+
+    Authentification par en-tête Bearer ou paramètre `ticket` (voir
+    POST /api/alertes/flux/ticket). Le flux se termine par un événement
+    session.expiree à l'expiration ou à la révocation du token d'accès.
+    Accessible à tous les rôles authentifiés.
+    """
+    _, payload = session
+    if broadcaster.nombre_abonnes >= settings.alert_stream_max_clients:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Trop de clients connectés au flux d'alertes",
+            headers={"Retry-After": "30"}
+        )
+
+    abonnement = broadcaster.abonner(
+        departement_id,
+        [n.strip() for n in niveaux.split(",") if n.strip()] if niveaux else ()
+    )
+    return StreamingResponse(
+        flux_sse(abonnement, request.headers.get("last-event-id") or last_event_id, payload),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Pas de compression GZip ni de mise en tampon par un proxy :
+            # chaque événement doit partir immédiatement
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.get("/{alerte_id}", response_model=dict)
 async def get_alerte(
     alerte_id: str,
@@ -292,6 +511,7 @@ async def get_alerte(
         "prix_actuel": alerte["prix_actuel"],
         "prix_reference": alerte["prix_reference"],
         "ecart_pourcentage": alerte["ecart_pourcentage"],
+        "detection": alerte.get("detection"),
         "statut": alerte["statut"],
         "vue_par": alerte.get("vue_par", []),
         "created_at": alerte["created_at"],
@@ -327,6 +547,7 @@ async def marquer_alerte_vue(
             {"$addToSet": {"vue_par": current_user.id}}
         )
 
+    invalidate_aggregates()
     return MessageResponse(message="Alerte marquée comme vue")
 
 
@@ -369,6 +590,8 @@ async def resoudre_alerte(
         }
     )
 
+    invalidate_aggregates()
+    await publier_alertes_par_ids([ObjectId(alerte_id)])
     return MessageResponse(message="Alerte résolue avec succès")
 
 
@@ -383,129 +606,266 @@ async def get_statistiques_alertes(
 
     Retourne:
     - Nombre total d'alertes actives
-    - Répartition par niveau (surveillance, alerte, urgence)
-    - Répartition par département
-    - Tendances sur la période
-    """
-    query = {"statut": "active"}
-
-    # Filtre par période
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = datetime.fromisoformat(date_debut)
-        if date_fin:
-            date_query["$lte"] = datetime.fromisoformat(date_fin)
-        query["created_at"] = date_query
-
-    # Compter total
-    total = await db.alertes.count_documents(query)
-
-    # Répartition par niveau
-    pipeline_niveau = [
-        {"$match": query},
-        {"$group": {"_id": "$niveau", "count": {"$sum": 1}}}
-    ]
-    niveaux = await db.alertes.aggregate(pipeline_niveau).to_list(None)
+    - Répartition par niveau (surveillance, alerte, urgence) et par type
+    - Répartitions par département, par produit et par jour
 
-    # Répartition par type
-    pipeline_type = [
-        {"$match": query},
-        {"$group": {"_id": "$type_alerte", "count": {"$sum": 1}}}
-    ]
-    types = await db.alertes.aggregate(pipeline_type).to_list(None)
-
-    stats = {
-        "total_alertes_actives": total,
-        "par_niveau": {n["_id"]: n["count"] for n in niveaux},
-        "par_type": {t["_id"]: t["count"] for t in types},
-        "periode": {
-            "debut": date_debut,
-            "fin": date_fin
+    Toutes les répartitions sont calculées en une seule agrégation $facet,
+    mise en cache quelques secondes par filtres normalisés.
+    """
+    cle = ("alertes", normaliser_date(date_debut), normaliser_date(date_fin))
+
+    async def calculer() -> dict:
+        query = {"statut": "active", **filtre_periode("created_at", date_debut, date_fin)}
+        repartitions = await calculer_repartitions("alertes", query, "created_at", {
+            "par_niveau": "$niveau",
+            "par_type": "$type_alerte"
+        })
+        stats = {
+            "total_alertes_actives": sum(repartitions["par_niveau"].values()),
+            "par_niveau": repartitions["par_niveau"],
+            "par_type": repartitions["par_type"],
+            "periode": {
+                "debut": date_debut,
+                "fin": date_fin
+            }
         }
-    }
+        stats.update(await ventiler_par_nom(repartitions))
+        stats["par_jour"] = dict(sorted(repartitions["par_jour"].items()))
+        return stats
 
-    return stats
+    return await statistiques_cache.get_or_compute(cle, calculer)
 
 
-@router.post("/generer", response_model=MessageResponse)
-async def generer_alertes_manuellement(
-    current_user: dict = Depends(require_role(["décideur"]))
-):
-    """
-    Générer des alertes manuellement en analysant toutes les collectes récentes.
-    Réservé aux décideurs.
-    Utile pour recalculer les alertes ou initialiser le système.
+async def recalculer_alertes(jours_recents: int = 7, jours_reference: int = 30,
+                             couples: Optional[Iterable[Tuple[str, str]]] = None) -> dict:
     """
-    # Récupérer les collectes validées des 7 derniers jours
-    date_limite = datetime.utcnow() - timedelta(days=7)
+    Recalculer en lot les alertes de tous les couples (marché, produit).
 
-    collectes = await db.collectes_prix.find({
-        "statut": "validee",
-        "date": {"$gte": date_limite}
-    }).to_list(None)
+    Une seule agrégation calcule, par couple, le prix de référence (moyenne
+    des collectes validées sur `jours_reference` jours) et le dernier prix
+    collecté ; les alertes sont ensuite créées, mises à jour ou résolues en
+    un seul bulk_write.
 
-    alertes_creees = 0
+    Si ALERT_DETECTION_MODES choisit un mode statistique pour "prix_eleve",
+    le niveau vient du moteur d'anomalies (série produit × département du
+    marché) et la référence est le prix attendu par ce moteur.
 
-    for collecte in collectes:
-        # Calculer le prix de référence
-        prix_ref = await calculer_prix_reference(
-            collecte["produit_id"],
-            collecte["marche_id"]
-        )
+    Avec `couples`, l'alerte active d'un couple qui n'est plus évaluable
+    (collectes rejetées) est résolue.
 
-        if not prix_ref:
-            continue
+    Args:
+        jours_recents: Seuls les couples collectés sur cette période sont évalués
+        jours_reference: Fenêtre du prix de référence
+        couples: Couples (marche_id, produit_id) à évaluer (tous si None)
 
-        # Déterminer le niveau d'alerte
-        niveau = determiner_niveau_alerte(collecte["prix"], prix_ref)
+    Returns:
+        dict: Nombre d'alertes créées, mises à jour et résolues
+    """
+    maintenant = datetime.utcnow()
+    filtre = {
+        "statut": "validee",
+        "date": {"$gte": maintenant - timedelta(days=jours_reference)}
+    }
+    if couples is not None:
+        couples = set(couples)
+        if not couples:
+            return {"creees": 0, "mises_a_jour": 0, "resolues": 0}
+        # Pré-filtre par index ; les couples croisés en trop sont écartés ensuite
+        filtre["marche_id"] = {"$in": sorted({m for m, _ in couples})}
+        filtre["produit_id"] = {"$in": sorted({p for _, p in couples})}
+    pipeline = [
+        {"$match": filtre},
+        {"$sort": {"date": 1, "created_at": 1}},
+        {"$group": {
+            "_id": {"marche_id": "$marche_id", "produit_id": "$produit_id"},
+            "prix_moyen": {"$avg": "$prix"},
+            "count": {"$sum": 1},
+            "dernier_prix": {"$last": "$prix"},
+            "derniere_date": {"$last": "$date"}
+        }},
+        {"$match": {
+            "count": {"$gte": 3},  # Minimum 3 collectes pour calculer
+            "derniere_date": {"$gte": maintenant - timedelta(days=jours_recents)}
+        }}
+    ]
+    evalues = await analytics_db.collectes_prix.aggregate(
+        pipeline, allowDiskUse=True, maxTimeMS=max_time_ms("analytics")
+    ).to_list(None)
+    if couples is not None:
+        evalues = [c for c in evalues if (c["_id"]["marche_id"], c["_id"]["produit_id"]) in couples]
+
+    filtre_actives = {"statut": "active"}
+    if couples is not None:
+        filtre_actives["marche_id"] = filtre["marche_id"]
+        filtre_actives["produit_id"] = filtre["produit_id"]
+    actives = await db.alertes.find(
+        filtre_actives, {"marche_id": 1, "produit_id": 1, "niveau": 1}
+    ).to_list(None)
+    actives_par_couple = {(a["marche_id"], a["produit_id"]): a["_id"] for a in actives}
+    niveaux_actifs = {a["_id"]: a.get("niveau") for a in actives}
+
+    # Import différé : la détection statistique charge NumPy
+    from backend.services.anomalies import detect_anomalies, detection_mode, load_marche_departements
+
+    mode = detection_mode("prix_eleve")
+    if mode != "seuils":
+        anomalies = await detect_anomalies(mode, jours_recents)
+        marche_departements = await load_marche_departements()
+
+    operations = []
+    a_creer = []
+    ecrites, creees, aggravees = [], [], []
+    resultat = {"creees": 0, "mises_a_jour": 0, "resolues": 0}
+    for couple in evalues:
+        cle = (couple["_id"]["marche_id"], couple["_id"]["produit_id"])
+        prix_ref = couple["prix_moyen"]
+        prix_actuel = couple["dernier_prix"]
+        alerte_id = actives_par_couple.get(cle)
+
+        if mode == "seuils":
+            niveau = determiner_niveau_alerte(prix_actuel, prix_ref, cle[1])
+            detection = {"methode": mode}
+        else:
+            evaluation = anomalies.get((cle[1], marche_departements.get(cle[0])))
+            niveau = evaluation["niveau"] if evaluation else "normal"
+            if evaluation and evaluation["prix_attendu"]:
+                prix_ref = evaluation["prix_attendu"]
+            detection = {
+                "methode": mode,
+                "score": evaluation["score"] if evaluation else None,
+                "confiance": evaluation["confiance"] if evaluation else None
+            }
 
         if niveau == "normal":
+            # Prix revenu à la normale : fermer l'alerte existante
+            if alerte_id:
+                operations.append(UpdateOne(
+                    {"_id": alerte_id},
+                    {"$set": {"statut": "resolue", "resolved_at": maintenant, "updated_at": maintenant}}
+                ))
+                resultat["resolues"] += 1
+                ecrites.append(alerte_id)
             continue
 
-        # Calculer l'écart
-        ecart_pourcent = ((collecte["prix"] - prix_ref) / prix_ref) * 100
-
-        # Vérifier si une alerte existe déjà pour ce marché/produit (active)
-        # On ne filtre PAS par niveau pour éviter les doublons
-        existing = await db.alertes.find_one({
-            "marche_id": collecte["marche_id"],
-            "produit_id": collecte["produit_id"],
-            "statut": "active"
-        })
-
-        if existing:
-            # Mettre à jour l'alerte existante avec les nouvelles données
-            await db.alertes.update_one(
-                {"_id": existing["_id"]},
-                {
-                    "$set": {
-                        "niveau": niveau,
-                        "prix_actuel": collecte["prix"],
-                        "prix_reference": prix_ref,
-                        "ecart_pourcentage": ecart_pourcent,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
+        ecart_pourcent = ((prix_actuel - prix_ref) / prix_ref) * 100
+        if alerte_id:
+            operations.append(UpdateOne(
+                {"_id": alerte_id},
+                {"$set": {
+                    "niveau": niveau,
+                    "prix_actuel": prix_actuel,
+                    "prix_reference": prix_ref,
+                    "ecart_pourcentage": ecart_pourcent,
+                    "detection": detection,
+                    "updated_at": maintenant
+                }}
+            ))
+            resultat["mises_a_jour"] += 1
+            ecrites.append(alerte_id)
+            if rang_niveau(niveau) > rang_niveau(niveaux_actifs.get(alerte_id)):
+                aggravees.append(alerte_id)
         else:
-            # Créer une nouvelle alerte
-            alerte = {
+            nouvel_id = ObjectId()
+            operations.append(upsert_alerte_active(cle[0], cle[1], {
                 "niveau": niveau,
-                "type_alerte": "prix_eleve",
-                "marche_id": collecte["marche_id"],
-                "produit_id": collecte["produit_id"],
-                "prix_actuel": collecte["prix"],
+                "prix_actuel": prix_actuel,
                 "prix_reference": prix_ref,
                 "ecart_pourcentage": ecart_pourcent,
-                "statut": "active",
-                "vue_par": [],
-                "created_at": datetime.utcnow()
-            }
+                "detection": detection
+            }, maintenant, nouvel_id))
+            a_creer.append((nouvel_id, cle))
+
+    if couples is not None:
+        # Couples demandés qui ne sont plus évaluables (moins de 3 collectes
+        # validées ou aucune récente, ex: après un rejet) : le prix qui a
+        # déclenché l'alerte n'est plus valide, l'alerte est résolue
+        for cle in couples - {(c["_id"]["marche_id"], c["_id"]["produit_id"]) for c in evalues}:
+            alerte_id = actives_par_couple.get(cle)
+            if alerte_id:
+                operations.append(UpdateOne(
+                    {"_id": alerte_id, "statut": "active"},
+                    {"$set": {
+                        "statut": "resolue",
+                        "motif_resolution": "donnees_insuffisantes",
+                        "resolved_at": maintenant,
+                        "updated_at": maintenant
+                    }}
+                ))
+                resultat["resolues"] += 1
+                ecrites.append(alerte_id)
+
+    inserees = await ecrire_alertes(operations) if operations else set()
+    for nouvel_id, cle in a_creer:
+        if nouvel_id in inserees:
+            resultat["creees"] += 1
+            ecrites.append(nouvel_id)
+            creees.append(nouvel_id)
+            aggravees.append(nouvel_id)
+    concurrentes = [cle for nouvel_id, cle in a_creer if nouvel_id not in inserees]
+    if concurrentes:
+        # Alerte créée entre-temps par un autre recalcul : elle a été mise à jour
+        resultat["mises_a_jour"] += len(concurrentes)
+        deja_creees = await db.alertes.find(
+            {"statut": "active", "$or": [{"marche_id": m, "produit_id": p} for m, p in concurrentes]},
+            {"_id": 1}
+        ).to_list(None)
+        ecrites.extend(a["_id"] for a in deja_creees)
+    invalidate_aggregates()
+    await publier_alertes_par_ids(ecrites, creees)
+    await notifier_alertes_par_ids(aggravees)
+
+    return resultat
+
+
+# Couples en attente de réévaluation (file regroupée, une tâche à la fois par worker)
+_couples_a_reevaluer: Set[Tuple[str, str]] = set()
+_reevaluation: Optional[asyncio.Task] = None
+
+
+def planifier_reevaluation(couples: Iterable[Tuple[str, str]]) -> int:
+    """
+    Mettre en file la réévaluation des alertes de couples (marché, produit),
+    par exemple après une validation en lot.
+
+    Les couples ajoutés pendant un recalcul sont traités au suivant, en un
+    seul lot : la file d'un worker ne lance qu'un recalcul à la fois. Les
+    recalculs concurrents (autres workers, tâche nocturne, /generer) ne
+    créent pas de doublon : voir upsert_alerte_active.
+
+    Returns:
+        int: Nombre de couples en attente
+    """
+    global _reevaluation
+    _couples_a_reevaluer.update(couples)
+    if _couples_a_reevaluer and (_reevaluation is None or _reevaluation.done()):
+        _reevaluation = asyncio.create_task(_reevaluer())
+    return len(_couples_a_reevaluer)
+
+
+async def _reevaluer() -> None:
+    while _couples_a_reevaluer:
+        lot = set(_couples_a_reevaluer)
+        _couples_a_reevaluer.clear()
+        try:
+            resultat = await recalculer_alertes(couples=lot)
+            logger.info(f"🔔 Réévaluation de {len(lot)} couple(s): {resultat}")
+        except Exception as e:
+            # Rattrapé par le recalcul nocturne
+            logger.error(f"❌ Réévaluation des alertes de {len(lot)} couple(s) impossible: {e}")
+
 
-            await db.alertes.insert_one(alerte)
-            alertes_creees += 1
+@router.post("/generer", response_model=MessageResponse)
+async def generer_alertes_manuellement(
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Générer des alertes manuellement en analysant toutes les collectes récentes.
+    Réservé aux décideurs.
+    Utile pour recalculer les alertes ou initialiser le système.
+    Même traitement que le recalcul nocturne planifié.
+    """
+    resultat = await recalculer_alertes()
 
     return MessageResponse(
-        message=f"{alertes_creees} alerte(s) générée(s) avec succès"
+        message=f"{resultat['creees']} alerte(s) générée(s) avec succès"
     )
@@ -0,0 +1,182 @@
+"""
+Router de consultation des logs d'audit (décideurs).
+Les résultats sont envoyés en flux NDJSON (une ligne par log), paginés par
+curseur sur (timestamp, _id) : chaque page reprend après le dernier log de
+la précédente en suivant les index composés (voir services.audit_archive)
+au lieu d'un skip croissant.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import AsyncIterator, Optional, Tuple
+from datetime import datetime
+import base64
+import os
+
+import orjson
+from bson import ObjectId
+
+from backend.database import db, max_time_ms
+from backend.middleware.rbac import require_role
+from backend.services.audit_archive import lister_archives, ouvrir_archive
+
+router = APIRouter(prefix="/api/audit", tags=["Audit"])
+
+# Logs lus par aller-retour MongoDB pendant le flux
+TAILLE_LOT = 1000
+
+
+def encoder_curseur(log: dict) -> str:
+    """Curseur opaque désignant la position après `log`"""
+    valeur = f"{log['timestamp'].isoformat()}|{log['_id']}"
+    return base64.urlsafe_b64encode(valeur.encode()).decode()
+
+
+def decoder_curseur(curseur: str) -> Tuple[datetime, ObjectId]:
+    """
+    Décoder un curseur de pagination.
+
+    Raises:
+        HTTPException: 400 si le curseur est invalide
+    """
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(curseur.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(log_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur de pagination invalide"
+        )
+
+
+def _serialiser(log: dict) -> bytes:
+    log["id"] = str(log.pop("_id"))
+    return orjson.dumps(log, default=str, option=orjson.OPT_APPEND_NEWLINE)
+
+
+async def _flux(query: dict, limit: int) -> AsyncIterator[bytes]:
+    curseur = (
+        db.audit_logs.find(query)
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(limit)
+        .batch_size(TAILLE_LOT)
+        .max_time_ms(max_time_ms("analytics"))
+    )
+    lignes = []
+    async for log in curseur:
+        lignes.append(_serialiser(log))
+        if len(lignes) >= TAILLE_LOT:
+            yield b"".join(lignes)
+            lignes = []
+    if lignes:
+        yield b"".join(lignes)
+
+
+@router.get("/logs")
+async def get_audit_logs(
+    user_id: Optional[str] = Query(None),
+    email: Optional[str] = Query(None, description="Tentatives de connexion d'un email"),
+    action: Optional[str] = Query(None),
+    resource_type: Optional[str] = Query(None),
+    resource_id: Optional[str] = Query(None),
+    success: Optional[bool] = Query(None),
+    date_debut: Optional[str] = Query(None, description="Date de début (YYYY-MM-DD ou ISO)"),
+    date_fin: Optional[str] = Query(None, description="Date de fin (exclue)"),
+    after: Optional[str] = Query(None, description="Curseur X-Next-Cursor de la page précédente"),
+    limit: int = Query(1000, ge=1, le=50000),
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Rechercher les logs d'audit, du plus récent au plus ancien.
+
+    La réponse est un flux NDJSON (application/x-ndjson). Si d'autres logs
+    suivent, l'en-tête X-Next-Cursor contient le curseur à passer dans
+    `after` pour la page suivante. Les mois purgés (archivés et plus anciens
+    que AUDIT_RETENTION_DAYS) sont disponibles dans les archives
+    (GET /api/audit/archives).
+
+    Réservé aux décideurs.
+    """
+    query = {}
+    for champ, valeur in (
+        ("user_id", user_id), ("email", email), ("action", action),
+        ("resource_type", resource_type), ("resource_id", resource_id), ("success", success)
+    ):
+        if valeur is not None:
+            query[champ] = valeur
+
+    try:
+        periode = {}
+        if date_debut:
+            periode["$gte"] = datetime.fromisoformat(date_debut)
+        if date_fin:
+            periode["$lt"] = datetime.fromisoformat(date_fin)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format de date invalide (YYYY-MM-DD ou ISO attendu)"
+        )
+    if not after:
+        # Première page : borne supérieure commune aux deux requêtes (bornes
+        # et flux), sinon un log inséré entre elles décale la page et le
+        # dernier log avant le curseur suivant serait sauté. Les pages
+        # suivantes sont bornées par le curseur.
+        periode["$lte"] = datetime.utcnow()
+    if periode:
+        query["timestamp"] = periode
+
+    if after:
+        timestamp, log_id = decoder_curseur(after)
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": log_id}}
+        ]}]}
+
+    # Dernier log de la page et existence d'un suivant (parcours d'index) :
+    # le curseur suivant est connu avant l'envoi du flux
+    headers = {}
+    bornes = await (
+        db.audit_logs.find(query, {"timestamp": 1})
+        .sort([("timestamp", -1), ("_id", -1)])
+        .skip(limit - 1)
+        .limit(2)
+        .max_time_ms(max_time_ms("analytics"))
+        .to_list(2)
+    )
+    if len(bornes) == 2:
+        headers["X-Next-Cursor"] = encoder_curseur(bornes[0])
+
+    return StreamingResponse(_flux(query, limit), media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/archives", response_class=ORJSONResponse)
+async def get_audit_archives(
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Lister les archives mensuelles des logs d'audit (fichier, format, nombre
+    de logs, empreinte SHA-256). Réservé aux décideurs.
+    """
+    return await lister_archives()
+
+
+@router.get("/archives/{periode}/fichier")
+async def download_audit_archive(
+    periode: str,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Télécharger le fichier d'archive d'un mois (AAAA-MM), depuis GridFS ou
+    AUDIT_ARCHIVE_DIR. Réservé aux décideurs.
+    """
+    ouverte = await ouvrir_archive(periode)
+    if ouverte is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Archive introuvable")
+    archive, flux = ouverte
+    nom = os.path.basename(archive["fichier"])
+    media_type = "application/vnd.apache.parquet" if archive["format"] == "parquet" else "application/gzip"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{nom}"',
+        "X-Checksum-SHA256": archive["sha256"]
+    }
+    return StreamingResponse(flux, media_type=media_type, headers=headers)
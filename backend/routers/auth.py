@@ -11,13 +11,15 @@ from bson import ObjectId
 
 from backend.database import get_collection
 from backend.services import auth as auth_service
-from backend.models import UserCreate, UserResponse, UserInDB
-from backend.middleware.security import get_current_user
+from backend.models import MessageResponse, UserCreate, UserResponse, UserInDB
+from backend.middleware.security import get_current_user, get_token_payload
 from backend.middleware.rbac import require_decideur
 from backend.middleware.audit import (
     log_action, log_auth_attempt, log_mfa_setup,
     log_mfa_verification, get_client_ip
 )
+from backend.services.rate_limit import limiter_connexion, limiter_mfa, reinitialiser
+from backend.services.token_revocation import revoquer_token, revoquer_utilisateur
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
@@ -65,6 +67,11 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 
+class LogoutRequest(BaseModel):
+    """Requête de déconnexion (le refresh token de la session est aussi révoqué)"""
+    refresh_token: Optional[str] = None
+
+
 class TokenResponse(BaseModel):
     """Réponse avec nouveau token"""
     access_token: str
@@ -139,12 +146,13 @@ async def register(user_data: UserCreate, request: Request):
     )
 
 
-@router.post("/login", response_model=LoginResponse)
+@router.post("/login", response_model=LoginResponse, dependencies=[Depends(limiter_connexion)])
 async def login(credentials: LoginRequest, request: Request):
     """
     Connexion d'un utilisateur.
     Si MFA activé, retourne un temp_token pour vérification.
     Sinon retourne directement les tokens d'accès.
+    Les tentatives sont limitées par IP et par email (429 + Retry-After).
     """
     users_collection = get_collection("users")
     ip_address = get_client_ip(request)
@@ -177,6 +185,9 @@ async def login(credentials: LoginRequest, request: Request):
             detail="Email ou mot de passe incorrect"
         )
 
+    # Mot de passe correct : les échecs précédents de l'email ne comptent plus
+    await reinitialiser("login_email", credentials.email.strip().lower())
+
     # Vérifier que le compte est actif
     if not user_doc.get("actif", True):
         await log_auth_attempt(
@@ -251,10 +262,11 @@ async def login(credentials: LoginRequest, request: Request):
     )
 
 
-@router.post("/verify-mfa", response_model=LoginResponse)
+@router.post("/verify-mfa", response_model=LoginResponse, dependencies=[Depends(limiter_mfa)])
 async def verify_mfa(verify_data: MFAVerifyRequest, request: Request):
     """
     Vérifier le code MFA et retourner les tokens d'accès.
+    Les vérifications sont limitées par IP et par utilisateur (429 + Retry-After).
     """
     ip_address = get_client_ip(request)
 
@@ -331,6 +343,9 @@ async def verify_mfa(verify_data: MFAVerifyRequest, request: Request):
             ip_address=ip_address
         )
 
+    # Code correct : les échecs précédents de l'utilisateur ne comptent plus
+    await reinitialiser("mfa_user", user_id)
+
     # Générer les tokens
     access_token = auth_service.create_access_token(
         data={"sub": str(user.id), "email": user.email, "roles": user.roles}
@@ -410,6 +425,81 @@ async def refresh_token(token_data: RefreshTokenRequest):
     )
 
 
+@router.post("/logout", response_model=MessageResponse)
+async def logout(
+    request: Request,
+    logout_data: Optional[LogoutRequest] = None,
+    payload: dict = Depends(get_token_payload),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Déconnecter la session courante : le token d'accès (et le refresh token
+    fourni) sont révoqués jusqu'à leur expiration, sur tous les workers.
+    """
+    await revoquer_token(payload, revoque_par=str(current_user.id))
+    if logout_data and logout_data.refresh_token:
+        refresh_payload = auth_service.decode_token(logout_data.refresh_token)
+        if refresh_payload and refresh_payload.get("sub") == payload.get("sub"):
+            await revoquer_token(refresh_payload, revoque_par=str(current_user.id))
+
+    await log_action(
+        user_id=str(current_user.id),
+        action="logout",
+        ip_address=get_client_ip(request)
+    )
+    return MessageResponse(message="Déconnexion réussie")
+
+
+@router.post("/logout-all", response_model=MessageResponse)
+async def logout_all(
+    request: Request,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Déconnecter toutes les sessions de l'utilisateur : tous ses tokens
+    (accès et refresh) émis jusqu'à maintenant sont révoqués.
+    """
+    await revoquer_utilisateur(str(current_user.id), revoque_par=str(current_user.id))
+    await log_action(
+        user_id=str(current_user.id),
+        action="logout_all",
+        ip_address=get_client_ip(request)
+    )
+    return MessageResponse(message="Toutes les sessions ont été déconnectées")
+
+
+@router.post("/users/{user_id}/revoke-tokens", response_model=MessageResponse)
+async def revoke_user_tokens(
+    user_id: str,
+    request: Request,
+    current_user: UserInDB = Depends(require_decideur)
+):
+    """
+    Révoquer tous les tokens d'un utilisateur (compte compromis), sans
+    attendre leur expiration. Réservé aux décideurs.
+    """
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID utilisateur invalide"
+        )
+    if not await get_collection("users").find_one({"_id": ObjectId(user_id)}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+
+    await revoquer_utilisateur(user_id, revoque_par=str(current_user.id))
+    await log_action(
+        user_id=str(current_user.id),
+        action="tokens_revoked",
+        resource_type="user",
+        resource_id=user_id,
+        ip_address=get_client_ip(request)
+    )
+    return MessageResponse(message="Tokens de l'utilisateur révoqués")
+
+
 @router.get("/me", response_model=UserResponse)
 async def get_me(current_user: UserInDB = Depends(get_current_user)):
     """
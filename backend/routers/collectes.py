@@ -4,22 +4,81 @@ Support du mode hors-ligne avec synchronisation.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
 from datetime import datetime, timedelta
 from bson import ObjectId
+import asyncio
 
 from backend.models import (
-    CollecteCreate, CollecteResponse, CollecteBatchCreate,
+    CollecteCreate, CollecteResponse, CollecteBatchCreate, CollecteBatchDecision,
     MessageResponse
 )
 from backend.middleware.security import get_current_user
 from backend.middleware.rbac import require_role, can_submit_collectes, can_validate_collectes
-from backend.database import db
+from backend.database import db, find_by_ids, max_time_ms
+from backend.services.serialization import trusted_list_response
+from backend.services.cache import invalidate_aggregates, statistiques_cache
+from backend.services.statistiques import (
+    calculer_repartitions,
+    filtre_periode,
+    normaliser_date,
+    ventiler_par_nom
+)
 
 router = APIRouter(prefix="/api/collectes", tags=["Collectes de Prix"])
 
+# Périodes de collecte d'une journée, dans l'ordre de saisie
+PERIODES = ("matin1", "matin2", "soir1", "soir2")
+
+# Collectes exclues des prix de comparaison
+STATUTS_REJETES = ("rejetee", "rejetée")
+STATUTS_VALIDES = ("validee", "validée")
+
+# Champs lus pour les listes de collectes (exclut motif_rejet, synced_at, etc.)
+COLLECTE_PROJECTION = {
+    "marche_id": 1, "produit_id": 1, "unite_id": 1, "quantite": 1, "prix": 1,
+    "date": 1, "periode": 1, "commentaire": 1, "image": 1, "agent_id": 1,
+    "statut": 1, "latitude": 1, "longitude": 1, "created_at": 1
+}
 
-@router.get("", response_model=List[CollecteResponse])
+
+async def enrichir_collectes(collectes: List[dict]) -> List[dict]:
+    """
+    Enrichir des collectes avec les noms de marché, commune, produit, unité
+    et agent (une requête $in par collection), pour les listes et le
+    tableau de bord. Les documents sont modifiés en place.
+    """
+    marches, produits, unites, agents = await asyncio.gather(
+        find_by_ids("marches", {c.get("marche_id") for c in collectes}, {"nom": 1, "commune_id": 1}),
+        find_by_ids("produits", {c.get("produit_id") for c in collectes}, {"nom": 1}),
+        find_by_ids("unites_mesure", {c.get("unite_id") for c in collectes}, {"unite": 1}),
+        find_by_ids("users", {c.get("agent_id") for c in collectes}, {"nom": 1, "prenom": 1})
+    )
+    communes = await find_by_ids("communes", {m.get("commune_id") for m in marches.values()}, {"nom": 1})
+
+    rows = []
+    for collecte in collectes:
+        marche = marches.get(collecte["marche_id"])
+        commune = communes.get(marche.get("commune_id")) if marche else None
+        produit = produits.get(collecte["produit_id"])
+        unite = unites.get(collecte.get("unite_id"))
+        agent = agents.get(collecte["agent_id"])
+
+        collecte["id"] = str(collecte.pop("_id"))
+        collecte.setdefault("unite_id", "")
+        collecte.setdefault("quantite", 1)
+        collecte["marche_nom"] = marche.get("nom") if marche else None
+        collecte["commune_nom"] = commune.get("nom") if commune else None
+        collecte["produit_nom"] = produit.get("nom") if produit else None
+        collecte["unite_nom"] = unite.get("unite") if unite else None
+        collecte["agent_nom"] = f"{agent.get('prenom', '')} {agent.get('nom', '')}".strip() if agent else None
+        rows.append(collecte)
+
+    return rows
+
+
+@router.get("", response_model=List[CollecteResponse], response_class=ORJSONResponse)
 async def get_collectes(
     marche_id: Optional[str] = Query(None, description="Filtrer par marché"),
     produit_id: Optional[str] = Query(None, description="Filtrer par produit"),
@@ -74,42 +133,170 @@ async def get_collectes(
             date_query["$lte"] = datetime.fromisoformat(date_fin)
         query["date"] = date_query
 
-    collectes = await db.collectes_prix.find(query).sort("date", -1).limit(limit).to_list(None)
+    collectes = await (
+        db.collectes_prix.find(query, COLLECTE_PROJECTION)
+        .sort("date", -1)
+        .limit(limit)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
 
-    # Enrichir les données avec les noms
-    result = []
-    for collecte in collectes:
-        # Récupérer les données associées
-        marche = await db.marches.find_one({"_id": ObjectId(collecte["marche_id"])})
-        commune = await db.communes.find_one({"_id": ObjectId(marche["commune_id"])}) if marche and marche.get("commune_id") else None
-        produit = await db.produits.find_one({"_id": ObjectId(collecte["produit_id"])})
-        unite = await db.unites_mesure.find_one({"_id": ObjectId(collecte["unite_id"])}) if collecte.get("unite_id") else None
-        agent = await db.users.find_one({"_id": ObjectId(collecte["agent_id"])})
-
-        result.append(CollecteResponse(
-            id=str(collecte["_id"]),
-            marche_id=collecte["marche_id"],
-            produit_id=collecte["produit_id"],
-            unite_id=collecte.get("unite_id", ""),
-            quantite=collecte.get("quantite", 1),
-            prix=collecte["prix"],
-            date=collecte["date"],
-            periode=collecte.get("periode"),
-            commentaire=collecte.get("commentaire"),
-            image=collecte.get("image"),
-            agent_id=collecte["agent_id"],
-            statut=collecte["statut"],
-            latitude=collecte.get("latitude"),
-            longitude=collecte.get("longitude"),
-            created_at=collecte["created_at"],
-            marche_nom=marche.get("nom") if marche else None,
-            commune_nom=commune.get("nom") if commune else None,
-            produit_nom=produit.get("nom") if produit else None,
-            unite_nom=unite.get("unite") if unite else None,
-            agent_nom=f"{agent.get('prenom', '')} {agent.get('nom', '')}".strip() if agent else None
-        ))
-
-    return result
+    rows = await enrichir_collectes(collectes)
+
+    # Lecture de confiance : pas de revalidation Pydantic ligne par ligne
+    return trusted_list_response(CollecteResponse, rows)
+
+
+@router.get("/grille", response_model=dict, response_class=ORJSONResponse)
+async def get_grille_collectes(
+    marche_id: str = Query(..., description="Marché"),
+    date: Optional[str] = Query(None, description="Jour de collecte (YYYY-MM-DD, défaut: aujourd'hui)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Grille de saisie d'un marché pour un jour : une ligne par produit
+    attendu (tableau `produits` du marché, produits actifs) et par produit
+    déjà collecté hors liste, avec le prix saisi pour chaque période et les
+    prix de la veille pour comparaison.
+
+    Le marché, ses produits, unités et les collectes des deux jours sont lus
+    en une seule agrégation. Si plusieurs collectes existent pour une même
+    case, la plus récente est retenue ; pour la veille, la plus récente des
+    collectes validées.
+
+    - Agents: uniquement leurs propres collectes
+    - Décideurs/Bailleurs: toutes les collectes du marché
+    """
+    if not ObjectId.is_valid(marche_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de marché invalide"
+        )
+    try:
+        jour = datetime.fromisoformat(date) if date else datetime.utcnow()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format de date invalide (YYYY-MM-DD attendu)"
+        )
+    jour = jour.replace(hour=0, minute=0, second=0, microsecond=0)
+    veille = jour - timedelta(days=1)
+
+    filtre_collectes = {
+        "marche_id": marche_id,
+        "date": {"$gte": veille, "$lt": jour + timedelta(days=1)},
+        "periode": {"$in": list(PERIODES)},
+        # Veille : collectes validées seulement, avant de retenir la plus récente
+        "$or": [
+            {"date": {"$gte": jour}},
+            {"statut": {"$in": list(STATUTS_VALIDES)}}
+        ]
+    }
+    if "agent" in current_user.roles:
+        filtre_collectes["agent_id"] = str(current_user.id)
+
+    def vers_object_ids(champ_marche: str, champ_collecte: str) -> dict:
+        """IDs référencés par le marché et par les collectes trouvées"""
+        def convertir(tableau: str, champ: str) -> dict:
+            return {"$map": {
+                "input": {"$ifNull": [tableau, []]},
+                "in": {"$convert": {"input": f"$$this.{champ}", "to": "objectId", "onError": None, "onNull": None}}
+            }}
+        return {"$setUnion": [convertir("$produits", champ_marche), convertir("$collectes", champ_collecte)]}
+
+    resultats = await db.marches.aggregate([
+        {"$match": {"_id": ObjectId(marche_id)}},
+        {"$project": {"nom": 1, "produits": 1}},
+        {"$lookup": {
+            "from": "collectes_prix",
+            "pipeline": [
+                {"$match": filtre_collectes},
+                {"$sort": {"created_at": -1}},
+                {"$group": {
+                    "_id": {
+                        "produit_id": "$produit_id",
+                        "veille": {"$lt": ["$date", jour]},
+                        "periode": "$periode"
+                    },
+                    "id": {"$first": "$_id"},
+                    "prix": {"$first": "$prix"},
+                    "statut": {"$first": "$statut"},
+                    "unite_id": {"$first": "$unite_id"}
+                }}
+            ],
+            "as": "collectes"
+        }},
+        {"$lookup": {
+            "from": "produits",
+            "let": {"ids": vers_object_ids("id_produit", "_id.produit_id")},
+            "pipeline": [
+                {"$match": {"$expr": {"$in": ["$_id", "$$ids"]}}},
+                {"$project": {"nom": 1}}
+            ],
+            "as": "fiches_produits"
+        }},
+        {"$lookup": {
+            "from": "unites_mesure",
+            "let": {"ids": vers_object_ids("id_unite_mesure", "unite_id")},
+            "pipeline": [
+                {"$match": {"$expr": {"$in": ["$_id", "$$ids"]}}},
+                {"$project": {"unite": 1}}
+            ],
+            "as": "fiches_unites"
+        }}
+    ], maxTimeMS=max_time_ms("read")).to_list(1)
+
+    if not resultats:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Marché non trouvé"
+        )
+    marche = resultats[0]
+    noms_produits = {str(p["_id"]): p.get("nom") for p in marche["fiches_produits"]}
+    noms_unites = {str(u["_id"]): u.get("unite") for u in marche["fiches_unites"]}
+
+    def ligne(produit_id: str, unite_id: Optional[str], attendu: bool) -> dict:
+        return {
+            "produit_id": produit_id,
+            "produit_nom": noms_produits.get(produit_id),
+            "unite_id": unite_id,
+            "unite_nom": noms_unites.get(unite_id),
+            "attendu": attendu,
+            "prix": {periode: None for periode in PERIODES},
+            "veille": {periode: None for periode in PERIODES}
+        }
+
+    lignes = {}
+    for produit in marche.get("produits") or []:
+        produit_id = produit.get("id_produit")
+        if produit_id and produit.get("actif", True) and produit_id not in lignes:
+            lignes[produit_id] = ligne(produit_id, produit.get("id_unite_mesure"), True)
+
+    for case in marche["collectes"]:
+        cle = case["_id"]
+        rangee = lignes.get(cle["produit_id"])
+        if rangee is None:
+            # Produit collecté hors de la liste du marché
+            rangee = lignes[cle["produit_id"]] = ligne(cle["produit_id"], case.get("unite_id"), False)
+        if cle["veille"]:
+            rangee["veille"][cle["periode"]] = case["prix"]
+        else:
+            rangee["prix"][cle["periode"]] = {
+                "id": str(case["id"]),
+                "prix": case["prix"],
+                "statut": case.get("statut")
+            }
+
+    rangees = sorted(lignes.values(), key=lambda r: (not r["attendu"], r["produit_nom"] or ""))
+    attendues = [r for r in rangees if r["attendu"]]
+    return {
+        "marche": {"id": marche_id, "nom": marche.get("nom")},
+        "date": jour.date().isoformat(),
+        "periodes": list(PERIODES),
+        "produits": rangees,
+        "cases_attendues": len(attendues) * len(PERIODES),
+        "cases_saisies": sum(1 for r in attendues for cellule in r["prix"].values() if cellule)
+    }
 
 
 @router.get("/{collecte_id}", response_model=CollecteResponse)
@@ -134,7 +321,7 @@ async def get_collecte(
         )
 
     # Les agents ne peuvent voir que leurs collectes
-    if "agent" in current_user.roles and collecte["agent_id"] != current_user.id:
+    if "agent" in current_user.roles and collecte["agent_id"] != str(current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Accès non autorisé à cette collecte"
@@ -236,7 +423,7 @@ async def create_collecte(
         "produit_id": collecte.produit_id,
         "unite_id": collecte.unite_id,
         "date": collecte.date,
-        "agent_id": current_user.id
+        "agent_id": str(current_user.id)
     }
 
     # Inclure la période si fournie
@@ -255,7 +442,7 @@ async def create_collecte(
         )
 
     collecte_dict = collecte.model_dump(exclude_none=False)
-    collecte_dict["agent_id"] = current_user.id
+    collecte_dict["agent_id"] = str(current_user.id)
     collecte_dict["statut"] = "validee"  # Validation automatique pour temps réel
     collecte_dict["validee_at"] = datetime.utcnow()
     collecte_dict["created_at"] = datetime.utcnow()
@@ -274,6 +461,8 @@ async def create_collecte(
         import logging
         logging.error(f"Erreur lors de la génération d'alertes: {e}")
 
+    invalidate_aggregates()
+
     return CollecteResponse(
         id=str(created_collecte["_id"]),
         marche_id=created_collecte["marche_id"],
@@ -359,7 +548,7 @@ async def create_collectes_batch(
                 "produit_id": collecte.produit_id,
                 "unite_id": collecte.unite_id,
                 "date": collecte.date,
-                "agent_id": current_user.id
+                "agent_id": str(current_user.id)
             }
             if collecte.periode:
                 duplicate_query["periode"] = collecte.periode
@@ -371,7 +560,7 @@ async def create_collectes_batch(
 
             # Créer la collecte
             collecte_dict = collecte.model_dump(exclude_none=False)
-            collecte_dict["agent_id"] = current_user.id
+            collecte_dict["agent_id"] = str(current_user.id)
             collecte_dict["statut"] = "validee"  # Validation automatique pour temps réel
             collecte_dict["validee_at"] = datetime.utcnow()
             collecte_dict["created_at"] = datetime.utcnow()
@@ -391,6 +580,9 @@ async def create_collectes_batch(
         except Exception as e:
             errors.append(f"Collecte {idx+1}: {str(e)}")
 
+    if created_count:
+        invalidate_aggregates()
+
     return {
         "message": f"{created_count} collecte(s) créée(s) avec succès",
         "created": created_count,
@@ -399,6 +591,128 @@ async def create_collectes_batch(
     }
 
 
+async def _decider_lot(selection: CollecteBatchDecision, champs: dict, deja_faits: tuple) -> dict:
+    """
+    Appliquer une décision (validation ou rejet) à une sélection de
+    collectes en un seul update_many, puis mettre en file la réévaluation
+    des alertes des couples (marché, produit) modifiés.
+
+    Args:
+        selection: IDs et/ou filtres
+        champs: Champs posés sur les collectes ($set)
+        deja_faits: Statuts laissés tels quels (décision déjà prise)
+
+    Returns:
+        dict: Compteurs de la décision : trouvees, modifiees, ignorees (déjà
+        décidées), introuvables (IDs invalides ou inexistants), hors_selection
+        (IDs existants écartés par les filtres), couples_reevalues
+    """
+    query = {}
+    introuvables = 0
+    if selection.ids:
+        ids = {ObjectId(i) for i in selection.ids if ObjectId.is_valid(i)}
+        introuvables = len(set(selection.ids)) - len(ids)
+        query["_id"] = {"$in": list(ids)}
+    for champ in ("marche_id", "produit_id", "agent_id"):
+        if getattr(selection, champ):
+            query[champ] = getattr(selection, champ)
+    if selection.date_debut or selection.date_fin:
+        query["date"] = {}
+        if selection.date_debut:
+            query["date"]["$gte"] = selection.date_debut.replace(hour=0, minute=0, second=0, microsecond=0)
+        if selection.date_fin:
+            fin = selection.date_fin.replace(hour=0, minute=0, second=0, microsecond=0)
+            query["date"]["$lt"] = fin + timedelta(days=1)
+
+    collectes = await db.collectes_prix.find(
+        query, {"statut": 1, "marche_id": 1, "produit_id": 1}
+    ).to_list(None)
+    hors_selection = 0
+    if selection.ids:
+        # IDs existants mais écartés par les autres filtres (marché, dates...)
+        existantes = len(collectes)
+        if len(query) > 1 and existantes < len(query["_id"]["$in"]):
+            existantes = await db.collectes_prix.count_documents({"_id": query["_id"]})
+        introuvables += len(query["_id"]["$in"]) - existantes
+        hors_selection = existantes - len(collectes)
+    a_modifier = [c for c in collectes if c.get("statut") not in deja_faits]
+
+    modifiees = 0
+    couples = set()
+    if a_modifier:
+        # Statut revérifié à l'écriture : une décision concurrente n'est pas écrasée
+        resultat = await db.collectes_prix.update_many(
+            {"_id": {"$in": [c["_id"] for c in a_modifier]}, "statut": {"$nin": list(deja_faits)}},
+            {"$set": champs}
+        )
+        modifiees = resultat.modified_count
+        couples = {(c["marche_id"], c["produit_id"]) for c in a_modifier}
+
+    if modifiees:
+        invalidate_aggregates()
+        from backend.routers.alertes import planifier_reevaluation
+        planifier_reevaluation(couples)
+
+    return {
+        "trouvees": len(collectes),
+        "modifiees": modifiees,
+        "ignorees": len(collectes) - modifiees,
+        "introuvables": introuvables,
+        "hors_selection": hors_selection,
+        "couples_reevalues": len(couples) if modifiees else 0
+    }
+
+
+@router.post("/batch/valider", response_model=dict)
+async def valider_collectes_batch(
+    selection: CollecteBatchDecision,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Valider en lot les collectes sélectionnées (IDs et/ou marché, produit,
+    agent, période). Réservé aux décideurs.
+
+    Les collectes déjà validées sont ignorées. Les alertes des couples
+    (marché, produit) concernés sont recalculées en arrière-plan.
+    """
+    maintenant = datetime.utcnow()
+    resultat = await _decider_lot(selection, {
+        "statut": "validee",
+        "validee_par": str(current_user.id),
+        "validee_at": maintenant,
+        "updated_at": maintenant
+    }, STATUTS_VALIDES)
+    return {"message": f"{resultat['modifiees']} collecte(s) validée(s)", **resultat}
+
+
+@router.post("/batch/rejeter", response_model=dict)
+async def rejeter_collectes_batch(
+    selection: CollecteBatchDecision,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Rejeter en lot les collectes sélectionnées avec un même motif.
+    Réservé aux décideurs.
+
+    Les collectes déjà rejetées sont ignorées. Les alertes des couples
+    (marché, produit) concernés sont recalculées en arrière-plan.
+    """
+    if not selection.motif:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Le motif du rejet est obligatoire"
+        )
+    maintenant = datetime.utcnow()
+    resultat = await _decider_lot(selection, {
+        "statut": "rejetee",
+        "motif_rejet": selection.motif,
+        "validee_par": str(current_user.id),
+        "validee_at": maintenant,
+        "updated_at": maintenant
+    }, STATUTS_REJETES)
+    return {"message": f"{resultat['modifiees']} collecte(s) rejetée(s)", **resultat}
+
+
 @router.put("/{collecte_id}", response_model=CollecteResponse)
 async def update_collecte(
     collecte_id: str,
@@ -426,7 +740,7 @@ async def update_collecte(
 
     # Vérifier les permissions
     is_agent = "agent" in current_user.roles
-    is_own_collecte = existing["agent_id"] == current_user.id
+    is_own_collecte = existing["agent_id"] == str(current_user.id)
     is_validated = existing["statut"] in ["validée", "rejetée"]
 
     if is_agent and (not is_own_collecte or is_validated):
@@ -445,6 +759,8 @@ async def update_collecte(
 
     updated_collecte = await db.collectes_prix.find_one({"_id": ObjectId(collecte_id)})
 
+    invalidate_aggregates()
+
     # Enrichir avec les noms
     marche = await db.marches.find_one({"_id": ObjectId(updated_collecte["marche_id"])})
     commune = await db.communes.find_one({"_id": ObjectId(marche["commune_id"])}) if marche and marche.get("commune_id") else None
@@ -501,7 +817,7 @@ async def delete_collecte(
 
     # Vérifier les permissions
     is_agent = "agent" in current_user.roles
-    is_own_collecte = existing["agent_id"] == current_user.id
+    is_own_collecte = existing["agent_id"] == str(current_user.id)
     is_validated = existing["statut"] in ["validée", "rejetée"]
 
     if is_agent and (not is_own_collecte or is_validated):
@@ -511,6 +827,7 @@ async def delete_collecte(
         )
 
     await db.collectes_prix.delete_one({"_id": ObjectId(collecte_id)})
+    invalidate_aggregates()
 
     return MessageResponse(message="Collecte supprimée avec succès")
 
@@ -550,7 +867,7 @@ async def valider_collecte(
         {
             "$set": {
                 "statut": "validee",
-                "validee_par": current_user.id,
+                "validee_par": str(current_user.id),
                 "validee_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
@@ -568,6 +885,8 @@ async def valider_collecte(
         import logging
         logging.error(f"Erreur lors de la génération d'alertes: {e}")
 
+    invalidate_aggregates()
+
     # Enrichir avec les noms
     marche = await db.marches.find_one({"_id": ObjectId(updated_collecte["marche_id"])})
     commune = await db.communes.find_one({"_id": ObjectId(marche["commune_id"])}) if marche and marche.get("commune_id") else None
@@ -627,7 +946,7 @@ async def rejeter_collecte(
             "$set": {
                 "statut": "rejetee",
                 "motif_rejet": motif,
-                "validee_par": current_user.id,
+                "validee_par": str(current_user.id),
                 "validee_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
@@ -636,6 +955,8 @@ async def rejeter_collecte(
 
     updated_collecte = await db.collectes_prix.find_one({"_id": ObjectId(collecte_id)})
 
+    invalidate_aggregates()
+
     # Enrichir avec les noms
     marche = await db.marches.find_one({"_id": ObjectId(updated_collecte["marche_id"])})
     commune = await db.communes.find_one({"_id": ObjectId(marche["commune_id"])}) if marche and marche.get("commune_id") else None
@@ -679,50 +1000,40 @@ async def get_statistiques_collectes(
     - Nombre total de collectes
     - Répartition par statut
     - Nombre de collectes par agent (décideurs uniquement)
-    - Moyenne des prix par produit
-    """
-    query = {}
+    - Répartitions par département, par produit et par jour
 
+    Toutes les répartitions sont calculées en une seule agrégation $facet,
+    mise en cache quelques secondes par filtres normalisés.
+    """
     # Les agents ne voient que leurs stats
-    if "agent" in current_user.roles:
-        # FIX: Convertir ObjectId en string pour correspondre aux agent_id stockés
-        query["agent_id"] = str(current_user.id)
-
-    # Filtre par période
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = datetime.fromisoformat(date_debut)
-        if date_fin:
-            date_query["$lte"] = datetime.fromisoformat(date_fin)
-        query["date"] = date_query
-
-    # Compter total
-    total = await db.collectes_prix.count_documents(query)
-
-    # Répartition par statut
-    pipeline_statut = [
-        {"$match": query},
-        {"$group": {"_id": "$statut", "count": {"$sum": 1}}}
-    ]
-    statuts = await db.collectes_prix.aggregate(pipeline_statut).to_list(None)
-
-    stats = {
-        "total_collectes": total,
-        "par_statut": {s["_id"]: s["count"] for s in statuts},
-        "periode": {
-            "debut": date_debut,
-            "fin": date_fin
+    # FIX: Convertir ObjectId en string pour correspondre aux agent_id stockés
+    agent_id = str(current_user.id) if "agent" in current_user.roles else None
+    par_agent = any(role in current_user.roles for role in ["décideur", "bailleur"])
+    cle = ("collectes", agent_id, par_agent, normaliser_date(date_debut), normaliser_date(date_fin))
+
+    async def calculer() -> dict:
+        query = filtre_periode("date", date_debut, date_fin)
+        if agent_id:
+            query["agent_id"] = agent_id
+
+        groupes = {"par_statut": "$statut"}
+        # Stats par agent (décideurs uniquement)
+        if par_agent:
+            groupes["par_agent"] = "$agent_id"
+
+        repartitions = await calculer_repartitions("collectes_prix", query, "date", groupes)
+        stats = {
+            "total_collectes": sum(repartitions["par_statut"].values()),
+            "par_statut": repartitions["par_statut"],
+            "periode": {
+                "debut": date_debut,
+                "fin": date_fin
+            }
         }
-    }
-
-    # Stats par agent (décideurs uniquement)
-    if any(role in current_user.roles for role in ["décideur", "bailleur"]):
-        pipeline_agent = [
-            {"$match": query},
-            {"$group": {"_id": "$agent_id", "count": {"$sum": 1}}}
-        ]
-        agents = await db.collectes_prix.aggregate(pipeline_agent).to_list(None)
-        stats["par_agent"] = {a["_id"]: a["count"] for a in agents}
+        if par_agent:
+            stats["par_agent"] = repartitions["par_agent"]
+        stats.update(await ventiler_par_nom(repartitions))
+        stats["par_jour"] = dict(sorted(repartitions["par_jour"].items()))
+        return stats
 
-    return stats
+    return await statistiques_cache.get_or_compute(cle, calculer)
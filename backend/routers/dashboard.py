@@ -0,0 +1,142 @@
+"""
+Router du tableau de bord.
+Un seul appel retourne tous les widgets du rôle de l'utilisateur, calculés
+en parallèle et mis en cache par rôle et périmètre.
+"""
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
+from datetime import datetime, timedelta
+import asyncio
+
+from backend.middleware.security import get_current_user
+from backend.database import db, analytics_db, max_time_ms
+from backend.routers.collectes import COLLECTE_PROJECTION, enrichir_collectes
+from backend.routers.alertes import enrichir_alertes
+from backend.services.cache import dashboard_cache
+
+router = APIRouter(prefix="/api/dashboard", tags=["Tableau de bord"])
+
+# Nombre de lignes des listes « dernières collectes / alertes »
+DERNIERES_LIMITE = 10
+
+
+# ============================================================================
+# Widgets
+# ============================================================================
+
+async def widgets_collectes(agent_id: str) -> dict:
+    """
+    Widgets de l'agent : compteurs de ses collectes et dernières collectes.
+
+    Args:
+        agent_id: Identifiant de l'agent (périmètre)
+    """
+    query = {"agent_id": agent_id}
+    debut_jour = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    timeout_ms = max_time_ms("analytics")
+
+    par_statut, du_jour, dernieres = await asyncio.gather(
+        analytics_db.collectes_prix.aggregate([
+            {"$match": query},
+            {"$group": {"_id": "$statut", "count": {"$sum": 1}}}
+        ], maxTimeMS=timeout_ms).to_list(None),
+        analytics_db.collectes_prix.count_documents(
+            {**query, "date": {"$gte": debut_jour, "$lt": debut_jour + timedelta(days=1)}},
+            maxTimeMS=timeout_ms
+        ),
+        db.collectes_prix.find(query, COLLECTE_PROJECTION)
+        .sort("date", -1)
+        .limit(DERNIERES_LIMITE)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
+
+    statuts = {s["_id"]: s["count"] for s in par_statut}
+    return {
+        "collectes": {
+            "total_collectes": sum(statuts.values()),
+            "collectes_du_jour": du_jour,
+            "par_statut": statuts
+        },
+        "dernieres_collectes": await enrichir_collectes(dernieres)
+    }
+
+
+async def widgets_alertes() -> dict:
+    """
+    Widgets du décideur : compteurs des alertes actives et dernières alertes.
+    Les listes « vue_par » sont conservées pour calculer le champ « vue » de
+    chaque utilisateur sans multiplier les entrées du cache.
+    """
+    query = {"statut": "active"}
+    timeout_ms = max_time_ms("analytics")
+
+    par_niveau, dernieres = await asyncio.gather(
+        analytics_db.alertes.aggregate([
+            {"$match": query},
+            {"$group": {"_id": "$niveau", "count": {"$sum": 1}, "marches": {"$addToSet": "$marche_id"}}}
+        ], maxTimeMS=timeout_ms).to_list(None),
+        db.alertes.find(query)
+        .sort("created_at", -1)
+        .limit(DERNIERES_LIMITE)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
+
+    niveaux = {n["_id"]: n["count"] for n in par_niveau}
+    marches = set().union(*(n["marches"] for n in par_niveau))
+    vue_par = {str(a["_id"]): a.get("vue_par", []) for a in dernieres}
+    return {
+        "alertes": {
+            "alertes_actives": sum(niveaux.values()),
+            "alertes_urgentes": niveaux.get("urgence", 0),
+            "marches_surveilles": len(marches),
+            "par_niveau": niveaux
+        },
+        "dernieres_alertes": await enrichir_alertes(dernieres, None),
+        "vue_par": vue_par
+    }
+
+
+# ============================================================================
+# Endpoint
+# ============================================================================
+
+@router.get("", response_model=dict, response_class=ORJSONResponse)
+async def get_dashboard(current_user: dict = Depends(get_current_user)):
+    """
+    Tableau de bord de l'utilisateur en un seul appel.
+
+    - Agents: compteurs et dernières collectes de l'agent
+    - Décideurs: compteurs et dernières alertes actives
+    - Bailleurs: aucun widget de données
+
+    Les widgets sont calculés en parallèle et mis en cache
+    DASHBOARD_CACHE_TTL_SECONDS secondes (par agent pour les collectes,
+    global pour les alertes) ; toute écriture sur les collectes ou les
+    alertes invalide le cache.
+    """
+    roles = current_user.roles
+    widgets = []
+    if "agent" in roles:
+        agent_id = str(current_user.id)
+        widgets.append(dashboard_cache.get_or_compute(
+            ("agent", agent_id), lambda: widgets_collectes(agent_id)
+        ))
+    if "décideur" in roles:
+        widgets.append(dashboard_cache.get_or_compute(("décideur", "global"), widgets_alertes))
+
+    dashboard = {"roles": roles}
+    for widget in await asyncio.gather(*widgets):
+        dashboard.update(widget)
+
+    # Champ « vue » propre à l'utilisateur, hors cache
+    vue_par = dashboard.pop("vue_par", None)
+    if vue_par is not None:
+        dashboard["dernieres_alertes"] = [
+            {**alerte, "vue": current_user.id in vue_par.get(alerte["id"], [])}
+            for alerte in dashboard["dernieres_alertes"]
+        ]
+
+    return dashboard
@@ -2,8 +2,7 @@
 Router pour l'import de collectes via CSV/Excel
 """
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
-from typing import List, Dict, Any
-import pandas as pd
+from typing import List, Dict, Any, TYPE_CHECKING
 import io
 from datetime import datetime
 from bson import ObjectId
@@ -11,11 +10,15 @@ from bson import ObjectId
 from backend.middleware.security import get_current_user
 from backend.middleware.rbac import can_submit_collectes
 from backend.database import db
+from backend.services.cache import invalidate_aggregates
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 router = APIRouter(prefix="/api/collectes", tags=["Import Collectes"])
 
 
-async def validate_and_resolve_references(row: pd.Series, row_num: int) -> Dict[str, Any]:
+async def validate_and_resolve_references(row: "pd.Series", row_num: int) -> Dict[str, Any]:
     """
     Valide une ligne et résout les références (marché, produit, unité)
 
@@ -25,6 +28,8 @@ async def validate_and_resolve_references(row: pd.Series, row_num: int) -> Dict[
     Raises:
         ValueError si une validation échoue
     """
+    import pandas as pd
+
     errors = []
 
     # Validation marche_nom
@@ -149,6 +154,9 @@ async def import_collectes(
             detail="Format de fichier non supporté. Utilisez CSV ou Excel (.xlsx, .xls)"
         )
 
+    # Import différé : pandas ne sert qu'aux imports de fichiers (~0,25 s au démarrage)
+    import pandas as pd
+
     try:
         # Lire le fichier
         contents = await file.read()
@@ -230,6 +238,8 @@ async def import_collectes(
                     import logging
                     logging.error(f"Erreur génération alerte pour {collecte_id}: {e}")
 
+            invalidate_aggregates()
+
         return {
             "message": "Import réussi",
             "total_lignes": len(df),
@@ -4,26 +4,31 @@ Accès protégé par authentification JWT et RBAC.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
+import asyncio
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 
 from backend.models import (
-    MarcheCreate, MarcheResponse,
+    MarcheCreate, MarcheResponse, MarchesProduitsBatch,
     MessageResponse
 )
 from backend.middleware.security import get_current_user
 from backend.middleware.rbac import require_role
-from backend.database import db
+from backend.database import db, find_by_ids
+from backend.services.serialization import trusted_list_response
 
 router = APIRouter(prefix="/api/marches", tags=["Marchés"])
 
 
-@router.get("", response_model=List[MarcheResponse])
+@router.get("", response_model=List[MarcheResponse], response_class=ORJSONResponse)
 async def get_marches(
     commune_id: Optional[str] = Query(None, description="Filtrer par commune"),
     departement_id: Optional[str] = Query(None, description="Filtrer par département"),
     actif: Optional[bool] = Query(True, description="Filtrer par statut actif"),
+    produit_id: Optional[str] = Query(None, description="Marchés proposant ce produit"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -33,57 +38,50 @@ async def get_marches(
     query = {}
     if actif is not None:
         query["actif"] = actif
+    if produit_id:
+        # Index multikey produits.id_produit
+        query["produits"] = {"$elemMatch": {"id_produit": produit_id, "actif": {"$ne": False}}}
     if commune_id:
         query["commune_id"] = commune_id
+    elif departement_id:
+        # Filtrer par département via les communes rattachées
+        communes_dept = await db.communes.find(
+            {"departement_id": departement_id}, {"_id": 1}
+        ).to_list(None)
+        query["commune_id"] = {"$in": [str(c["_id"]) for c in communes_dept]}
+
+    marches = await db.marches.find(query, {"location": 0}).to_list(None)
+
+    # Enrichir avec les noms de commune et de département (requêtes $in groupées)
+    communes = await find_by_ids(
+        "communes",
+        {m.get("commune_id") for m in marches},
+        {"nom": 1, "departement_id": 1}
+    )
+    departements = await find_by_ids(
+        "departements",
+        {c.get("departement_id") for c in communes.values()},
+        {"nom": 1}
+    )
 
-    marches = await db.marches.find(query).to_list(None)
-    result = []
-
+    rows = []
     for marche in marches:
-        # Récupérer le nom de la commune
-        commune_nom = None
-        departement_nom = None
-        if marche.get("commune_id"):
-            commune = await db.communes.find_one({
-                "_id": ObjectId(marche["commune_id"])
-            })
-            if commune:
-                commune_nom = commune["nom"]
-
-                # Récupérer le nom du département
-                if commune.get("departement_id"):
-                    dept = await db.departements.find_one({
-                        "_id": ObjectId(commune["departement_id"])
-                    })
-                    if dept:
-                        departement_nom = dept["nom"]
-
-                        # Filtrer par département si spécifié
-                        if departement_id and commune["departement_id"] != departement_id:
-                            continue
-
-        result.append(
-            MarcheResponse(
-                id=str(marche["_id"]),
-                nom=marche["nom"],
-                nom_creole=marche.get("nom_creole"),
-                code=marche.get("code"),
-                commune_id=marche["commune_id"],
-                type_marche=marche.get("type_marche", "quotidien"),
-                latitude=marche.get("latitude"),
-                longitude=marche.get("longitude"),
-                jours_ouverture=marche.get("jours_ouverture"),
-                specialites=marche.get("specialites"),
-                telephone=marche.get("telephone"),
-                email=marche.get("email"),
-                actif=marche.get("actif", True),
-                commune_nom=commune_nom,
-                departement_nom=departement_nom,
-                produits=marche.get("produits", [])
-            )
-        )
+        commune = communes.get(marche.get("commune_id"))
+        dept = departements.get(commune.get("departement_id")) if commune else None
 
-    return result
+        if departement_id and (not commune or commune.get("departement_id") != departement_id):
+            continue
+
+        marche["id"] = str(marche.pop("_id"))
+        marche.setdefault("type_marche", "quotidien")
+        marche.setdefault("actif", True)
+        marche.setdefault("produits", [])
+        marche["commune_nom"] = commune["nom"] if commune else None
+        marche["departement_nom"] = dept["nom"] if dept else None
+        rows.append(marche)
+
+    # Lecture de confiance : pas de revalidation Pydantic ligne par ligne
+    return trusted_list_response(MarcheResponse, rows)
 
 
 @router.get("/{marche_id}", response_model=MarcheResponse)
@@ -387,7 +385,13 @@ async def get_marches_by_commune(
             detail="Commune non trouvée"
         )
 
-    return await get_marches(commune_id=commune_id, current_user=current_user)
+    return await get_marches(
+        commune_id=commune_id,
+        departement_id=None,
+        actif=True,
+        produit_id=None,
+        current_user=current_user
+    )
 
 
 @router.post("/{marche_id}/produits", response_model=MessageResponse)
@@ -424,7 +428,7 @@ async def add_produit_to_marche(
         )
 
     # Vérifier que le marché existe
-    marche = await db.marches.find_one({"_id": ObjectId(marche_id)})
+    marche = await db.marches.find_one({"_id": ObjectId(marche_id)}, {"nom": 1})
     if not marche:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -447,37 +451,122 @@ async def add_produit_to_marche(
             detail="Unité de mesure non trouvée"
         )
 
-    # Vérifier si le produit est déjà dans le marché
-    produits_list = marche.get("produits", [])
-    produit_exists = any(p.get("id_produit") == produit_id for p in produits_list)
-
-    if not produit_exists:
-        # Ajouter le produit
-        nouveau_produit = {
-            "id_produit": produit_id,
-            "id_unite_mesure": unite_id,
-            "actif": True,
-            "ajout_par": current_user.id,  # Tracer qui a ajouté le produit
-            "ajout_le": datetime.utcnow()
-        }
-
-        produits_list.append(nouveau_produit)
-
-        # Mettre à jour le marché
-        await db.marches.update_one(
-            {"_id": ObjectId(marche_id)},
-            {
-                "$set": {
-                    "produits": produits_list,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+    # Ajout atomique, seulement si le produit n'est pas déjà dans le marché
+    # (ajouts concurrents sans perte, sans réécrire le tableau)
+    result = await db.marches.update_one(
+        *_ajout_produit(marche_id, produit_id, unite_id, str(current_user.id), datetime.utcnow())
+    )
 
+    if result.modified_count:
         return MessageResponse(
             message=f"Produit '{produit['nom']}' ajouté au marché '{marche['nom']}' avec succès"
         )
-    else:
-        return MessageResponse(
-            message=f"Produit '{produit['nom']}' déjà présent dans le marché"
-        )
+    return MessageResponse(
+        message=f"Produit '{produit['nom']}' déjà présent dans le marché"
+    )
+
+
+def _ajout_produit(marche_id: str, produit_id: str, unite_id: str, ajout_par: str, maintenant: datetime) -> tuple:
+    """Filtre et mise à jour ajoutant un produit à un marché s'il n'y figure pas"""
+    return (
+        {"_id": ObjectId(marche_id), "produits.id_produit": {"$ne": produit_id}},
+        {
+            "$push": {"produits": {
+                "id_produit": produit_id,
+                "id_unite_mesure": unite_id,
+                "actif": True,
+                "ajout_par": ajout_par,  # Tracer qui a ajouté le produit
+                "ajout_le": maintenant
+            }},
+            "$set": {"updated_at": maintenant}
+        }
+    )
+
+
+@router.post("/produits/affectations", response_model=dict)
+async def affecter_produits_marches(
+    affectation: MarchesProduitsBatch,
+    current_user: dict = Depends(require_role(["décideur"]))
+):
+    """
+    Affecter plusieurs produits à plusieurs marchés en un appel.
+    Réservé aux décideurs.
+
+    Chaque produit est ajouté à chaque marché où il ne figure pas ; si
+    `mettre_a_jour`, les produits déjà présents sont réactivés et prennent
+    l'unité demandée (entrées ciblées par arrayFilters). Les ajouts puis
+    les mises à jour partent chacun en un bulk_write d'opérations
+    atomiques, sans lecture des tableaux produits.
+    """
+    marche_ids = list(dict.fromkeys(affectation.marche_ids))
+    # Dernière unité retenue si un produit est listé plusieurs fois
+    produits = {p.produit_id: p.unite_id for p in affectation.produits}
+
+    for ids, libelle in (
+        (marche_ids, "de marché"), (produits.keys(), "de produit"), (produits.values(), "d'unité")
+    ):
+        invalides = [i for i in ids if not ObjectId.is_valid(i)]
+        if invalides:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"ID {libelle} invalide: {invalides[0]}"
+            )
+
+    marches, fiches_produits, unites = await asyncio.gather(
+        find_by_ids("marches", marche_ids, {"_id": 1}),
+        find_by_ids("produits", produits.keys(), {"_id": 1}),
+        find_by_ids("unites_mesure", produits.values(), {"_id": 1})
+    )
+    for ids, trouves, erreur in (
+        (marche_ids, marches, "Marché non trouvé"),
+        (produits.keys(), fiches_produits, "Produit non trouvé"),
+        (produits.values(), unites, "Unité de mesure non trouvée")
+    ):
+        manquants = [i for i in ids if i not in trouves]
+        if manquants:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"{erreur}: {manquants[0]}"
+            )
+
+    maintenant = datetime.utcnow()
+    ajouts = [
+        UpdateOne(*_ajout_produit(marche_id, produit_id, unite_id, str(current_user.id), maintenant))
+        for marche_id in marche_ids
+        for produit_id, unite_id in produits.items()
+    ]
+    resultat = await db.marches.bulk_write(ajouts, ordered=False)
+    ajoutes = resultat.modified_count
+
+    mis_a_jour = 0
+    if affectation.mettre_a_jour:
+        # Entrées existantes inactives ou d'une autre unité, ciblées par arrayFilters
+        maj = [
+            UpdateOne(
+                {
+                    "_id": ObjectId(marche_id),
+                    "produits": {"$elemMatch": {
+                        "id_produit": produit_id,
+                        "$or": [{"actif": {"$ne": True}}, {"id_unite_mesure": {"$ne": unite_id}}]
+                    }}
+                },
+                {"$set": {
+                    "produits.$[p].actif": True,
+                    "produits.$[p].id_unite_mesure": unite_id,
+                    "updated_at": maintenant
+                }},
+                array_filters=[{"p.id_produit": produit_id}]
+            )
+            for marche_id in marche_ids
+            for produit_id, unite_id in produits.items()
+        ]
+        mis_a_jour = (await db.marches.bulk_write(maj, ordered=False)).modified_count
+
+    return {
+        "message": f"{ajoutes} produit(s) ajouté(s), {mis_a_jour} mis à jour",
+        "marches": len(marche_ids),
+        "produits": len(produits),
+        "ajoutes": ajoutes,
+        "mis_a_jour": mis_a_jour,
+        "inchanges": len(ajouts) - ajoutes - mis_a_jour
+    }
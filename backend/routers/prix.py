@@ -0,0 +1,54 @@
+"""
+Router pour les analyses de prix (prévisions).
+Accès protégé par authentification JWT.
+"""
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
+import asyncio
+
+from backend.middleware.security import get_current_user
+from backend.database import find_by_ids
+
+router = APIRouter(prefix="/api/prix", tags=["Prix"])
+
+
+@router.get("/previsions", response_model=List[dict], response_class=ORJSONResponse)
+async def get_previsions(
+    produit_id: Optional[str] = Query(None, description="Filtrer par produit"),
+    departement_id: Optional[str] = Query(None, description="Filtrer par département"),
+    horizon: int = Query(13, ge=1, le=13, description="Nombre de semaines (max 13, soit 3 mois)"),
+    limit: int = Query(100, le=1000, description="Nombre max de séries"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Prévisions hebdomadaires des prix par (produit, département), avec
+    intervalle à 90%. Servies depuis le cache previsions_prix, recalculé
+    chaque nuit pour les séries ayant reçu de nouvelles collectes.
+    Accessible à tous les rôles authentifiés.
+    """
+    # Import différé : le module de prévision charge NumPy
+    from backend.services.forecasting import get_forecasts
+
+    previsions = await get_forecasts(produit_id, departement_id, limit)
+
+    produits, departements = await asyncio.gather(
+        find_by_ids("produits", (p["produit_id"] for p in previsions), {"nom": 1}),
+        find_by_ids("departements", (p["departement_id"] for p in previsions), {"nom": 1})
+    )
+
+    return [
+        {
+            "produit_id": p["produit_id"],
+            "produit_nom": produits.get(p["produit_id"], {}).get("nom"),
+            "departement_id": p["departement_id"],
+            "departement_nom": departements.get(p["departement_id"], {}).get("nom"),
+            "derniere_semaine": p["derniere_semaine"],
+            "points": p["points"][:horizon],
+            "modele": {**p["params"], "saisonnier": p["saisonnier"], "sigma": p["sigma"]},
+            "semaines_observees": p["semaines_observees"],
+            "updated_at": p["updated_at"]
+        }
+        for p in previsions
+    ]
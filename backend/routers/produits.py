@@ -4,9 +4,11 @@ Accès protégé par authentification JWT et RBAC.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+import asyncio
 
 from backend.models import (
     ProduitCreate, ProduitResponse,
@@ -14,12 +16,14 @@ from backend.models import (
 )
 from backend.middleware.security import get_current_user
 from backend.middleware.rbac import require_role
-from backend.database import db
+from backend.database import db, find_by_ids
+from backend.services.serialization import trusted_list_response
+from backend.services.thresholds import notify_thresholds_changed
 
 router = APIRouter(prefix="/api/produits", tags=["Produits"])
 
 
-@router.get("", response_model=List[ProduitResponse])
+@router.get("", response_model=List[ProduitResponse], response_class=ORJSONResponse)
 async def get_produits(
     categorie_id: Optional[str] = Query(None, description="Filtrer par catégorie"),
     actif: Optional[bool] = Query(True, description="Filtrer par statut actif"),
@@ -35,45 +39,27 @@ async def get_produits(
     if categorie_id:
         query["id_categorie"] = categorie_id
 
-    produits = await db.produits.find(query).to_list(None)
-    result = []
+    produits = await db.produits.find(query, {"prix_ref_min": 0, "prix_ref_max": 0}).to_list(None)
 
+    # Enrichir avec les noms de catégorie et d'unité (requêtes $in groupées)
+    categories, unites = await asyncio.gather(
+        find_by_ids("categories_produit", {p.get("id_categorie") for p in produits}, {"nom": 1}),
+        find_by_ids("unites_mesure", {p.get("id_unite_mesure") for p in produits}, {"unite": 1})
+    )
+
+    rows = []
     for produit in produits:
-        # Récupérer le nom de la catégorie
-        categorie_nom = None
-        if produit.get("id_categorie"):
-            cat = await db.categories_produit.find_one({
-                "_id": ObjectId(produit["id_categorie"])
-            })
-            if cat:
-                categorie_nom = cat["nom"]
-
-        # Récupérer le nom de l'unité de mesure
-        unite_nom = None
-        if produit.get("id_unite_mesure"):
-            unite = await db.unites_mesure.find_one({
-                "_id": ObjectId(produit["id_unite_mesure"])
-            })
-            if unite:
-                unite_nom = unite["unite"]
-
-        result.append(
-            ProduitResponse(
-                id=str(produit["_id"]),
-                nom=produit["nom"],
-                nom_creole=produit.get("nom_creole"),
-                code=produit["code"],
-                id_categorie=produit["id_categorie"],
-                id_unite_mesure=produit["id_unite_mesure"],
-                description=produit.get("description"),
-                actif=produit.get("actif", True),
-                prix_ref_moyen=produit.get("prix_ref_moyen"),
-                categorie_nom=categorie_nom,
-                unite_nom=unite_nom
-            )
-        )
+        categorie = categories.get(produit.get("id_categorie"))
+        unite = unites.get(produit.get("id_unite_mesure"))
+
+        produit["id"] = str(produit.pop("_id"))
+        produit.setdefault("actif", True)
+        produit["categorie_nom"] = categorie["nom"] if categorie else None
+        produit["unite_nom"] = unite["unite"] if unite else None
+        rows.append(produit)
 
-    return result
+    # Lecture de confiance : pas de revalidation Pydantic ligne par ligne
+    return trusted_list_response(ProduitResponse, rows)
 
 
 @router.get("/{produit_id}", response_model=ProduitResponse)
@@ -188,6 +174,8 @@ async def create_produit(
     produit_dict["created_at"] = datetime.utcnow()
 
     result = await db.produits.insert_one(produit_dict)
+    # La table des seuils résout les surcharges de catégorie par produit
+    await notify_thresholds_changed()
     created_produit = await db.produits.find_one({"_id": result.inserted_id})
 
     return ProduitResponse(
@@ -278,6 +266,8 @@ async def update_produit(
         {"_id": ObjectId(produit_id)},
         {"$set": produit_dict}
     )
+    if produit.id_categorie != existing.get("id_categorie"):
+        await notify_thresholds_changed()
 
     updated_produit = await db.produits.find_one({"_id": ObjectId(produit_id)})
 
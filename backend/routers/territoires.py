@@ -4,6 +4,7 @@ Accès protégé par authentification JWT et RBAC.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from typing import List
 from datetime import datetime
 from bson import ObjectId
@@ -15,7 +16,8 @@ from backend.models import (
 )
 from backend.middleware.security import get_current_user
 from backend.middleware.rbac import require_role
-from backend.database import db
+from backend.database import db, find_by_ids
+from backend.services.serialization import trusted_list_response
 
 router = APIRouter(prefix="/api", tags=["Territoires"])
 
@@ -220,7 +222,7 @@ async def delete_departement(
 # Communes
 # ============================================================================
 
-@router.get("/communes", response_model=List[CommuneResponse])
+@router.get("/communes", response_model=List[CommuneResponse], response_class=ORJSONResponse)
 async def get_communes(
     departement_id: str = None,
     current_user: dict = Depends(get_current_user)
@@ -234,40 +236,35 @@ async def get_communes(
         query["departement_id"] = departement_id
 
     communes = await db.communes.find(query).to_list(None)
-    result = []
 
-    for commune in communes:
-        # Récupérer le nom du département
-        dept_nom = None
-        if commune.get("departement_id"):
-            dept = await db.departements.find_one({
-                "_id": ObjectId(commune["departement_id"])
-            })
-            if dept:
-                dept_nom = dept["nom"]
-
-        # Compter les marchés dans cette commune
-        nombre_marches = await db.marches.count_documents({
-            "commune_id": str(commune["_id"]),
+    # Noms des départements (une requête $in) et nombre de marchés par commune
+    # (une agrégation) au lieu de deux requêtes par commune
+    departements = await find_by_ids(
+        "departements",
+        {c.get("departement_id") for c in communes},
+        {"nom": 1}
+    )
+    comptes = await db.marches.aggregate([
+        {"$match": {
+            "commune_id": {"$in": [str(c["_id"]) for c in communes]},
             "actif": True
-        })
+        }},
+        {"$group": {"_id": "$commune_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    nombre_marches = {c["_id"]: c["count"] for c in comptes}
 
-        result.append(
-            CommuneResponse(
-                id=str(commune["_id"]),
-                code=commune["code"],
-                nom=commune["nom"],
-                nom_creole=commune.get("nom_creole"),
-                departement_id=commune["departement_id"],
-                type_zone=commune["type_zone"],
-                population=commune.get("population"),
-                actif=commune.get("actif", True),
-                departement_nom=dept_nom,
-                nombre_marches=nombre_marches
-            )
-        )
+    rows = []
+    for commune in communes:
+        dept = departements.get(commune.get("departement_id"))
 
-    return result
+        commune["id"] = str(commune.pop("_id"))
+        commune.setdefault("actif", True)
+        commune["departement_nom"] = dept["nom"] if dept else None
+        commune["nombre_marches"] = nombre_marches.get(commune["id"], 0)
+        rows.append(commune)
+
+    # Lecture de confiance : pas de revalidation Pydantic ligne par ligne
+    return trusted_list_response(CommuneResponse, rows)
 
 
 @router.get("/communes/{commune_id}", response_model=CommuneResponse)
@@ -0,0 +1,185 @@
+"""
+Backtest et benchmark des modes de détection d'alertes (seuils, robuste,
+saisonnier) sur l'historique des prix par (produit, département).
+
+Deux sources :
+- MongoDB (par défaut): collectes validées de la base configurée ; sans
+  vérité terrain, le rapport donne les taux de signalement par mode et
+  leur recouvrement.
+- --synthetique: séries nationales simulées par generate_collectes ; les
+  chocs injectés servent de vérité terrain (précision, rappel, F1).
+
+Dans les deux cas, le temps de chargement et de calcul de chaque mode est
+mesuré (séries × jours par seconde).
+
+Usage:
+    python -m backend.scripts.backtest_anomalies --jours 1100
+    python -m backend.scripts.backtest_anomalies --synthetique --departements 10 --produits 60
+    python -m backend.scripts.backtest_anomalies --synthetique --output backtest.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+import sys
+import os
+
+import numpy as np
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+
+# Part du prix due à un choc à partir de laquelle un jour est une anomalie
+SEUIL_CHOC = 0.15
+
+
+def historique_synthetique(departements: int, produits: int, jours: int, seed: int):
+    """
+    Simuler l'historique national : une série par (produit, département).
+
+    Returns:
+        (PriceHistory, matrice booléenne des jours en choc)
+    """
+    from backend.scripts.generate_collectes import (
+        PARAMETRES_DEFAUT, construire_series, liste_jours, simuler_prix
+    )
+    from backend.services.anomalies import PriceHistory
+
+    fin = datetime.utcnow()
+    dates = liste_jours(fin - timedelta(days=jours - 1), fin)
+    series = construire_series(
+        [{"_id": f"D{i:02d}", "code": f"D{i:02d}"} for i in range(departements)],
+        [{"_id": f"P{j:03d}", "code": f"P{j:03d}", "id_unite_mesure": "u"} for j in range(produits)],
+        [{"_id": "agent"}],
+        seed
+    )
+
+    values = np.full((len(series), jours), np.nan)
+    chocs = np.zeros((len(series), jours), dtype=bool)
+    for i, serie in enumerate(series):
+        rng = np.random.default_rng([seed, *serie["index"]])
+        prix, choc, presents = simuler_prix(serie, dates, rng, PARAMETRES_DEFAUT)
+        values[i, presents] = prix[presents]
+        chocs[i] = choc >= SEUIL_CHOC
+
+    keys = [(s["produit_id"], s["marche_id"]) for s in series]
+    return PriceHistory(keys, dates[0], values), chocs
+
+
+def evaluer_mode(history, mode: str, chocs=None) -> dict:
+    """Scorer tout l'historique avec un mode et résumer les signalements"""
+    from backend.services.anomalies import NIVEAUX, score_history
+
+    debut = time.perf_counter()
+    scores = score_history(history, mode)
+    duree = time.perf_counter() - debut
+
+    niveau = scores["niveau"]
+    evalues = ~np.isnan(scores["ecart"])
+    signales = (niveau > 0) & evalues
+    cellules = history.values.size
+
+    rapport = {
+        "mode": mode,
+        "duree_s": round(duree, 3),
+        "cellules_par_s": round(cellules / duree) if duree else None,
+        "jours_evalues": int(evalues.sum()),
+        "jours_signales": int(signales.sum()),
+        "taux_signalement": round(float(signales.sum() / max(1, evalues.sum())), 4),
+        "par_niveau": {NIVEAUX[n]: int(((niveau == n) & evalues).sum()) for n in range(1, len(NIVEAUX))},
+    }
+
+    if chocs is not None:
+        reels = chocs & evalues
+        vrais_positifs = int((signales & reels).sum())
+        precision = vrais_positifs / max(1, signales.sum())
+        rappel = vrais_positifs / max(1, reels.sum())
+        rapport.update({
+            "precision": round(float(precision), 4),
+            "rappel": round(float(rappel), 4),
+            "f1": round(float(2 * precision * rappel / max(1e-9, precision + rappel)), 4)
+        })
+
+    return rapport, signales
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backtest de la détection d'anomalies")
+    parser.add_argument("--modes", default="seuils,robuste,saisonnier")
+    parser.add_argument("--jours", type=int, default=1100, help="Jours d'historique")
+    parser.add_argument("--fin", help="Dernier jour (YYYY-MM-DD, défaut: aujourd'hui)")
+    parser.add_argument("--synthetique", action="store_true", help="Séries simulées avec vérité terrain")
+    parser.add_argument("--departements", type=int, default=10)
+    parser.add_argument("--produits", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Écrire le rapport JSON")
+    args = parser.parse_args()
+
+    from backend.services.anomalies import load_price_history
+
+    print("=" * 70)
+    print("BACKTEST DE LA DETECTION D'ANOMALIES")
+    print("=" * 70)
+
+    debut = time.perf_counter()
+    chocs = None
+    if args.synthetique:
+        history, chocs = historique_synthetique(args.departements, args.produits, args.jours, args.seed)
+    else:
+        from backend.database import connect_to_mongo, close_mongo_connection
+
+        await connect_to_mongo()
+        try:
+            fin = datetime.fromisoformat(args.fin) if args.fin else None
+            history = await load_price_history(args.jours, fin)
+        finally:
+            await close_mongo_connection()
+    duree_chargement = time.perf_counter() - debut
+
+    series, jours = history.values.shape
+    print(f"\n{series} series x {jours} jours "
+          f"({int((~np.isnan(history.values)).sum())} jours collectes), "
+          f"charge en {duree_chargement:.2f}s")
+
+    rapports = []
+    signalements = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        rapport, signales = evaluer_mode(history, mode, chocs)
+        rapports.append(rapport)
+        signalements[mode] = signales
+
+        ligne = (f"\n{mode:<11} {rapport['duree_s']:>7.3f}s  "
+                 f"signales {rapport['jours_signales']:>7} ({rapport['taux_signalement']:.2%})  "
+                 f"{rapport['par_niveau']}")
+        if chocs is not None:
+            ligne += f"\n{'':<11} precision {rapport['precision']:.3f}  rappel {rapport['rappel']:.3f}  F1 {rapport['f1']:.3f}"
+        print(ligne)
+
+    # Recouvrement des jours signalés entre modes (indice de Jaccard)
+    recouvrement = {}
+    modes = list(signalements)
+    for i, a in enumerate(modes):
+        for b in modes[i + 1:]:
+            union = (signalements[a] | signalements[b]).sum()
+            recouvrement[f"{a}/{b}"] = round(float((signalements[a] & signalements[b]).sum() / max(1, union)), 4)
+    if recouvrement:
+        print(f"\nRecouvrement (Jaccard): {recouvrement}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "source": "synthetique" if args.synthetique else "mongodb",
+                "series": series,
+                "jours": jours,
+                "chargement_s": round(duree_chargement, 3),
+                "modes": rapports,
+                "recouvrement": recouvrement
+            }, f, indent=2)
+        print(f"\nRapport ecrit dans {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
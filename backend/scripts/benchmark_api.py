@@ -0,0 +1,315 @@
+"""
+Benchmark de charge de l'API SAP.
+Génère une charge asynchrone réaliste (mélange agents / décideurs) sur les
+principaux endpoints et mesure p50/p95/p99, débit et taux d'erreur par
+endpoint. Les résultats JSON sont comparables d'une exécution à l'autre.
+
+Par défaut l'application est appelée en processus (httpx.ASGITransport),
+sans réseau. Avec --mongomock, MongoDB est remplacé par mongomock-motor ;
+sinon la base configurée (.env, ex: mongod local) est utilisée.
+
+Dépendances (non requises en production):
+    pip install httpx mongomock-motor
+
+Usage:
+    python -m backend.scripts.benchmark_api --mongomock --seed --collectes 20000
+    python -m backend.scripts.benchmark_api --duration 60 --concurrency 50 \\
+        --output bench/resultats.json --compare bench/reference.json
+    python -m backend.scripts.benchmark_api --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+import sys
+import os
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+
+# ============================================================================
+# Scénarios
+# ============================================================================
+
+# (poids, nom, méthode, fabrique de requête) par profil
+def scenarios_agent(ids: dict) -> list:
+    return [
+        (30, "GET /api/collectes (agent)", "GET", lambda: ("/api/collectes?limit=50", None)),
+        (20, "GET /api/marches", "GET", lambda: ("/api/marches", None)),
+        (20, "GET /api/produits", "GET", lambda: ("/api/produits", None)),
+        (10, "GET /api/collectes/statistiques/resume (agent)", "GET",
+         lambda: ("/api/collectes/statistiques/resume", None)),
+        (20, "POST /api/collectes", "POST", lambda: ("/api/collectes", nouvelle_collecte(ids))),
+    ]
+
+
+def scenarios_decideur(ids: dict) -> list:
+    return [
+        (25, "GET /api/collectes (décideur)", "GET", lambda: ("/api/collectes?limit=100", None)),
+        (15, "GET /api/collectes/statistiques/resume", "GET",
+         lambda: ("/api/collectes/statistiques/resume", None)),
+        (20, "GET /api/alertes", "GET", lambda: ("/api/alertes?limit=50", None)),
+        (15, "GET /api/alertes/statistiques/resume", "GET",
+         lambda: ("/api/alertes/statistiques/resume", None)),
+        (15, "GET /api/marches?departement_id", "GET",
+         lambda: (f"/api/marches?departement_id={random.choice(ids['departements'])}", None)),
+        (10, "GET /api/communes", "GET", lambda: ("/api/communes", None)),
+    ]
+
+
+def nouvelle_collecte(ids: dict) -> dict:
+    """Corps d'une nouvelle collecte (date aléatoire pour éviter les doublons)"""
+    produit_id, unite_id = random.choice(ids["produits"])
+    date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    date -= timedelta(days=random.randrange(3650))
+    return {
+        "marche_id": random.choice(ids["marches"]),
+        "produit_id": produit_id,
+        "unite_id": unite_id,
+        "quantite": 1,
+        "prix": round(random.uniform(50, 800), 2),
+        "date": date.isoformat(),
+        "periode": random.choice(["matin1", "matin2", "soir1", "soir2"])
+    }
+
+
+# ============================================================================
+# Générateur de charge
+# ============================================================================
+
+class Resultats:
+    """Latences et statuts collectés par endpoint"""
+
+    def __init__(self):
+        self.latences: Dict[str, List[float]] = {}
+        self.erreurs: Dict[str, int] = {}
+
+    def enregistrer(self, nom: str, latence_ms: float, ok: bool) -> None:
+        self.latences.setdefault(nom, []).append(latence_ms)
+        if not ok:
+            self.erreurs[nom] = self.erreurs.get(nom, 0) + 1
+
+
+def percentile(valeurs: List[float], p: float) -> float:
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not valeurs:
+        return 0.0
+    rang = max(0, min(len(valeurs) - 1, int(round(p / 100 * len(valeurs) + 0.5)) - 1))
+    return valeurs[rang]
+
+
+def resumer(latences: List[float], erreurs: int, duree: float) -> dict:
+    valeurs = sorted(latences)
+    return {
+        "requetes": len(valeurs),
+        "erreurs": erreurs,
+        "taux_erreur": round(erreurs / len(valeurs), 4) if valeurs else 0.0,
+        "debit_rps": round(len(valeurs) / duree, 2) if duree else 0.0,
+        "p50_ms": round(percentile(valeurs, 50), 2),
+        "p95_ms": round(percentile(valeurs, 95), 2),
+        "p99_ms": round(percentile(valeurs, 99), 2),
+        "max_ms": round(valeurs[-1], 2) if valeurs else 0.0,
+    }
+
+
+async def utilisateur_virtuel(client, token: str, scenarios: list, fin: float,
+                              resultats: Resultats, think_time: float) -> None:
+    """Boucle d'un utilisateur virtuel jusqu'à l'échéance"""
+    poids = [s[0] for s in scenarios]
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
+
+    while time.perf_counter() < fin:
+        _, nom, methode, fabrique = random.choices(scenarios, weights=poids)[0]
+        chemin, corps = fabrique()
+        debut = time.perf_counter()
+        try:
+            reponse = await client.request(methode, chemin, json=corps, headers=headers)
+            ok = reponse.status_code < 400
+        except Exception:
+            ok = False
+        resultats.enregistrer(nom, (time.perf_counter() - debut) * 1000, ok)
+
+        if think_time:
+            await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+async def lancer_charge(args, ids: dict) -> dict:
+    """Exécuter la charge et retourner le rapport"""
+    import httpx
+    from backend.services.auth import create_access_token
+
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        from backend.main import app
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://benchmark"
+
+    jetons_agents = [create_access_token({"sub": uid}) for uid in ids["agents"]]
+    jetons_decideurs = [create_access_token({"sub": uid}) for uid in ids["decideurs"]]
+
+    resultats = Resultats()
+    limites = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url,
+                                 limits=limites, timeout=args.timeout) as client:
+        # Échauffement (caches, imports paresseux)
+        await client.get("/health")
+
+        debut = time.perf_counter()
+        fin = debut + args.duration
+        taches = []
+        for i in range(args.concurrency):
+            if random.random() < args.agent_ratio:
+                token, scenarios = random.choice(jetons_agents), scenarios_agent(ids)
+            else:
+                token, scenarios = random.choice(jetons_decideurs), scenarios_decideur(ids)
+            taches.append(utilisateur_virtuel(client, token, scenarios, fin, resultats, args.think_time))
+        await asyncio.gather(*taches)
+        duree = time.perf_counter() - debut
+
+    toutes = [l for latences in resultats.latences.values() for l in latences]
+    return {
+        "meta": {
+            "date": datetime.utcnow().isoformat(),
+            "commit": commit_courant(),
+            "cible": args.url or "in-process",
+            "mongomock": args.mongomock,
+            "duree_s": round(duree, 2),
+            "concurrence": args.concurrency,
+            "ratio_agents": args.agent_ratio,
+            "think_time_s": args.think_time,
+            "graine": args.random_seed,
+        },
+        "global": resumer(toutes, sum(resultats.erreurs.values()), duree),
+        "endpoints": {
+            nom: resumer(latences, resultats.erreurs.get(nom, 0), duree)
+            for nom, latences in sorted(resultats.latences.items())
+        }
+    }
+
+
+def commit_courant() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "inconnu"
+
+
+# ============================================================================
+# Rapport
+# ============================================================================
+
+def afficher_rapport(rapport: dict, reference: dict = None) -> None:
+    print("\n" + "=" * 100)
+    print(f"{'endpoint':<48} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+          + ("  Δp95" if reference else ""))
+    print("-" * 100)
+    lignes = list(rapport["endpoints"].items()) + [("GLOBAL", rapport["global"])]
+    for nom, stats in lignes:
+        ligne = (f"{nom[:48]:<48} {stats['requetes']:>7} {stats['erreurs']:>5} "
+                 f"{stats['debit_rps']:>8.1f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+                 f"{stats['p99_ms']:>8.1f}")
+        if reference:
+            ref = reference["global"] if nom == "GLOBAL" else reference["endpoints"].get(nom)
+            if ref and ref["p95_ms"]:
+                ligne += f"  {100 * (stats['p95_ms'] - ref['p95_ms']) / ref['p95_ms']:+6.1f}%"
+        print(ligne)
+    print("=" * 100)
+
+
+# ============================================================================
+# Point d'entrée
+# ============================================================================
+
+def utiliser_mongomock() -> None:
+    """Remplacer le client Motor par mongomock-motor (aucun réseau)"""
+    for cle, valeur in {
+        "MONGODB_URL": "mongodb://mongomock",
+        "MONGODB_DB_NAME": "sap_benchmark",
+        "JWT_SECRET_KEY": "benchmark-secret-key-benchmark-secret",
+        "MFA_ENCRYPTION_KEY": "benchmark-mfa-key",
+        "APP_ENV": "benchmark",
+    }.items():
+        os.environ.setdefault(cle, valeur)
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("mongomock-motor est requis pour --mongomock: pip install mongomock-motor")
+
+    from backend import database as database_module
+    database_module.AsyncIOMotorClient = lambda url, **options: AsyncMongoMockClient()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de charge de l'API SAP")
+    parser.add_argument("--url", help="URL d'un serveur déjà lancé (sinon en processus)")
+    parser.add_argument("--mongomock", action="store_true", help="Utiliser mongomock-motor")
+    parser.add_argument("--seed", action="store_true", help="Construire le jeu de données avant la charge")
+    parser.add_argument("--collectes", type=int, default=20000, help="Collectes du jeu de données")
+    parser.add_argument("--annees", type=int, default=2, help="Années d'historique")
+    parser.add_argument("--duration", type=float, default=30, help="Durée de la charge (s)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Utilisateurs virtuels")
+    parser.add_argument("--agent-ratio", type=float, default=0.8, help="Part d'agents (0-1)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause moyenne entre requêtes (s)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout HTTP (s)")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Fichier JSON de référence à comparer")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        if args.url:
+            raise SystemExit("--mongomock n'est utilisable qu'en processus (sans --url)")
+        utiliser_mongomock()
+
+    random.seed(args.random_seed)
+
+    from backend.database import connect_to_mongo, close_mongo_connection
+    from backend.scripts.seed_benchmark_data import seed_benchmark_dataset
+
+    print("=" * 70)
+    print("BENCHMARK DE CHARGE SAP")
+    print("=" * 70)
+
+    await connect_to_mongo()
+    try:
+        print("\nPreparation du jeu de donnees...")
+        ids = await seed_benchmark_dataset(
+            collectes=args.collectes if (args.seed or args.mongomock) else 0,
+            annees=args.annees,
+            seed=args.random_seed
+        )
+        print(f"   -> {len(ids['marches'])} marches, {len(ids['produits'])} produits, "
+              f"{len(ids['agents'])} agents")
+
+        print(f"\nCharge: {args.concurrency} utilisateurs virtuels pendant {args.duration:.0f}s...")
+        rapport = await lancer_charge(args, ids)
+    finally:
+        await close_mongo_connection()
+
+    reference = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            reference = json.load(f)
+
+    afficher_rapport(rapport, reference)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+        print(f"\nResultats ecrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Benchmark de sérialisation et de compression des réponses de liste.
+Compare l'encodeur JSON standard (JSONResponse) à orjson (ORJSONResponse),
+avec et sans compression GZip, sur une liste de collectes synthétiques.
+
+Aucune connexion MongoDB n'est nécessaire.
+
+Usage:
+    python -m backend.scripts.benchmark_serialization
+    python -m backend.scripts.benchmark_serialization --count 5000 --repeat 20
+"""
+
+import argparse
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+import sys
+import os
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from backend.models import CollecteResponse
+
+
+PERIODES = ["matin1", "matin2", "soir1", "soir2"]
+
+
+def generer_collectes(count: int, seed: int = 42) -> List[CollecteResponse]:
+    """Générer des collectes enrichies comparables à celles de GET /api/collectes"""
+    rng = random.Random(seed)
+    maintenant = datetime.utcnow()
+    marches = [str(ObjectId()) for _ in range(20)]
+    produits = [str(ObjectId()) for _ in range(15)]
+    unites = [str(ObjectId()) for _ in range(5)]
+    agents = [str(ObjectId()) for _ in range(10)]
+
+    return [
+        CollecteResponse(
+            id=str(ObjectId()),
+            marche_id=rng.choice(marches),
+            produit_id=rng.choice(produits),
+            unite_id=rng.choice(unites),
+            quantite=1,
+            prix=round(rng.uniform(50, 500), 2),
+            date=maintenant - timedelta(days=rng.randint(0, 90)),
+            periode=rng.choice(PERIODES),
+            commentaire=None,
+            agent_id=rng.choice(agents),
+            statut="validee",
+            latitude=round(rng.uniform(18.0, 20.0), 6),
+            longitude=round(rng.uniform(-74.5, -71.6), 6),
+            created_at=maintenant,
+            marche_nom="Marché Croix-des-Bossales",
+            commune_nom="Port-au-Prince",
+            produit_nom="Riz importé",
+            unite_nom="livre",
+            agent_nom="Jean Baptiste"
+        )
+        for _ in range(count)
+    ]
+
+
+def chronometrer(fonction, repeat: int) -> float:
+    """Retourner le temps médian d'exécution (ms) sur `repeat` itérations"""
+    durees = []
+    for _ in range(repeat):
+        debut = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - debut) * 1000)
+    durees.sort()
+    return durees[len(durees) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=1000, help="Nombre de collectes")
+    parser.add_argument("--repeat", type=int, default=30, help="Nombre d'itérations")
+    parser.add_argument("--gzip-level", type=int, default=6, help="Niveau de compression GZip")
+    args = parser.parse_args()
+
+    collectes = generer_collectes(args.count)
+    adapter = TypeAdapter(List[CollecteResponse])
+
+    # Étape commune à FastAPI: conversion du response_model en types JSON
+    contenu = adapter.dump_python(collectes, mode="json")
+
+    corps_json = JSONResponse(contenu).body
+    corps_orjson = ORJSONResponse(contenu).body
+
+    print("=" * 70)
+    print(f"BENCHMARK SERIALISATION - {args.count} collectes ({args.repeat} iterations)")
+    print("=" * 70)
+
+    t_dump = chronometrer(lambda: adapter.dump_python(collectes, mode="json"), args.repeat)
+    t_json = chronometrer(lambda: JSONResponse(contenu), args.repeat)
+    t_orjson = chronometrer(lambda: ORJSONResponse(contenu), args.repeat)
+    t_gzip = chronometrer(lambda: gzip.compress(corps_orjson, args.gzip_level), args.repeat)
+
+    taille_json = len(corps_json)
+    taille_orjson = len(corps_orjson)
+    taille_gzip = len(gzip.compress(corps_orjson, args.gzip_level))
+
+    print("\nTemps de serialisation (mediane):")
+    print(f"   - dump Pydantic (commun):      {t_dump:8.2f} ms")
+    print(f"   - JSONResponse (avant):        {t_json:8.2f} ms")
+    print(f"   - ORJSONResponse (apres):      {t_orjson:8.2f} ms  (x{t_json / t_orjson:.1f})")
+    print(f"   - GZip niveau {args.gzip_level}:               {t_gzip:8.2f} ms")
+
+    print("\nOctets transmis:")
+    print(f"   - JSONResponse (avant):        {taille_json:10d} octets")
+    print(f"   - ORJSONResponse:              {taille_orjson:10d} octets")
+    print(f"   - ORJSONResponse + GZip:       {taille_gzip:10d} octets  "
+          f"({100 * taille_gzip / taille_json:.1f}% de l'original)")
+
+
+if __name__ == "__main__":
+    main()
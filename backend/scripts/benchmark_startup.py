@@ -0,0 +1,226 @@
+"""
+Benchmark du démarrage de l'API SAP.
+Mesure, dans des processus neufs (comme un démarrage à froid) :
+- le temps d'import de backend.main (python -X importtime) et les modules
+  les plus coûteux ;
+- le temps jusqu'à la première réponse de /health d'un serveur uvicorn
+  (connexion MongoDB et lifespan compris).
+
+Le démarrage nécessite la base configurée (.env, ex: mongod local) ; sans
+base, utiliser --import-only. Les résultats JSON sont comparables d'une
+exécution à l'autre.
+
+Usage:
+    python -m backend.scripts.benchmark_startup --runs 5
+    python -m backend.scripts.benchmark_startup --import-only --top 20
+    python -m backend.scripts.benchmark_startup --output bench/demarrage.json \\
+        --compare bench/demarrage_reference.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Optional
+import sys
+import os
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+RACINE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+
+
+# ============================================================================
+# Mesures
+# ============================================================================
+
+def lire_importtime(sortie: str) -> Dict[str, int]:
+    """
+    Temps cumulés (µs) par module d'une sortie de python -X importtime.
+
+    Returns:
+        Dict {module: temps cumulé en microsecondes}
+    """
+    modules = {}
+    for ligne in sortie.splitlines():
+        if not ligne.startswith("import time:") or "cumulative" in ligne:
+            continue
+        _, cumule, module = ligne[len("import time:"):].split("|")
+        modules[module.strip()] = int(cumule)
+    return modules
+
+
+def mesurer_import() -> dict:
+    """Importer backend.main dans un interpréteur neuf"""
+    debut = time.perf_counter()
+    processus = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=RACINE, capture_output=True, text=True
+    )
+    duree = time.perf_counter() - debut
+    if processus.returncode != 0:
+        raise SystemExit(f"Import de backend.main impossible:\n{processus.stderr[-2000:]}")
+    modules = lire_importtime(processus.stderr)
+    return {
+        "processus_s": duree,
+        "import_s": modules.get("backend.main", 0) / 1e6,
+        "modules": modules
+    }
+
+
+def mesurer_demarrage(port: int, timeout: float) -> Optional[float]:
+    """
+    Lancer uvicorn et attendre la première réponse 200 de /health.
+
+    Returns:
+        Secondes entre le lancement et la première réponse, None si le
+        serveur ne répond pas avant `timeout`
+    """
+    url = f"http://127.0.0.1:{port}/health"
+    debut = time.perf_counter()
+    serveur = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=RACINE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - debut < timeout:
+            if serveur.poll() is not None:
+                erreur = serveur.stderr.read().decode(errors="replace")
+                raise SystemExit(f"Le serveur s'est arrêté au démarrage:\n{erreur[-2000:]}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as reponse:
+                    if reponse.status == 200:
+                        return time.perf_counter() - debut
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass
+            time.sleep(0.02)
+        return None
+    finally:
+        serveur.terminate()
+        try:
+            serveur.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            serveur.kill()
+
+
+def resumer(valeurs: List[float]) -> dict:
+    return {
+        "median_s": round(statistics.median(valeurs), 3),
+        "min_s": round(min(valeurs), 3),
+        "max_s": round(max(valeurs), 3),
+    }
+
+
+def commit_courant() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "inconnu"
+
+
+# ============================================================================
+# Rapport
+# ============================================================================
+
+def afficher_rapport(rapport: dict, reference: dict = None) -> None:
+    print("\n" + "=" * 70)
+    print(f"{'mesure':<30} {'médiane':>9} {'min':>9} {'max':>9}" + ("    Δ" if reference else ""))
+    print("-" * 70)
+    for nom, stats in rapport["mesures"].items():
+        ligne = f"{nom:<30} {stats['median_s']:>8.3f}s {stats['min_s']:>8.3f}s {stats['max_s']:>8.3f}s"
+        ref = (reference or {}).get("mesures", {}).get(nom)
+        if ref and ref["median_s"]:
+            ligne += f"  {100 * (stats['median_s'] - ref['median_s']) / ref['median_s']:+6.1f}%"
+        print(ligne)
+    print("-" * 70)
+    print("Modules les plus coûteux (temps cumulé, médiane):")
+    for module, ms in rapport["modules_ms"].items():
+        print(f"  {module:<50} {ms:>8.1f} ms")
+    print("=" * 70)
+
+
+# ============================================================================
+# Point d'entrée
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage de l'API SAP")
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de démarrages mesurés")
+    parser.add_argument("--import-only", action="store_true", help="Mesurer uniquement l'import")
+    parser.add_argument("--port", type=int, default=8765, help="Port du serveur de mesure")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Attente maximale de /health (s)")
+    parser.add_argument("--top", type=int, default=15, help="Modules les plus coûteux affichés")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Fichier JSON de référence à comparer")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BENCHMARK DE DÉMARRAGE SAP")
+    print("=" * 70)
+
+    imports = []
+    for numero in range(args.runs):
+        imports.append(mesurer_import())
+        print(f"   import {numero + 1}/{args.runs}: {imports[-1]['import_s']:.3f}s")
+
+    demarrages = []
+    if not args.import_only:
+        for numero in range(args.runs):
+            duree = mesurer_demarrage(args.port, args.timeout)
+            if duree is None:
+                raise SystemExit(f"/health sans réponse après {args.timeout:.0f}s")
+            demarrages.append(duree)
+            print(f"   démarrage {numero + 1}/{args.runs}: {duree:.3f}s")
+
+    # Médiane par module (les modules « backend.main » et racine exclus)
+    modules = {}
+    for mesure in imports:
+        for module, us in mesure["modules"].items():
+            modules.setdefault(module, []).append(us / 1000)
+    modules.pop("backend.main", None)
+    plus_couteux = sorted(
+        ((module, statistics.median(ms)) for module, ms in modules.items()),
+        key=lambda m: m[1], reverse=True
+    )[:args.top]
+
+    mesures = {
+        "import backend.main": resumer([m["import_s"] for m in imports]),
+        "processus d'import": resumer([m["processus_s"] for m in imports]),
+    }
+    if demarrages:
+        mesures["premier /health"] = resumer(demarrages)
+
+    rapport = {
+        "meta": {
+            "date": datetime.utcnow().isoformat(),
+            "commit": commit_courant(),
+            "python": sys.version.split()[0],
+            "executions": args.runs,
+        },
+        "mesures": mesures,
+        "modules_ms": {module: round(ms, 1) for module, ms in plus_couteux}
+    }
+
+    reference = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            reference = json.load(f)
+
+    afficher_rapport(rapport, reference)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+        print(f"\nResultats ecrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
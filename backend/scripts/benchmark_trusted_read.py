@@ -0,0 +1,109 @@
+"""
+Micro-benchmark du chemin de lecture de confiance des listes.
+Compare, en temps CPU par requête, le chemin historique (un modèle Pydantic
+par ligne puis revalidation du response_model par FastAPI) au chemin
+trusted_list_response (mise en forme + orjson, sans validation).
+
+Aucune connexion MongoDB n'est nécessaire.
+
+Usage:
+    python -m backend.scripts.benchmark_trusted_read
+    python -m backend.scripts.benchmark_trusted_read --rows 1000 10000 50000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import List
+import sys
+import os
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from backend.models import CollecteResponse
+from backend.services.serialization import trusted_list_response
+
+
+def generer_lignes(count: int) -> List[dict]:
+    """Générer des documents de collecte déjà enrichis (sortie des lookups $in)"""
+    maintenant = datetime.utcnow()
+    return [
+        {
+            "id": str(ObjectId()),
+            "marche_id": str(ObjectId()),
+            "produit_id": str(ObjectId()),
+            "unite_id": str(ObjectId()),
+            "quantite": 1,
+            "prix": 100.0 + (i % 250),
+            "date": maintenant - timedelta(days=i % 90),
+            "periode": "matin1",
+            "commentaire": None,
+            "image": None,
+            "agent_id": str(ObjectId()),
+            "statut": "validee",
+            "latitude": 18.5,
+            "longitude": -72.3,
+            "created_at": maintenant,
+            "marche_nom": "Marché Croix-des-Bossales",
+            "commune_nom": "Port-au-Prince",
+            "produit_nom": "Riz importé",
+            "unite_nom": "livre",
+            "agent_nom": "Jean Baptiste"
+        }
+        for i in range(count)
+    ]
+
+
+def chemin_historique(lignes: List[dict], adapter: TypeAdapter) -> bytes:
+    """Reproduire le chemin FastAPI historique pour response_model=List[CollecteResponse]"""
+    modeles = [CollecteResponse(**ligne) for ligne in lignes]
+    # FastAPI convertit les modèles en dicts puis les revalide contre le response_model
+    contenu = [modele.model_dump() for modele in modeles]
+    valides = adapter.validate_python(contenu)
+    return JSONResponse(jsonable_encoder(adapter.dump_python(valides, mode="json"))).body
+
+
+def chemin_confiance(lignes: List[dict]) -> bytes:
+    """Chemin de lecture de confiance utilisé par les routers"""
+    return trusted_list_response(CollecteResponse, lignes).body
+
+
+def temps_cpu(fonction, repeat: int) -> float:
+    """Retourner le temps CPU médian (ms) sur `repeat` itérations"""
+    durees = []
+    for _ in range(repeat):
+        debut = time.process_time()
+        fonction()
+        durees.append((time.process_time() - debut) * 1000)
+    durees.sort()
+    return durees[len(durees) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du chemin de lecture de confiance")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="Tailles de liste")
+    parser.add_argument("--repeat", type=int, default=7, help="Nombre d'itérations")
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[CollecteResponse])
+
+    print("=" * 70)
+    print("BENCHMARK LECTURE DE CONFIANCE - GET /api/collectes")
+    print("=" * 70)
+    print(f"\n{'lignes':>10} {'historique (ms)':>18} {'confiance (ms)':>18} {'gain':>8}")
+
+    for count in args.rows:
+        lignes = generer_lignes(count)
+        t_historique = temps_cpu(lambda: chemin_historique(lignes, adapter), args.repeat)
+        t_confiance = temps_cpu(lambda: chemin_confiance(lignes), args.repeat)
+        print(f"{count:>10} {t_historique:>18.2f} {t_confiance:>18.2f} {t_historique / t_confiance:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
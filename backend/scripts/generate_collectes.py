@@ -0,0 +1,398 @@
+"""
+Générateur de collectes de prix synthétiques à grande échelle.
+
+Produit des séries de prix réalistes par (marché, produit, unité, période):
+- prix de base par produit et facteur propre à chaque marché,
+- saisonnalité annuelle et bruit autorégressif,
+- chocs de prix (hausses brutales qui s'estompent) déclenchant des alertes,
+- jours manquants, marchés hebdomadaires, périodes plus ou moins couvertes,
+- répartition inégale des collectes entre les agents d'un marché.
+
+La génération est déterministe pour une graine et un référentiel donnés
+(marchés et produits triés par code). Les documents sont marqués
+"synthetique" et insérés par lots insert_many en parallèle (processus
+× lots concurrents par processus).
+
+Usage:
+    python -m backend.scripts.generate_collectes --annees 3 --workers 4
+    python -m backend.scripts.generate_collectes --debut 2023-01-01 --fin 2025-12-31 --seed 7
+    python -m backend.scripts.generate_collectes --dry-run --annees 1
+    python -m backend.scripts.generate_collectes --reset
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+import sys
+import os
+
+import numpy as np
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+
+PERIODES = ["matin1", "matin2", "soir1", "soir2"]
+# Probabilité qu'une période soit collectée un jour de marché
+PROBA_PERIODES = np.array([1.0, 0.6, 0.5, 0.3])
+# Heure de saisie de chaque période
+HEURES_PERIODES = [7, 10, 15, 18]
+# Répartition des collectes entre les agents d'un marché (agent principal d'abord)
+POIDS_AGENTS = [0.7, 0.2, 0.1]
+# Portée du noyau autorégressif (jours)
+PORTEE_AR = 60
+
+PARAMETRES_DEFAUT = {
+    "proba_manquant": 0.1,      # Jours sans collecte
+    "chocs_par_an": 1.5,        # Chocs de prix par série et par an
+    "choc_min": 0.3,            # Amplitude minimale d'un choc (+30%)
+    "choc_max": 0.8,            # Amplitude maximale d'un choc (+80%)
+    "volatilite": 0.02,         # Écart-type du bruit journalier
+    "ar_phi": 0.9,              # Persistance du bruit autorégressif
+    "proba_rejet": 0.01,        # Part de collectes rejetées
+}
+
+
+# ============================================================================
+# Construction des séries
+# ============================================================================
+
+def construire_series(marches: List[dict], produits: List[dict], agents: List[dict], seed: int) -> List[dict]:
+    """
+    Construire la description de chaque série (marché, produit, unité).
+
+    Args:
+        marches: Marchés (avec leur tableau "produits" si configuré)
+        produits: Produits actifs
+        agents: Utilisateurs ayant le rôle agent
+        seed: Graine du générateur
+
+    Returns:
+        Liste de séries avec leurs paramètres fixes
+    """
+    rng = random.Random(seed)
+    marches = sorted(marches, key=lambda m: m.get("code") or str(m["_id"]))
+    produits = sorted(produits, key=lambda p: p.get("code") or str(p["_id"]))
+    produits_par_id = {str(p["_id"]): p for p in produits}
+
+    # Prix de base et saisonnalité par produit
+    profils = {
+        str(p["_id"]): {
+            "prix_base": p.get("prix_ref_moyen") or rng.uniform(40, 900),
+            "amplitude": rng.uniform(0.03, 0.2),
+            "phase": rng.uniform(0, 2 * math.pi),
+        }
+        for p in produits
+    }
+
+    # Les agents les plus actifs couvrent plusieurs marchés (loi de Zipf)
+    poids_zipf = [1 / (rang + 1) for rang in range(len(agents))]
+
+    series = []
+    for i, marche in enumerate(marches):
+        agents_marche = []
+        while agents and len(agents_marche) < min(len(POIDS_AGENTS), len(agents)):
+            agent = rng.choices(agents, weights=poids_zipf)[0]
+            if str(agent["_id"]) not in agents_marche:
+                agents_marche.append(str(agent["_id"]))
+        if not agents_marche:
+            continue
+
+        facteur_marche = rng.lognormvariate(0, 0.1)
+        hebdomadaire = marche.get("type_marche") == "hebdomadaire"
+        jour_marche = rng.randrange(7)
+
+        # Produits vendus: tableau du marché, sinon tout le référentiel
+        lignes = marche.get("produits") or [
+            {"id_produit": str(p["_id"]), "id_unite_mesure": p["id_unite_mesure"]}
+            for p in produits
+        ]
+        for j, ligne in enumerate(lignes):
+            produit_id = ligne.get("id_produit")
+            if produit_id not in produits_par_id:
+                continue
+            profil = profils[produit_id]
+            series.append({
+                "index": (i, j),
+                "marche_id": str(marche["_id"]),
+                "produit_id": produit_id,
+                "unite_id": ligne.get("id_unite_mesure") or produits_par_id[produit_id]["id_unite_mesure"],
+                "agents": agents_marche,
+                "prix_base": profil["prix_base"] * facteur_marche,
+                "amplitude": profil["amplitude"],
+                "phase": profil["phase"],
+                "hebdomadaire": hebdomadaire,
+                "jour_marche": jour_marche,
+            })
+    return series
+
+
+def simuler_prix(serie: dict, jours: List[datetime], rng: np.random.Generator,
+                 parametres: dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Simuler le prix journalier d'une série.
+
+    Returns:
+        (prix du jour, composante de choc, jours collectés) : le choc sert de
+        vérité terrain au backtest de la détection d'anomalies
+    """
+    n = len(jours)
+    t = np.arange(n)
+
+    # Saisonnalité annuelle (jour de l'année)
+    jour_annee = np.array([d.timetuple().tm_yday for d in jours])
+    saison = serie["amplitude"] * np.sin(2 * np.pi * jour_annee / 365.25 + serie["phase"])
+
+    # Bruit autorégressif AR(1) approché par convolution tronquée
+    bruit = rng.normal(0, parametres["volatilite"], n)
+    noyau = parametres["ar_phi"] ** np.arange(PORTEE_AR)
+    ar = np.convolve(bruit, noyau)[:n]
+
+    # Chocs de prix qui s'estompent exponentiellement
+    chocs = np.zeros(n)
+    for _ in range(rng.poisson(parametres["chocs_par_an"] * n / 365)):
+        debut = rng.integers(0, n)
+        amplitude = rng.uniform(parametres["choc_min"], parametres["choc_max"])
+        duree = rng.uniform(7, 45)
+        apres = t >= debut
+        chocs[apres] += amplitude * np.exp(-(t[apres] - debut) / duree)
+
+    prix_jour = serie["prix_base"] * np.exp(saison + ar) * (1 + chocs)
+
+    # Jours collectés
+    presents = rng.random(n) >= parametres["proba_manquant"]
+    if serie["hebdomadaire"]:
+        jours_semaine = np.array([d.weekday() for d in jours])
+        presents &= jours_semaine == serie["jour_marche"]
+
+    return prix_jour, chocs, presents
+
+
+def generer_serie(serie: dict, jours: List[datetime], seed: int, parametres: dict,
+                  etiquette: str = "synthetique") -> Iterator[dict]:
+    """
+    Générer les collectes d'une série sur les jours donnés.
+
+    Le générateur aléatoire est dérivé de (graine, index de la série) : le
+    résultat ne dépend pas de l'ordre ni du parallélisme de génération.
+
+    Args:
+        serie: Série issue de construire_series()
+        jours: Jours couverts (à minuit)
+        seed: Graine du générateur
+        parametres: Paramètres de génération (voir PARAMETRES_DEFAUT)
+        etiquette: Champ booléen marquant les documents générés
+    """
+    rng = np.random.default_rng([seed, *serie["index"]])
+    n = len(jours)
+    prix_jour, _, presents = simuler_prix(serie, jours, rng, parametres)
+
+    # Périodes couvertes les jours collectés
+    periodes = (rng.random((n, len(PERIODES))) < PROBA_PERIODES) & presents[:, None]
+    variation = 1 + rng.normal(0, 0.015, (n, len(PERIODES)))
+
+    agents = serie["agents"]
+    poids = POIDS_AGENTS[:len(agents)]
+    choix_agents = rng.choice(len(agents), size=(n, len(PERIODES)), p=np.array(poids) / sum(poids))
+    rejets = rng.random((n, len(PERIODES))) < parametres["proba_rejet"]
+
+    for jour, periode in zip(*np.nonzero(periodes)):
+        date = jours[jour]
+        yield {
+            "marche_id": serie["marche_id"],
+            "produit_id": serie["produit_id"],
+            "unite_id": serie["unite_id"],
+            "quantite": 1,
+            "prix": round(float(prix_jour[jour] * variation[jour, periode]), 2),
+            "date": date,
+            "periode": PERIODES[periode],
+            "agent_id": agents[choix_agents[jour, periode]],
+            "statut": "rejetee" if rejets[jour, periode] else "validee",
+            "created_at": date + timedelta(hours=HEURES_PERIODES[periode]),
+            etiquette: True,
+        }
+
+
+def generer_lots(series: List[dict], jours: List[datetime], seed: int, parametres: dict,
+                 batch_size: int, limit: Optional[int] = None,
+                 etiquette: str = "synthetique") -> Iterator[List[dict]]:
+    """Regrouper les collectes générées en lots de `batch_size` documents"""
+    lot = []
+    total = 0
+    for serie in series:
+        for document in generer_serie(serie, jours, seed, parametres, etiquette):
+            lot.append(document)
+            total += 1
+            if len(lot) >= batch_size:
+                yield lot
+                lot = []
+            if limit is not None and total >= limit:
+                if lot:
+                    yield lot
+                return
+    if lot:
+        yield lot
+
+
+def collectes_par_jour(parametres: Optional[dict] = None) -> float:
+    """Nombre moyen de collectes par série et par jour (marché quotidien)"""
+    parametres = {**PARAMETRES_DEFAUT, **(parametres or {})}
+    return float(PROBA_PERIODES.sum()) * (1 - parametres["proba_manquant"])
+
+
+def liste_jours(debut: datetime, fin: datetime) -> List[datetime]:
+    """Jours (à minuit) de debut à fin inclus"""
+    debut = debut.replace(hour=0, minute=0, second=0, microsecond=0)
+    return [debut + timedelta(days=i) for i in range((fin - debut).days + 1)]
+
+
+# ============================================================================
+# Insertion
+# ============================================================================
+
+async def inserer_collectes(db, series: List[dict], jours: List[datetime], seed: int,
+                            parametres: Optional[dict] = None, batch_size: int = 10000,
+                            concurrency: int = 4, limit: Optional[int] = None,
+                            dry_run: bool = False, etiquette: str = "synthetique") -> int:
+    """
+    Générer et insérer les collectes des séries avec `concurrency` insert_many
+    simultanés (non ordonnés).
+
+    Returns:
+        Nombre de documents générés
+    """
+    parametres = {**PARAMETRES_DEFAUT, **(parametres or {})}
+    semaphore = asyncio.Semaphore(concurrency)
+    taches = set()
+    total = 0
+
+    async def inserer(lot):
+        try:
+            await db.collectes_prix.insert_many(lot, ordered=False)
+        finally:
+            semaphore.release()
+
+    for lot in generer_lots(series, jours, seed, parametres, batch_size, limit, etiquette):
+        total += len(lot)
+        if dry_run:
+            continue
+        await semaphore.acquire()
+        tache = asyncio.create_task(inserer(lot))
+        taches.add(tache)
+        tache.add_done_callback(taches.discard)
+
+    if taches:
+        await asyncio.gather(*taches)
+    return total
+
+
+def _worker(series: List[dict], jours: List[datetime], seed: int, parametres: dict,
+            batch_size: int, concurrency: int, dry_run: bool) -> int:
+    """Point d'entrée d'un processus: client Motor dédié puis insertion"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from backend.config import settings
+
+    async def run():
+        client = AsyncIOMotorClient(settings.mongodb_url, maxPoolSize=concurrency + 1)
+        try:
+            return await inserer_collectes(
+                client[settings.mongodb_db_name], series, jours, seed, parametres,
+                batch_size, concurrency, dry_run=dry_run
+            )
+        finally:
+            client.close()
+
+    return asyncio.run(run())
+
+
+async def charger_referentiel(db, nombre_marches: Optional[int] = None) -> Dict[str, list]:
+    """Charger marchés, produits et agents actifs"""
+    marches = await db.marches.find({"actif": True}).sort("code", 1).to_list(nombre_marches)
+    produits = await db.produits.find({"actif": True}).to_list(None)
+    agents = await db.users.find({"roles": "agent", "actif": True}, {"_id": 1}).sort("_id", 1).to_list(None)
+    return {"marches": marches, "produits": produits, "agents": agents}
+
+
+# ============================================================================
+# Point d'entrée
+# ============================================================================
+
+async def main():
+    parser = argparse.ArgumentParser(description="Générateur de collectes synthétiques")
+    parser.add_argument("--debut", help="Date de début (YYYY-MM-DD)")
+    parser.add_argument("--fin", help="Date de fin (YYYY-MM-DD, défaut: aujourd'hui)")
+    parser.add_argument("--annees", type=float, default=3, help="Années d'historique si --debut absent")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--marches", type=int, help="Limiter le nombre de marchés")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processus d'insertion")
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many simultanés par processus")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--proba-manquant", type=float, default=PARAMETRES_DEFAUT["proba_manquant"])
+    parser.add_argument("--chocs-par-an", type=float, default=PARAMETRES_DEFAUT["chocs_par_an"])
+    parser.add_argument("--dry-run", action="store_true", help="Générer sans insérer (mesure du générateur)")
+    parser.add_argument("--reset", action="store_true", help="Supprimer les collectes synthétiques")
+    args = parser.parse_args()
+
+    from backend.database import connect_to_mongo, close_mongo_connection, get_database
+
+    print("=" * 70)
+    print("GENERATION DE COLLECTES SYNTHETIQUES")
+    print("=" * 70)
+
+    await connect_to_mongo()
+    try:
+        db = get_database()
+
+        if args.reset:
+            result = await db.collectes_prix.delete_many({"synthetique": True})
+            print(f"\n   -> {result.deleted_count} collecte(s) synthetique(s) supprimee(s)")
+            return
+
+        referentiel = await charger_referentiel(db, args.marches)
+        series = construire_series(
+            referentiel["marches"], referentiel["produits"], referentiel["agents"], args.seed
+        )
+        if not series:
+            print("\nAucune serie: il faut des marches, des produits et des agents actifs.")
+            return
+
+        fin = datetime.fromisoformat(args.fin) if args.fin else datetime.utcnow()
+        debut = (datetime.fromisoformat(args.debut) if args.debut
+                 else fin - timedelta(days=int(365 * args.annees)))
+        jours = liste_jours(debut, fin)
+        parametres = {
+            **PARAMETRES_DEFAUT,
+            "proba_manquant": args.proba_manquant,
+            "chocs_par_an": args.chocs_par_an,
+        }
+
+        print(f"\n{len(series)} series x {len(jours)} jours, {args.workers} processus")
+    finally:
+        await close_mongo_connection()
+
+    # Répartition des séries entre processus (chacun avec son client Motor)
+    partitions = [series[i::args.workers] for i in range(args.workers)]
+    debut_chrono = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        totaux = await asyncio.gather(*[
+            loop.run_in_executor(
+                executor, _worker, partition, jours, args.seed, parametres,
+                args.batch_size, args.concurrency, args.dry_run
+            )
+            for partition in partitions if partition
+        ])
+    duree = time.perf_counter() - debut_chrono
+    total = sum(totaux)
+
+    print(f"\n   -> {total} collectes {'generees' if args.dry_run else 'inserees'} en {duree:.1f}s "
+          f"({total / duree * 60:,.0f} documents/minute)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
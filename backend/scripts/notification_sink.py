@@ -0,0 +1,137 @@
+"""
+Serveur local remplaçant les fournisseurs de notifications pour les tests :
+API SendGrid v3 (POST /v3/mail/send), passerelle SMS (POST /sms) et
+webhooks (POST /webhook). Les messages reçus sont journalisés et comptés ;
+une part d'échecs (503) et une latence peuvent être simulées pour éprouver
+les nouvelles tentatives et le pool de workers.
+
+Configuration du backend correspondante :
+    SENDGRID_API_KEY=test
+    SENDGRID_API_URL=http://localhost:8025/v3/mail/send
+    SMS_GATEWAY_URL=http://localhost:8025/sms
+    NOTIFICATION_WEBHOOK_URLS=http://localhost:8025/webhook
+
+Usage:
+    python -m backend.scripts.notification_sink
+    python -m backend.scripts.notification_sink --port 8025 --fail-rate 0.2 --latency 0.5
+    curl http://localhost:8025/messages?canal=sms
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from typing import Optional
+import sys
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+
+def creer_application(fail_rate: float = 0.0, latency: float = 0.0, historique: int = 1000,
+                      verbose: bool = True) -> FastAPI:
+    """
+    Créer l'application du serveur de test.
+
+    Args:
+        fail_rate: Part des requêtes rejetées en 503 (erreur temporaire)
+        latency: Latence simulée par requête, en secondes
+        historique: Nombre de messages conservés pour GET /messages
+        verbose: Afficher chaque message reçu
+
+    Returns:
+        FastAPI: Application à servir avec uvicorn
+    """
+    app = FastAPI(title="SAP - Serveur de test des notifications")
+    messages = deque(maxlen=historique)
+    recus = Counter()
+    rejetes = Counter()
+    debut = time.time()
+
+    async def recevoir(canal: str, request: Request, destinataire) -> Response:
+        if latency:
+            await asyncio.sleep(latency)
+        if fail_rate and random.random() < fail_rate:
+            rejetes[canal] += 1
+            return JSONResponse({"detail": "échec simulé"}, status_code=503)
+
+        corps = await request.json()
+        adresse = destinataire(corps)
+        recus[canal] += 1
+        messages.append({
+            "canal": canal,
+            "adresse": adresse,
+            "recu_at": time.time(),
+            "corps": corps
+        })
+        if verbose:
+            print(f"[{canal}] {adresse}: {corps.get('subject') or corps.get('sujet') or corps.get('message', '')[:80]!r}")
+        # SendGrid répond 202 Accepted
+        return Response(status_code=202 if canal == "email" else 200)
+
+    @app.post("/v3/mail/send")
+    async def email(request: Request):
+        return await recevoir(
+            "email", request,
+            lambda c: ",".join(t["email"] for p in c.get("personalizations", []) for t in p.get("to", []))
+        )
+
+    @app.post("/sms")
+    async def sms(request: Request):
+        return await recevoir("sms", request, lambda c: c.get("to"))
+
+    @app.post("/webhook")
+    async def webhook(request: Request):
+        return await recevoir("webhook", request, lambda c: str(request.url))
+
+    @app.get("/messages")
+    async def lister(canal: Optional[str] = None, limit: int = 100):
+        lignes = [m for m in messages if canal is None or m["canal"] == canal]
+        return lignes[-limit:]
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "recus": dict(recus),
+            "rejetes": dict(rejetes),
+            "destinataires": len({(m["canal"], m["adresse"]) for m in messages}),
+            "uptime_s": round(time.time() - debut, 1)
+        }
+
+    @app.delete("/messages")
+    async def vider():
+        messages.clear()
+        recus.clear()
+        rejetes.clear()
+        return {"ok": True}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serveur local de test des notifications")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Part des requêtes en échec (503)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence par requête (secondes)")
+    parser.add_argument("--quiet", action="store_true", help="Ne pas afficher chaque message")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"SERVEUR DE TEST DES NOTIFICATIONS - http://{args.host}:{args.port}")
+    print("  email: /v3/mail/send   sms: /sms   webhook: /webhook   stats: /stats")
+    print("=" * 70)
+
+    app = creer_application(args.fail_rate, args.latency, verbose=not args.quiet)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Jeu de données synthétique pour les benchmarks de l'API SAP.
+Part des données de référence de seed_data.py puis ajoute des départements,
+communes, marchés, produits, utilisateurs et collectes marqués "benchmark".
+
+Usage:
+    python -m backend.scripts.seed_benchmark_data --collectes 1000000 --annees 3
+    python -m backend.scripts.seed_benchmark_data --reset
+"""
+
+import argparse
+import asyncio
+import math
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+import sys
+import os
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+
+BENCHMARK_PASSWORD = "benchmark123"
+
+# Collections contenant des documents marqués "benchmark"
+BENCHMARK_COLLECTIONS = [
+    "departements", "communes", "marches", "produits", "users", "collectes_prix"
+]
+
+
+async def seed_reference_data():
+    """Insérer les données de référence de seed_data.py (idempotent)"""
+    from backend.scripts import seed_data
+
+    await seed_data.seed_unites_mesure()
+    await seed_data.seed_categories_produit()
+    dept_map = await seed_data.seed_departements()
+    await seed_data.seed_communes(dept_map)
+    await seed_data.seed_produits()
+
+
+async def ensure_departements(db, count: int) -> list:
+    """Compléter les départements jusqu'à `count`"""
+    departements = await db.departements.find({"actif": True}).to_list(None)
+    nouveaux = [
+        {
+            "code": f"BENCH-D{i:03d}",
+            "nom": f"Département bench {i}",
+            "actif": True,
+            "benchmark": True,
+            "created_at": datetime.utcnow()
+        }
+        for i in range(len(departements) + 1, count + 1)
+    ]
+    if nouveaux:
+        await db.departements.insert_many(nouveaux)
+        departements.extend(nouveaux)
+    return departements[:count]
+
+
+async def ensure_communes(db, departements: list, par_departement: int) -> list:
+    """Compléter les communes de chaque département jusqu'à `par_departement`"""
+    communes = []
+    nouveaux = []
+    for dept in departements:
+        dept_id = str(dept["_id"])
+        existantes = await db.communes.find({"departement_id": dept_id, "actif": True}).to_list(None)
+        for i in range(len(existantes) + 1, par_departement + 1):
+            nouveaux.append({
+                "code": f"BENCH-{dept['code']}-C{i:03d}",
+                "nom": f"Commune bench {dept['code']}-{i}",
+                "departement_id": dept_id,
+                "type_zone": random.choice(["urbaine", "peri-urbaine", "rurale"]),
+                "population": random.randint(10000, 500000),
+                "actif": True,
+                "benchmark": True,
+                "created_at": datetime.utcnow()
+            })
+        communes.extend(existantes[:par_departement])
+    if nouveaux:
+        await db.communes.insert_many(nouveaux)
+        communes.extend(nouveaux)
+    return communes
+
+
+async def ensure_produits(db, count: int) -> list:
+    """Compléter les produits jusqu'à `count`"""
+    produits = await db.produits.find({"actif": True}).to_list(None)
+    if len(produits) < count:
+        categories = await db.categories_produit.find().to_list(None)
+        unites = await db.unites_mesure.find().to_list(None)
+        nouveaux = [
+            {
+                "nom": f"Produit bench {i}",
+                "code": f"BENCH-P{i:04d}",
+                "id_categorie": str(random.choice(categories)["_id"]),
+                "id_unite_mesure": str(random.choice(unites)["_id"]),
+                "description": None,
+                "actif": True,
+                "benchmark": True,
+                "created_at": datetime.utcnow()
+            }
+            for i in range(len(produits) + 1, count + 1)
+        ]
+        await db.produits.insert_many(nouveaux)
+        produits.extend(nouveaux)
+    return produits[:count]
+
+
+async def ensure_marches(db, communes: list, par_commune: int, produits: list) -> list:
+    """Créer `par_commune` marchés par commune, chacun vendant tous les produits"""
+    marches = await db.marches.find({"benchmark": True}).to_list(None)
+    if marches:
+        return marches
+
+    produits_marche = [
+        {
+            "id_produit": str(p["_id"]),
+            "id_unite_mesure": p["id_unite_mesure"],
+            "actif": True
+        }
+        for p in produits
+    ]
+    numero = 0
+    for commune in communes:
+        for _ in range(par_commune):
+            numero += 1
+            latitude = round(random.uniform(18.0, 20.0), 6)
+            longitude = round(random.uniform(-74.4, -71.7), 6)
+            marches.append({
+                "nom": f"Marché bench {numero}",
+                "code": f"BENCH-M{numero:05d}",
+                "commune_id": str(commune["_id"]),
+                "type_marche": "quotidien",
+                "latitude": latitude,
+                "longitude": longitude,
+                "location": {"type": "Point", "coordinates": [longitude, latitude]},
+                "produits": produits_marche,
+                "actif": True,
+                "benchmark": True,
+                "created_at": datetime.utcnow()
+            })
+    if marches:
+        await db.marches.insert_many(marches)
+    return marches
+
+
+async def ensure_users(db, agents: int) -> dict:
+    """Créer les agents et le décideur de benchmark"""
+    from backend.services.auth import hash_password
+
+    existants = await db.users.find({"benchmark": True}).to_list(None)
+    if existants:
+        return {
+            "agents": [u for u in existants if "agent" in u["roles"]],
+            "decideurs": [u for u in existants if "décideur" in u["roles"]]
+        }
+
+    password_hash = hash_password(BENCHMARK_PASSWORD)
+    users = [
+        {
+            "_id": ObjectId(),
+            "email": f"bench.agent{i}@sap.ht",
+            "password_hash": password_hash,
+            "roles": ["agent"],
+            "nom": f"Agent{i}",
+            "prenom": "Bench",
+            "actif": True,
+            "mfa_enabled": False,
+            "benchmark": True,
+            "created_at": datetime.utcnow()
+        }
+        for i in range(1, agents + 1)
+    ]
+    users.append({
+        "_id": ObjectId(),
+        "email": "bench.decideur@sap.ht",
+        "password_hash": password_hash,
+        "roles": ["décideur"],
+        "nom": "Decideur",
+        "prenom": "Bench",
+        "actif": True,
+        "mfa_enabled": False,
+        "benchmark": True,
+        "created_at": datetime.utcnow()
+    })
+    await db.users.insert_many(users)
+    return {"agents": users[:-1], "decideurs": users[-1:]}
+
+
+async def seed_collectes(db, marches: list, produits: list, agents: list,
+                         count: int, annees: int, batch_size: int, seed: int = 42) -> int:
+    """
+    Insérer environ `count` collectes réalistes via generate_collectes
+    (saisonnalité, chocs, jours manquants), sur au plus `annees` années.
+    La période couverte est réduite pour atteindre `count` sans tronquer
+    les dernières séries.
+    """
+    from backend.scripts.generate_collectes import (
+        construire_series, collectes_par_jour, inserer_collectes, liste_jours
+    )
+
+    if count <= 0:
+        return 0
+
+    series = construire_series(marches, produits, agents, seed)
+    if not series:
+        return 0
+
+    jours = math.ceil(count / (len(series) * collectes_par_jour()))
+    jours = min(max(1, jours), max(1, 365 * annees))
+    fin = datetime.utcnow()
+    return await inserer_collectes(
+        db, series, liste_jours(fin - timedelta(days=jours - 1), fin), seed,
+        batch_size=batch_size, limit=count, etiquette="benchmark"
+    )
+
+
+async def seed_benchmark_dataset(
+    departements: int = 10,
+    communes_par_departement: int = 3,
+    marches_par_commune: int = 2,
+    produits: int = 15,
+    agents: int = 20,
+    collectes: int = 20000,
+    annees: int = 2,
+    batch_size: int = 5000,
+    seed: int = 42
+) -> dict:
+    """
+    Construire le jeu de données de benchmark (MongoDB doit être connecté).
+
+    Returns:
+        dict: IDs utiles aux scénarios de charge (marchés, produits, unités,
+        départements, agents, décideurs)
+    """
+    from backend.database import get_database
+
+    random.seed(seed)
+    db = get_database()
+
+    await seed_reference_data()
+    depts = await ensure_departements(db, departements)
+    communes = await ensure_communes(db, depts, communes_par_departement)
+    produits_docs = await ensure_produits(db, produits)
+    marches = await ensure_marches(db, communes, marches_par_commune, produits_docs)
+    users = await ensure_users(db, agents)
+
+    existantes = await db.collectes_prix.count_documents({"benchmark": True})
+    await seed_collectes(
+        db, marches, produits_docs, users["agents"],
+        collectes - existantes, annees, batch_size, seed
+    )
+
+    return {
+        "departements": [str(d["_id"]) for d in depts],
+        "marches": [str(m["_id"]) for m in marches],
+        "produits": [(str(p["_id"]), p["id_unite_mesure"]) for p in produits_docs],
+        "agents": [str(u["_id"]) for u in users["agents"]],
+        "decideurs": [str(u["_id"]) for u in users["decideurs"]],
+    }
+
+
+async def reset_benchmark_dataset() -> None:
+    """Supprimer tous les documents marqués "benchmark" """
+    from backend.database import get_database
+
+    db = get_database()
+    for name in BENCHMARK_COLLECTIONS:
+        result = await db[name].delete_many({"benchmark": True})
+        print(f"   - {name}: {result.deleted_count} document(s) supprime(s)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Jeu de données de benchmark SAP")
+    parser.add_argument("--departements", type=int, default=10)
+    parser.add_argument("--communes", type=int, default=3, help="Communes par département")
+    parser.add_argument("--marches", type=int, default=2, help="Marchés par commune")
+    parser.add_argument("--produits", type=int, default=15)
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--collectes", type=int, default=20000)
+    parser.add_argument("--annees", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Supprimer le jeu de benchmark")
+    args = parser.parse_args()
+
+    from backend.database import connect_to_mongo, close_mongo_connection
+
+    print("=" * 70)
+    print("JEU DE DONNEES DE BENCHMARK SAP")
+    print("=" * 70)
+
+    await connect_to_mongo()
+    try:
+        if args.reset:
+            await reset_benchmark_dataset()
+            return
+
+        debut = datetime.utcnow()
+        ids = await seed_benchmark_dataset(
+            departements=args.departements,
+            communes_par_departement=args.communes,
+            marches_par_commune=args.marches,
+            produits=args.produits,
+            agents=args.agents,
+            collectes=args.collectes,
+            annees=args.annees,
+            batch_size=args.batch_size,
+            seed=args.seed
+        )
+        duree = (datetime.utcnow() - debut).total_seconds()
+
+        print(f"\nJeu de donnees pret en {duree:.1f}s:")
+        print(f"   - Departements: {len(ids['departements'])}")
+        print(f"   - Marches: {len(ids['marches'])}")
+        print(f"   - Produits: {len(ids['produits'])}")
+        print(f"   - Agents: {len(ids['agents'])}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
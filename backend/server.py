@@ -0,0 +1,156 @@
+"""
+Lanceur de production de l'API SAP.
+
+Démarre plusieurs workers uvicorn (processus) derrière un même socket, afin
+que les traitements CPU (bcrypt, sérialisation Pydantic, imports de
+fichiers) ne soient plus limités à un cœur :
+- nombre de workers dérivé des CPU disponibles (SERVER_WORKERS=0) ;
+- uvloop et httptools utilisés s'ils sont installés (uvicorn[standard]) ;
+- chaque worker est recyclé après SERVER_MAX_REQUESTS requêtes (plus un
+  écart aléatoire) et remplacé par le superviseur ;
+- à l'arrêt (SIGTERM/SIGINT), les requêtes en cours sont terminées pendant
+  au plus SERVER_GRACEFUL_TIMEOUT_SECONDS secondes avant le lifespan de
+  fermeture (écriture des logs d'audit en file) ;
+- SIGHUP redémarre les workers un à un (rechargement sans coupure).
+
+Les caches de chaque worker restent en mémoire locale ; les invalidations
+(caches agrégés, seuils, révocations) sont propagées par MongoDB. Avec
+plusieurs workers :
+- RATE_LIMIT_STORE=mongodb partage les compteurs du limiteur de débit ;
+- ALERT_STREAM_SOURCE=change_stream est requis pour le flux SSE des
+  alertes (en local, un abonné ne reçoit que les alertes écrites par son
+  worker) ;
+- /metrics expose les compteurs du seul worker qui répond : chaque scrape
+  Prometheus voit un worker différent, les séries ne sont pas agrégées.
+  Interroger un seul worker (SERVER_WORKERS=1) pour des métriques
+  exactes, ou les lire comme un échantillon.
+
+Usage:
+    python -m backend.server
+    python -m backend.server --workers 4 --port 10000
+"""
+
+from typing import Optional
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import random
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from backend.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def cpu_disponibles() -> int:
+    """
+    CPU utilisables par ce processus : affinité, bornée par le quota cgroup
+    v2 (conteneurs) s'il est défini.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, periode = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(periode)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def nombre_workers(demande: Optional[int] = None) -> int:
+    """
+    Nombre de workers à lancer.
+
+    Args:
+        demande: Valeur explicite (sinon SERVER_WORKERS ; 0 = automatique)
+
+    Returns:
+        int: Workers demandés, ou CPU disponibles plafonnés par SERVER_MAX_WORKERS
+    """
+    workers = demande if demande is not None else settings.server_workers
+    if workers > 0:
+        return workers
+    return max(1, min(cpu_disponibles(), settings.server_max_workers))
+
+
+def implementation(choix: str, rapide: str, defaut: str) -> str:
+    """Implémentation retenue par uvicorn pour "auto" (rapide si installée)"""
+    if choix != "auto":
+        return choix
+    return rapide if importlib.util.find_spec(rapide) else defaut
+
+
+class Serveur(uvicorn.Server):
+    """Serveur uvicorn dont la limite de requêtes est tirée dans chaque worker"""
+
+    def run(self, sockets=None) -> None:
+        if settings.server_max_requests > 0:
+            # Tirage dans le processus du worker : les workers ne sont pas
+            # recyclés en même temps
+            self.config.limit_max_requests = settings.server_max_requests + random.randint(
+                0, max(0, settings.server_max_requests_jitter)
+            )
+        super().run(sockets=sockets)
+
+
+def creer_config(workers: int, host: str, port: int) -> uvicorn.Config:
+    """Configuration uvicorn de production"""
+    return uvicorn.Config(
+        "backend.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=settings.server_loop,
+        http=settings.server_http,
+        timeout_graceful_shutdown=settings.server_graceful_timeout_seconds,
+        timeout_keep_alive=settings.server_keep_alive_seconds,
+        log_level="info" if settings.is_development else "warning",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lanceur de production de l'API SAP")
+    parser.add_argument("--workers", type=int, help="Nombre de workers (0 = CPU disponibles)")
+    parser.add_argument("--host", default=settings.app_host)
+    parser.add_argument("--port", type=int, default=settings.app_port)
+    args = parser.parse_args()
+
+    workers = nombre_workers(args.workers)
+    config = creer_config(workers, args.host, args.port)
+    logger.warning(
+        f"🚀 SAP: {workers} worker(s) sur {args.host}:{args.port} "
+        f"(boucle {implementation(settings.server_loop, 'uvloop', 'asyncio')}, "
+        f"http {implementation(settings.server_http, 'httptools', 'h11')}, "
+        f"recyclage après {settings.server_max_requests or '∞'} requêtes)"
+    )
+    if workers > 1 and settings.rate_limit_store == "memory":
+        logger.warning("⚠️  RATE_LIMIT_STORE=memory: limites de débit comptées par worker")
+    if workers > 1 and settings.alert_stream_source == "local":
+        logger.warning(
+            "⚠️  ALERT_STREAM_SOURCE=local: le flux SSE ne diffuse que les alertes du worker "
+            "de l'abonné (utiliser change_stream avec plusieurs workers)"
+        )
+    if workers > 1 and settings.metrics_enabled:
+        logger.warning("⚠️  /metrics: métriques par worker (non agrégées entre workers)")
+
+    serveur = Serveur(config)
+    try:
+        if workers > 1 or settings.server_max_requests > 0:
+            # Superviseur même pour un worker : il remplace le worker recyclé
+            Multiprocess(config, target=serveur.run, sockets=[config.bind_socket()]).run()
+        else:
+            serveur.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
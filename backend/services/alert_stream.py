@@ -0,0 +1,440 @@
+"""
+Diffusion des alertes en temps réel (Server-Sent Events) pour SAP.
+
+Le moteur d'alertes publie chaque création, mise à jour ou résolution
+d'alerte dans un diffuseur en mémoire ; chaque client SSE abonné reçoit les
+événements de son périmètre (département, niveaux) via une file dédiée.
+Un client inactif ne coûte qu'une coroutine en attente sur sa file et un
+commentaire de maintien de connexion toutes les
+ALERT_STREAM_HEARTBEAT_SECONDS secondes.
+
+Sources d'événements (ALERT_STREAM_SOURCE) :
+- local: publication directe par le worker qui modifie l'alerte (un seul
+  worker, ou clients répartis par affinité)
+- change_stream: chaque worker suit le change stream MongoDB de la
+  collection alertes (replica set requis) ; tous les clients reçoivent les
+  événements quel que soit le worker qui a modifié l'alerte
+
+Reprise : chaque événement a un identifiant "<horodatage ms>-<séquence>".
+Un client qui se reconnecte avec Last-Event-ID reçoit les événements
+manqués depuis le tampon mémoire, ou, s'ils en sont sortis, l'état actuel
+des alertes modifiées depuis cet horodatage.
+
+Authentification : EventSource n'envoie pas d'en-tête ; le client échange
+son token d'accès contre un ticket à usage unique (ALERT_STREAM_TICKET_SECONDS
+secondes, collection stream_tickets) passé dans l'URL. Le flux est fermé
+à l'expiration du token d'accès ou à sa révocation (événement
+session.expiree) ; le client rouvre alors le flux avec un nouveau ticket.
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Set
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+
+import orjson
+from pymongo import IndexModel
+
+from backend.config import settings
+from backend.database import db, max_time_ms
+from backend.services.token_revocation import est_revoque
+
+logger = logging.getLogger(__name__)
+
+
+CREEE = "alerte.creee"
+MISE_A_JOUR = "alerte.mise_a_jour"
+RESOLUE = "alerte.resolue"
+
+# Nombre maximal d'alertes renvoyées lors d'une reprise depuis la base
+REPRISE_LIMITE = 500
+
+
+class Evenement:
+    """
+    Événement d'alerte diffusé aux abonnés.
+
+    Args:
+        id: Identifiant "<horodatage ms>-<séquence>" (Last-Event-ID)
+        type: CREEE, MISE_A_JOUR ou RESOLUE
+        alerte: Alerte enrichie (même forme que GET /api/alertes)
+    """
+
+    __slots__ = ("id", "type", "alerte", "departement_id", "niveau", "_message")
+
+    def __init__(self, id: str, type: str, alerte: dict):
+        self.id = id
+        self.type = type
+        self.alerte = alerte
+        self.departement_id = alerte.get("departement_id")
+        self.niveau = alerte.get("niveau")
+        self._message: Optional[bytes] = None
+
+    def message(self) -> bytes:
+        """Message SSE encodé (une seule sérialisation pour tous les abonnés)"""
+        if self._message is None:
+            data = orjson.dumps(self.alerte)
+            self._message = f"id: {self.id}\nevent: {self.type}\ndata: ".encode() + data + b"\n\n"
+        return self._message
+
+
+class Abonnement:
+    """
+    Abonné au flux : file d'événements bornée et filtre de périmètre.
+
+    Args:
+        departement_id: Département suivi (None pour tous)
+        niveaux: Niveaux suivis (vide pour tous)
+    """
+
+    __slots__ = ("departement_id", "niveaux", "queue", "deborde")
+
+    def __init__(self, departement_id: Optional[str], niveaux: Iterable[str]):
+        self.departement_id = departement_id
+        self.niveaux: Set[str] = set(niveaux)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.alert_stream_queue_size)
+        self.deborde = False
+
+    def accepte(self, evenement: Evenement) -> bool:
+        """L'événement est-il dans le périmètre de l'abonné ?"""
+        if self.niveaux and evenement.niveau not in self.niveaux and evenement.type != RESOLUE:
+            return False
+        return self.departement_id is None or evenement.departement_id == self.departement_id
+
+    def envoyer(self, evenement: Evenement) -> None:
+        """
+        Déposer un événement sans bloquer le diffuseur. Un abonné trop lent
+        (file pleine) est déconnecté ; il reprendra avec Last-Event-ID.
+        """
+        if self.deborde:
+            return
+        try:
+            self.queue.put_nowait(evenement)
+        except asyncio.QueueFull:
+            self.deborde = True
+
+
+class AlertBroadcaster:
+    """
+    Diffuseur en mémoire (un par worker). Les abonnés sont indexés par
+    département : publier un événement ne parcourt que les abonnés du
+    département concerné et ceux qui suivent tous les départements.
+    """
+
+    def __init__(self, buffer_size: int):
+        self._abonnes: Dict[Optional[str], Set[Abonnement]] = {}
+        self._historique: Deque[Evenement] = deque(maxlen=buffer_size)
+        self._sequence = 0
+
+    @property
+    def nombre_abonnes(self) -> int:
+        return sum(len(abonnes) for abonnes in self._abonnes.values())
+
+    def prochain_id(self) -> str:
+        self._sequence += 1
+        return f"{int(time.time() * 1000)}-{self._sequence}"
+
+    def abonner(self, departement_id: Optional[str] = None, niveaux: Iterable[str] = ()) -> Abonnement:
+        abonnement = Abonnement(departement_id, niveaux)
+        self._abonnes.setdefault(departement_id, set()).add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement: Abonnement) -> None:
+        abonnes = self._abonnes.get(abonnement.departement_id)
+        if abonnes is not None:
+            abonnes.discard(abonnement)
+            if not abonnes:
+                del self._abonnes[abonnement.departement_id]
+
+    def publier(self, type: str, alerte: dict) -> Evenement:
+        """Diffuser un événement aux abonnés concernés et le garder pour les reprises"""
+        evenement = Evenement(self.prochain_id(), type, alerte)
+        self._historique.append(evenement)
+        for cle in {None, evenement.departement_id}:
+            for abonnement in self._abonnes.get(cle, ()):
+                if abonnement.accepte(evenement):
+                    abonnement.envoyer(evenement)
+        return evenement
+
+    def oublier(self) -> None:
+        """
+        Vider le tampon de reprise. Appelé quand une écriture n'est pas
+        publiée faute d'abonnés : une reprise ultérieure passera par la base
+        plutôt que de sauter cet événement.
+        """
+        self._historique.clear()
+
+    def depuis(self, last_event_id: str) -> Optional[List[Evenement]]:
+        """
+        Événements postérieurs à `last_event_id` encore dans le tampon, ou
+        None si cet identifiant en est sorti (ou vient d'un autre worker).
+        """
+        for i, evenement in enumerate(self._historique):
+            if evenement.id == last_event_id:
+                return list(self._historique)[i + 1:]
+        return None
+
+
+broadcaster = AlertBroadcaster(settings.alert_stream_buffer_size)
+
+_watch_task: Optional[asyncio.Task] = None
+
+
+# ============================================================================
+# Publication (moteur d'alertes)
+# ============================================================================
+
+def type_evenement(alerte: dict, creee: bool = False) -> str:
+    """Type d'événement correspondant à l'état d'une alerte"""
+    if alerte.get("statut") != "active":
+        return RESOLUE
+    return CREEE if creee else MISE_A_JOUR
+
+
+async def publier_alertes(alertes: List[dict], creees: Iterable = ()) -> None:
+    """
+    Publier l'état d'alertes venant d'être écrites (source "local").
+    L'enrichissement (noms, département) est fait une fois par lot, quel que
+    soit le nombre d'abonnés.
+
+    Args:
+        alertes: Documents d'alertes après écriture (avec _id)
+        creees: Identifiants des alertes nouvellement créées
+    """
+    if settings.alert_stream_source != "local" or not alertes:
+        return
+    if not broadcaster.nombre_abonnes:
+        broadcaster.oublier()
+        return
+    from backend.routers.alertes import enrichir_alertes
+
+    creees = set(creees)
+    try:
+        enrichies = await enrichir_alertes(alertes, None)
+    except Exception as e:
+        # La diffusion ne doit jamais faire échouer l'écriture d'une alerte
+        logger.warning(f"⚠️  Diffusion des alertes impossible: {e}")
+        return
+    for alerte, enrichie in zip(alertes, enrichies):
+        enrichie.pop("vue", None)
+        broadcaster.publier(type_evenement(alerte, alerte["_id"] in creees), enrichie)
+
+
+async def publier_alertes_par_ids(ids: List, creees: Iterable = ()) -> None:
+    """Relire des alertes par identifiant puis les publier (voir publier_alertes)"""
+    if settings.alert_stream_source != "local" or not ids:
+        return
+    if not broadcaster.nombre_abonnes:
+        broadcaster.oublier()
+        return
+    try:
+        alertes = await db.alertes.find({"_id": {"$in": list(ids)}}).to_list(None)
+    except Exception as e:
+        logger.warning(f"⚠️  Diffusion des alertes impossible: {e}")
+        return
+    await publier_alertes(alertes, creees)
+
+
+# ============================================================================
+# Change stream MongoDB (source "change_stream")
+# ============================================================================
+
+async def _suivre_change_stream() -> None:
+    """Publier les écritures sur la collection alertes (tous workers confondus)"""
+    from backend.routers.alertes import enrichir_alertes
+
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    while True:
+        try:
+            async with db.alertes.watch(pipeline, full_document="updateLookup") as stream:
+                logger.info("📡 Flux d'alertes: change stream ouvert")
+                async for change in stream:
+                    alerte = change.get("fullDocument")
+                    if not alerte:
+                        continue
+                    if not broadcaster.nombre_abonnes:
+                        broadcaster.oublier()
+                        continue
+                    enrichie = (await enrichir_alertes([alerte], None))[0]
+                    enrichie.pop("vue", None)
+                    broadcaster.publier(
+                        type_evenement(alerte, change["operationType"] == "insert"), enrichie
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Change stream des alertes interrompu: {e}")
+            await asyncio.sleep(5)
+
+
+def start_alert_stream() -> None:
+    """Démarrer le suivi du change stream si configuré (appelé dans le lifespan)"""
+    global _watch_task
+    if settings.alert_stream_source == "change_stream" and _watch_task is None:
+        _watch_task = asyncio.create_task(_suivre_change_stream())
+
+
+async def stop_alert_stream() -> None:
+    """Arrêter le suivi du change stream"""
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        try:
+            await _watch_task
+        except asyncio.CancelledError:
+            pass
+        _watch_task = None
+
+
+# ============================================================================
+# Tickets de connexion
+# ============================================================================
+
+# Claims du token d'accès conservés avec le ticket
+CLAIMS_TICKET = ("sub", "type", "jti", "iat", "exp")
+
+
+def _empreinte_ticket(ticket: str) -> str:
+    # Seule l'empreinte est stockée : la base ne contient aucun ticket utilisable
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+async def creer_ticket(payload: dict) -> str:
+    """
+    Créer un ticket de flux pour un token d'accès vérifié.
+
+    Args:
+        payload: Payload du token d'accès
+
+    Returns:
+        str: Ticket à passer en paramètre `ticket` de GET /api/alertes/flux
+    """
+    ticket = secrets.token_urlsafe(32)
+    await db.stream_tickets.insert_one({
+        "_id": _empreinte_ticket(ticket),
+        "payload": {claim: payload.get(claim) for claim in CLAIMS_TICKET},
+        "expire_at": datetime.utcnow() + timedelta(seconds=settings.alert_stream_ticket_seconds)
+    })
+    return ticket
+
+
+async def consommer_ticket(ticket: str) -> Optional[dict]:
+    """
+    Consommer un ticket (suppression atomique : un seul usage, sur
+    n'importe quel worker).
+
+    Returns:
+        Payload du token d'accès, None si le ticket est inconnu, expiré,
+        déjà utilisé, ou si le token a expiré ou été révoqué depuis
+    """
+    doc = await db.stream_tickets.find_one_and_delete({
+        "_id": _empreinte_ticket(ticket),
+        "expire_at": {"$gt": datetime.utcnow()}
+    })
+    if doc is None:
+        return None
+    payload = doc["payload"]
+    if (payload.get("exp") or 0) <= time.time() or est_revoque(payload):
+        return None
+    return payload
+
+
+def ticket_indexes() -> List[IndexModel]:
+    """Purge des tickets non utilisés"""
+    return [IndexModel("expire_at", expireAfterSeconds=0)]
+
+
+# ============================================================================
+# Flux SSE (clients)
+# ============================================================================
+
+# Fin de session : le client rouvre le flux avec un nouveau ticket
+SESSION_EXPIREE = b"event: session.expiree\ndata: {}\n\n"
+
+async def evenements_manques(abonnement: Abonnement, last_event_id: str) -> List[Evenement]:
+    """
+    Événements manqués depuis `last_event_id` : depuis le tampon si possible,
+    sinon état actuel des alertes modifiées depuis l'horodatage de l'id.
+    """
+    manques = broadcaster.depuis(last_event_id)
+    if manques is not None:
+        return [e for e in manques if abonnement.accepte(e)]
+
+    try:
+        depuis = datetime.utcfromtimestamp(int(last_event_id.split("-", 1)[0]) / 1000)
+    except ValueError:
+        return []
+
+    from backend.routers.alertes import enrichir_alertes
+
+    query = {"$or": [{"created_at": {"$gt": depuis}}, {"updated_at": {"$gt": depuis}}]}
+    if abonnement.departement_id:
+        communes = await db.communes.find(
+            {"departement_id": abonnement.departement_id}, {"_id": 1}
+        ).to_list(None)
+        marches = await db.marches.find(
+            {"commune_id": {"$in": [str(c["_id"]) for c in communes]}}, {"_id": 1}
+        ).to_list(None)
+        query["marche_id"] = {"$in": [str(m["_id"]) for m in marches]}
+    alertes = await (
+        db.alertes.find(query)
+        .sort("updated_at", 1)
+        .limit(REPRISE_LIMITE)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
+
+    evenements = []
+    for alerte, enrichie in zip(alertes, await enrichir_alertes(alertes, None)):
+        enrichie.pop("vue", None)
+        creee = alerte.get("created_at", depuis) > depuis
+        evenement = Evenement(broadcaster.prochain_id(), type_evenement(alerte, creee), enrichie)
+        if abonnement.accepte(evenement):
+            evenements.append(evenement)
+    return evenements
+
+
+async def flux_sse(abonnement: Abonnement, last_event_id: Optional[str] = None,
+                   payload: Optional[dict] = None) -> AsyncIterator[bytes]:
+    """
+    Générer le flux SSE d'un abonné : reprise éventuelle, puis événements et
+    commentaires de maintien de connexion. Le désabonnement est garanti à la
+    fermeture (déconnexion du client ou arrêt du serveur).
+
+    Args:
+        abonnement: Abonné
+        last_event_id: Dernier événement reçu (reprise)
+        payload: Token d'accès du client : le flux est fermé à son
+            expiration ou à sa révocation (vérifiée en mémoire)
+    """
+    heartbeat = settings.alert_stream_heartbeat_seconds
+    expiration = (payload or {}).get("exp")
+    try:
+        yield f"retry: {settings.alert_stream_retry_ms}\n\n".encode()
+        if last_event_id:
+            for evenement in await evenements_manques(abonnement, last_event_id):
+                yield evenement.message()
+
+        while True:
+            attente = heartbeat
+            if payload is not None:
+                restant = expiration - time.time() if expiration else heartbeat
+                if restant <= 0 or est_revoque(payload):
+                    yield SESSION_EXPIREE
+                    break
+                attente = min(heartbeat, restant)
+            try:
+                evenement = await asyncio.wait_for(abonnement.queue.get(), timeout=attente)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if abonnement.deborde:
+                # Client trop lent : fermer, il reprendra avec Last-Event-ID
+                break
+            yield evenement.message()
+    finally:
+        broadcaster.desabonner(abonnement)
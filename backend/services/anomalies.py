@@ -0,0 +1,415 @@
+"""
+Moteur de détection statistique des anomalies de prix pour SAP.
+
+Alternative au simple écart à la moyenne sur 30 jours (mode "seuils") :
+- "robuste": score z robuste du prix du jour par rapport à la médiane et au
+  MAD (écart absolu médian) des `window` jours précédents,
+- "saisonnier": même score, mais par rapport à une référence corrigée de la
+  saisonnalité (écart médian observé à la même période les années
+  précédentes).
+
+Les séries sont agrégées par (produit, département) : prix moyen journalier
+des marchés du département. Tous les calculs sont vectorisés avec NumPy sur
+une matrice séries × jours (NaN pour les jours sans collecte).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import math
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from backend.config import settings
+from backend.database import analytics_db, max_time_ms
+from backend.services.thresholds import get_threshold_table
+
+
+MODES = ("seuils", "robuste", "saisonnier")
+NIVEAUX = ("normal", "surveillance", "alerte", "urgence")
+
+# Constante de normalisation du MAD (cohérence avec l'écart-type d'une loi normale)
+MAD_SCALE = 0.6745
+# Plancher du MAD en log-prix (1%) : évite des scores infinis sur les séries plates
+MAD_FLOOR = 0.01
+# Demi-largeur (jours) de la fenêtre saisonnière autour de la même date
+SEASONAL_HALF_WIDTH = 7
+# Nombre maximal d'années antérieures utilisées pour la référence saisonnière
+SEASONAL_YEARS = 3
+# Nombre maximal d'éléments matérialisés par bloc de séries (fenêtres glissantes)
+CHUNK_ELEMENTS = 8_000_000
+
+
+class PriceHistory:
+    """
+    Historique des prix journaliers par (produit, département).
+
+    Args:
+        keys: Clés (produit_id, departement_id) de chaque série (lignes)
+        start: Premier jour (colonne 0)
+        values: Matrice (séries, jours) des prix moyens, NaN si aucune collecte
+    """
+
+    __slots__ = ("keys", "start", "values")
+
+    def __init__(self, keys: List[Tuple[str, str]], start: datetime, values: np.ndarray):
+        self.keys = keys
+        self.start = start
+        self.values = values
+
+    @property
+    def days(self) -> int:
+        return self.values.shape[1]
+
+    def date(self, index: int) -> datetime:
+        return self.start + timedelta(days=int(index))
+
+
+# ============================================================================
+# Chargement de l'historique
+# ============================================================================
+
+async def load_marche_departements() -> Dict[str, str]:
+    """Correspondance marché -> département (via la commune)"""
+    communes = await analytics_db.communes.find({}, {"departement_id": 1}).to_list(None)
+    commune_dept = {str(c["_id"]): c.get("departement_id") for c in communes}
+    marches = await analytics_db.marches.find({}, {"commune_id": 1}).to_list(None)
+    return {
+        str(m["_id"]): commune_dept.get(m.get("commune_id"))
+        for m in marches
+        if commune_dept.get(m.get("commune_id"))
+    }
+
+
+def build_history(rows: List[dict], marche_departements: Dict[str, str],
+                  start: datetime, days: int) -> PriceHistory:
+    """
+    Construire la matrice séries × jours à partir de moyennes par
+    (produit, marché, date) : moyenne des marchés d'un même département.
+
+    Args:
+        rows: Documents {"_id": {"produit_id", "marche_id", "date"}, "prix"}
+        marche_departements: Correspondance marché -> département
+        start: Premier jour de la matrice
+        days: Nombre de jours
+    """
+    keys: Dict[Tuple[str, str], int] = {}
+    series_idx, day_idx, prices = [], [], []
+    start_day = np.datetime64(start.date(), "D")
+
+    for row in rows:
+        dept = marche_departements.get(row["_id"]["marche_id"])
+        if dept is None:
+            continue
+        key = (row["_id"]["produit_id"], dept)
+        series_idx.append(keys.setdefault(key, len(keys)))
+        day_idx.append(row["_id"]["date"])
+        prices.append(row["prix"])
+
+    values = np.full((len(keys), days), np.nan)
+    if keys:
+        day_idx = (np.array(day_idx, dtype="datetime64[D]") - start_day).astype(np.int64)
+        series_idx = np.array(series_idx)
+        valid = (day_idx >= 0) & (day_idx < days)
+        flat = series_idx[valid] * days + day_idx[valid]
+        sums = np.bincount(flat, weights=np.array(prices)[valid], minlength=len(keys) * days)
+        counts = np.bincount(flat, minlength=len(keys) * days)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = (sums / counts).reshape(len(keys), days)
+
+    return PriceHistory(list(keys), start, values)
+
+
+async def load_price_history(jours: Optional[int] = None,
+                             fin: Optional[datetime] = None,
+                             produit_ids: Optional[List[str]] = None) -> PriceHistory:
+    """
+    Charger l'historique des collectes validées sur `jours` jours (lecture
+    analytique) : une moyenne par (produit, marché, jour), puis regroupement
+    par département en NumPy.
+
+    Les jours couverts par les agrégats nocturnes (prix_journaliers, voir
+    services.scheduler.rafraichir_rollups) sont lus dans ces agrégats ; seuls
+    les jours suivants sont agrégés depuis collectes_prix.
+
+    Args:
+        jours: Profondeur d'historique (ANOMALY_HISTORY_DAYS par défaut)
+        fin: Dernier jour inclus (aujourd'hui par défaut)
+        produit_ids: Limiter aux produits donnés
+    """
+    from backend.services.scheduler import couverture_rollups
+
+    jours = jours or settings.anomaly_history_days
+    fin = (fin or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = fin - timedelta(days=jours - 1)
+    borne = fin + timedelta(days=1)
+
+    rows = []
+    couverture = await couverture_rollups()
+    if couverture is not None and couverture > start:
+        couverture = min(couverture, borne)
+        match = {"_id.date": {"$gte": start, "$lt": couverture}}
+        if produit_ids is not None:
+            match["_id.produit_id"] = {"$in": list(produit_ids)}
+        # Moyenne pondérée des agrégats par unité
+        rows = await analytics_db.prix_journaliers.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"produit_id": "$_id.produit_id", "marche_id": "$_id.marche_id", "date": "$_id.date"},
+                "total": {"$sum": {"$multiply": ["$prix_moyen", "$nombre"]}},
+                "nombre": {"$sum": "$nombre"}
+            }},
+            {"$project": {"prix": {"$divide": ["$total", "$nombre"]}}}
+        ], allowDiskUse=True, maxTimeMS=max_time_ms("analytics")).to_list(None)
+        start_brut = couverture
+    else:
+        start_brut = start
+
+    if start_brut < borne:
+        match = {
+            "statut": "validee",
+            "date": {"$gte": start_brut, "$lt": borne}
+        }
+        if produit_ids is not None:
+            match["produit_id"] = {"$in": list(produit_ids)}
+
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "produit_id": "$produit_id",
+                    "marche_id": "$marche_id",
+                    "date": {"$dateTrunc": {"date": "$date", "unit": "day"}}
+                },
+                "prix": {"$avg": "$prix"}
+            }}
+        ]
+        rows += await analytics_db.collectes_prix.aggregate(
+            pipeline, allowDiskUse=True, maxTimeMS=max_time_ms("analytics")
+        ).to_list(None)
+
+    return build_history(rows, await load_marche_departements(), start, jours)
+
+
+# ============================================================================
+# Calculs vectorisés
+# ============================================================================
+
+def _chunks(series: int, width: int):
+    """Découper les séries en blocs bornant la mémoire des fenêtres glissantes"""
+    step = max(1, CHUNK_ELEMENTS // max(1, width))
+    for i in range(0, series, step):
+        yield slice(i, min(series, i + step))
+
+
+def rolling_median_mad(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Médiane, MAD et nombre d'observations des `window` jours précédant
+    chaque jour (le jour lui-même exclu).
+
+    Returns:
+        (median, mad, count), matrices de même forme que `values`
+    """
+    series, days = values.shape
+    median = np.full(values.shape, np.nan)
+    mad = np.full(values.shape, np.nan)
+    count = np.zeros(values.shape, dtype=np.int64)
+    if days <= window:
+        return median, mad, count
+
+    for rows in _chunks(series, days * window):
+        # Fenêtre [d - window, d) pour d = window .. days - 1
+        windows = sliding_window_view(values[rows, :-1], window, axis=1)
+        # Fenêtres entièrement vides : NaN attendu, avertissement inutile
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            med = np.nanmedian(windows, axis=2)
+            mad_chunk = np.nanmedian(np.abs(windows - med[..., None]), axis=2)
+        median[rows, window:] = med
+        mad[rows, window:] = mad_chunk
+        count[rows, window:] = np.sum(~np.isnan(windows), axis=2)
+    return median, mad, count
+
+
+def centered_rolling_median(values: np.ndarray, half_width: int) -> np.ndarray:
+    """Médiane glissante centrée de largeur 2 * half_width + 1 (NaN ignorés)"""
+    width = 2 * half_width + 1
+    padded = np.pad(values, ((0, 0), (half_width, half_width)), constant_values=np.nan)
+    result = np.full(values.shape, np.nan)
+    for rows in _chunks(values.shape[0], values.shape[1] * width):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            result[rows] = np.nanmedian(sliding_window_view(padded[rows], width, axis=1), axis=2)
+    return result
+
+
+def seasonal_offset(deviation: np.ndarray) -> np.ndarray:
+    """
+    Composante saisonnière (log) de chaque jour : médiane, sur les années
+    précédentes, de l'écart au niveau observé autour de la même date.
+    0 lorsqu'aucune année antérieure n'est disponible.
+    """
+    smoothed = centered_rolling_median(deviation, SEASONAL_HALF_WIDTH)
+    shifted = []
+    for year in range(1, SEASONAL_YEARS + 1):
+        lag = 365 * year
+        if lag >= deviation.shape[1]:
+            break
+        layer = np.full(deviation.shape, np.nan)
+        layer[:, lag:] = smoothed[:, :-lag]
+        shifted.append(layer)
+    if not shifted:
+        return np.zeros(deviation.shape)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        offset = np.nanmedian(np.stack(shifted), axis=0)
+    return np.nan_to_num(offset, nan=0.0)
+
+
+def classify_z(z: np.ndarray) -> np.ndarray:
+    """Niveau (index dans NIVEAUX) correspondant à un score z (hausses uniquement)"""
+    return np.select(
+        [z >= settings.anomaly_z_urgence, z >= settings.anomaly_z_alerte, z >= settings.anomaly_z_surveillance],
+        [3, 2, 1],
+        default=0
+    )
+
+
+def score_history(history: PriceHistory, mode: str, window: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Évaluer chaque jour de chaque série selon le mode de détection.
+
+    Args:
+        history: Historique des prix
+        mode: "seuils", "robuste" ou "saisonnier"
+        window: Fenêtre glissante (jours), ANOMALY_WINDOW_DAYS par défaut
+
+    Returns:
+        dict de matrices (séries, jours):
+        - expected: prix attendu
+        - ecart: écart au prix attendu (%)
+        - score: score z robuste (NaN en mode seuils)
+        - niveau: index dans NIVEAUX
+        - confiance: confiance dans le niveau (0-1)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode de détection inconnu: {mode}")
+
+    window = window or settings.anomaly_window_days
+    values = history.values
+    observed = ~np.isnan(values)
+
+    if mode == "seuils":
+        # Moyenne glissante des `window` jours précédents (comportement historique)
+        sums = np.nancumsum(values, axis=1)
+        counts = np.cumsum(observed, axis=1)
+        sums = np.pad(sums, ((0, 0), (1, 0)))
+        counts = np.pad(counts, ((0, 0), (1, 0)))
+        window_sums = sums[:, :-1] - np.pad(sums, ((0, 0), (window, 0)))[:, :values.shape[1]]
+        count = counts[:, :-1] - np.pad(counts, ((0, 0), (window, 0)))[:, :values.shape[1]]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            expected = np.where(count >= 3, window_sums / count, np.nan)
+            ecart = (values / expected - 1) * 100
+
+        table = get_threshold_table()
+        niveau = np.zeros(values.shape, dtype=np.int64)
+        for i, (produit_id, _) in enumerate(history.keys):
+            surveillance, alerte, urgence = table.for_produit(produit_id)
+            row = ecart[i]
+            niveau[i] = np.select([row >= urgence, row >= alerte, row >= surveillance], [3, 2, 1], default=0)
+        confiance = np.clip(count / window, 0, 1) * (niveau > 0)
+        return {
+            "expected": expected, "ecart": ecart, "score": np.full(values.shape, np.nan),
+            "niveau": niveau, "confiance": confiance
+        }
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_values = np.log(values)
+    level, mad, count = rolling_median_mad(log_values, window)
+
+    if mode == "saisonnier":
+        offset = seasonal_offset(log_values - level)
+        residual = log_values - level - offset
+        # Dispersion des résidus désaisonnalisés des jours précédents
+        _, mad, _ = rolling_median_mad(residual, window)
+        expected_log = level + offset
+    else:
+        residual = log_values - level
+        expected_log = level
+
+    with np.errstate(invalid="ignore"):
+        score = MAD_SCALE * residual / np.maximum(mad, MAD_FLOOR)
+    enough = count >= settings.anomaly_min_observations
+    score = np.where(enough & observed, score, np.nan)
+
+    niveau = classify_z(np.nan_to_num(score, nan=-np.inf))
+    expected = np.exp(expected_log)
+    with np.errstate(invalid="ignore"):
+        ecart = (values / expected - 1) * 100
+
+    # Confiance : couverture de la fenêtre × probabilité bilatérale du score
+    confiance = np.zeros(values.shape)
+    flagged = niveau > 0
+    if flagged.any():
+        erf = np.frompyfunc(math.erf, 1, 1)
+        confiance[flagged] = (
+            np.clip(count[flagged] / window, 0, 1)
+            * erf(np.abs(score[flagged]) / math.sqrt(2)).astype(float)
+        )
+    return {"expected": expected, "ecart": ecart, "score": score, "niveau": niveau, "confiance": confiance}
+
+
+# ============================================================================
+# Détection
+# ============================================================================
+
+def latest_anomalies(history: PriceHistory, scores: Dict[str, np.ndarray],
+                     jours_recents: int = 7) -> Dict[Tuple[str, str], dict]:
+    """
+    Évaluation du dernier jour collecté (dans les `jours_recents` derniers
+    jours) de chaque série.
+
+    Returns:
+        dict {(produit_id, departement_id): évaluation}
+    """
+    values = history.values
+    observed = ~np.isnan(values)
+    # Index du dernier jour observé par série (-1 si aucun)
+    last = np.where(observed.any(axis=1), values.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1), -1)
+
+    result = {}
+    for i in np.nonzero(last >= values.shape[1] - jours_recents)[0]:
+        d = last[i]
+        score = scores["score"][i, d]
+        result[history.keys[i]] = {
+            "date": history.date(d),
+            "prix": float(values[i, d]),
+            "prix_attendu": None if np.isnan(scores["expected"][i, d]) else float(scores["expected"][i, d]),
+            "ecart_pourcentage": None if np.isnan(scores["ecart"][i, d]) else float(scores["ecart"][i, d]),
+            "score": None if np.isnan(score) else round(float(score), 3),
+            "niveau": NIVEAUX[scores["niveau"][i, d]],
+            "confiance": round(float(scores["confiance"][i, d]), 3)
+        }
+    return result
+
+
+async def detect_anomalies(mode: str, jours_recents: int = 7) -> Dict[Tuple[str, str], dict]:
+    """
+    Charger l'historique et évaluer le dernier jour de chaque série
+    (produit, département) avec le mode de détection donné.
+    """
+    history = await load_price_history(
+        settings.anomaly_window_days * 2 if mode != "saisonnier" else None
+    )
+    # Calcul NumPy hors de la boucle asyncio (plusieurs secondes en mode saisonnier)
+    scores = await asyncio.to_thread(score_history, history, mode)
+    return latest_anomalies(history, scores, jours_recents)
+
+
+def detection_mode(type_alerte: str) -> str:
+    """Mode de détection configuré pour un type d'alerte (ALERT_DETECTION_MODES)"""
+    mode = settings.alert_detection_modes_map.get(type_alerte, "seuils")
+    return mode if mode in MODES else "seuils"
@@ -0,0 +1,344 @@
+"""
+Rétention et archivage des logs d'audit pour SAP.
+
+Chaque nuit, les mois terminés non encore archivés sont exportés (un
+fichier par mois, NDJSON gzip ou Parquet) et inscrits dans audit_archives
+(nombre de logs, taille, empreinte SHA-256). Les fichiers sont stockés
+selon AUDIT_ARCHIVE_STORAGE :
+- gridfs: dans MongoDB (bucket audit_archives_fichiers), durable même sur
+  un hébergement à disque éphémère (Render) ;
+- local: dans AUDIT_ARCHIVE_DIR (disque persistant requis).
+
+La purge de audit_logs n'est pas confiée à un index TTL : seuls les mois
+entièrement plus anciens que AUDIT_RETENTION_DAYS jours ET inscrits dans
+audit_archives sont supprimés, par la même tâche, après l'archivage. Un
+mois qui a reçu des logs depuis son archivage est réarchivé avant purge.
+"""
+
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+from pymongo import IndexModel
+
+from backend.config import settings
+from backend.database import db, get_database
+
+logger = logging.getLogger(__name__)
+
+
+# Logs lus et écrits par lot lors de l'export
+TAILLE_LOT = 5000
+
+# Dates en ISO 8601, ObjectId en {"$oid": ...} : relisible par json_util
+_JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=False)
+
+
+# ============================================================================
+# Index
+# ============================================================================
+
+# Bucket GridFS des fichiers d'archive
+BUCKET_ARCHIVES = "audit_archives_fichiers"
+
+
+def audit_indexes() -> List[IndexModel]:
+    """
+    Index de audit_logs : timestamp (purge des mois archivés) et index
+    composés pour les recherches par période, seule ou par utilisateur,
+    action ou email (remplacent les index simples user_id et action).
+    """
+    return [
+        IndexModel("timestamp"),
+        # _id départage les logs de même timestamp (pagination par curseur
+        # sans tri en mémoire)
+        IndexModel([("timestamp", -1), ("_id", -1)]),
+        IndexModel([("user_id", 1), ("timestamp", -1), ("_id", -1)]),
+        IndexModel([("action", 1), ("timestamp", -1), ("_id", -1)]),
+        IndexModel([("email", 1), ("timestamp", -1), ("_id", -1)], sparse=True),
+    ]
+
+
+async def create_audit_indexes(modeles: List[IndexModel]) -> None:
+    """
+    Créer les index de audit_logs en un lot. Un ancien index TTL sur
+    timestamp est d'abord supprimé : il purgerait des mois non archivés
+    (la purge est faite par purger_audit_logs) ; les index simples
+    remplacés sont supprimés ensuite.
+    """
+    collection = db.audit_logs
+    existants = await collection.index_information()
+    actuel = existants.get("timestamp_1")
+    if actuel is not None and "expireAfterSeconds" in actuel:
+        await collection.drop_index("timestamp_1")
+
+    await collection.create_indexes(modeles)
+
+    for obsolete in ("user_id_1", "action_1"):
+        if obsolete in existants:
+            await collection.drop_index(obsolete)
+
+
+# ============================================================================
+# Archivage mensuel
+# ============================================================================
+
+def debut_mois(date: datetime) -> datetime:
+    """Premier instant du mois de `date`"""
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def mois_suivant(date: datetime) -> datetime:
+    """Premier instant du mois suivant"""
+    return debut_mois(debut_mois(date) + timedelta(days=32))
+
+
+def _format_archive() -> str:
+    """Format configuré ; Parquet nécessite pandas et pyarrow"""
+    if settings.audit_archive_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+            return "parquet"
+        except ImportError:
+            logger.warning("⚠️  Archivage Parquet indisponible (pyarrow non installé), export NDJSON")
+    return "ndjson"
+
+
+def _ecrire_ndjson(fichier, logs: List[dict]) -> None:
+    fichier.write("".join(json_util.dumps(log, json_options=_JSON_OPTIONS) + "\n" for log in logs).encode())
+
+
+def _ecrire_parquet(chemin: str, logs: List[dict]) -> None:
+    import pandas as pd
+
+    lignes = [
+        {**log, "_id": str(log["_id"]), "details": json_util.dumps(log.get("details") or {})}
+        for log in logs
+    ]
+    pd.DataFrame(lignes).to_parquet(chemin, compression="zstd", index=False)
+
+
+def _empreinte(chemin: str) -> str:
+    sha = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+def _bucket():
+    from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+    return AsyncIOMotorGridFSBucket(get_database(), bucket_name=BUCKET_ARCHIVES)
+
+
+async def _stocker(temporaire: str, nom: str, precedente: Optional[dict]) -> dict:
+    """
+    Stocker un fichier d'archive écrit sous `temporaire` (voir
+    AUDIT_ARCHIVE_STORAGE) et remplacer la version précédente du mois.
+
+    Returns:
+        dict: Champs de stockage de l'entrée du manifeste
+    """
+    if settings.audit_archive_storage == "local":
+        chemin = os.path.join(settings.audit_archive_dir, nom)
+        os.replace(temporaire, chemin)
+        return {"stockage": "local", "fichier": chemin}
+
+    bucket = _bucket()
+    try:
+        with open(temporaire, "rb") as f:
+            gridfs_id = await bucket.upload_from_stream(nom, f)
+    finally:
+        os.remove(temporaire)
+    if precedente and precedente.get("gridfs_id"):
+        try:
+            await bucket.delete(precedente["gridfs_id"])
+        except Exception as e:
+            logger.warning(f"⚠️  Ancienne archive {nom} non supprimée de GridFS: {e}")
+    return {"stockage": "gridfs", "fichier": nom, "gridfs_id": gridfs_id}
+
+
+async def archiver_mois(debut: datetime) -> Optional[dict]:
+    """
+    Exporter les logs d'un mois dans un fichier d'archive.
+
+    Le fichier est écrit sous un nom temporaire puis stocké (GridFS ou
+    AUDIT_ARCHIVE_DIR) ; l'écriture (compression) s'exécute hors de la
+    boucle d'événements. Une archive existante du mois est remplacée.
+
+    Args:
+        debut: Premier instant du mois
+
+    Returns:
+        Entrée du manifeste audit_archives, ou None si le mois est vide
+    """
+    fin = mois_suivant(debut)
+    periode = debut.strftime("%Y-%m")
+    query = {"timestamp": {"$gte": debut, "$lt": fin}}
+    format_archive = _format_archive()
+
+    repertoire = settings.audit_archive_dir if settings.audit_archive_storage == "local" else tempfile.gettempdir()
+    os.makedirs(repertoire, exist_ok=True)
+    extension = "parquet" if format_archive == "parquet" else "ndjson.gz"
+    nom = f"audit_logs-{periode}.{extension}"
+    temporaire = os.path.join(repertoire, f"{nom}.{os.getpid()}.tmp")
+
+    nombre = 0
+    curseur = db.audit_logs.find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(TAILLE_LOT)
+    if format_archive == "parquet":
+        # Parquet s'écrit en une fois : mois entier en mémoire
+        logs = await curseur.to_list(None)
+        nombre = len(logs)
+        if nombre:
+            await asyncio.to_thread(_ecrire_parquet, temporaire, logs)
+    else:
+        fichier = await asyncio.to_thread(gzip.open, temporaire, "wb")
+        try:
+            lot = []
+            async for log in curseur:
+                lot.append(log)
+                if len(lot) >= TAILLE_LOT:
+                    await asyncio.to_thread(_ecrire_ndjson, fichier, lot)
+                    nombre += len(lot)
+                    lot = []
+            if lot:
+                await asyncio.to_thread(_ecrire_ndjson, fichier, lot)
+                nombre += len(lot)
+        finally:
+            await asyncio.to_thread(fichier.close)
+
+    if not nombre:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        return None
+
+    taille = os.path.getsize(temporaire)
+    sha256 = await asyncio.to_thread(_empreinte, temporaire)
+    precedente = await db.audit_archives.find_one({"_id": periode})
+    entree = {
+        "_id": periode,
+        "debut": debut,
+        "fin": fin,
+        **await _stocker(temporaire, nom, precedente),
+        "format": format_archive,
+        "nombre": nombre,
+        "taille_octets": taille,
+        "sha256": sha256,
+        "created_at": datetime.utcnow()
+    }
+    await db.audit_archives.replace_one({"_id": periode}, entree, upsert=True)
+    logger.info(f"🗄️  Audit {periode}: {nombre} logs archivés ({entree['stockage']}: {entree['fichier']})")
+    return entree
+
+
+async def purger_audit_logs() -> dict:
+    """
+    Supprimer de audit_logs les mois archivés entièrement plus anciens que
+    AUDIT_RETENTION_DAYS jours. Un mois dont le nombre de logs ne
+    correspond plus à l'archive (logs arrivés après l'archivage, ex:
+    rejeu de débordements) est réarchivé avant d'être supprimé.
+
+    Returns:
+        dict: Mois purgés et nombre de logs supprimés
+    """
+    if settings.audit_retention_days <= 0:
+        return {"mois": [], "logs": 0}
+
+    limite = datetime.utcnow() - timedelta(days=settings.audit_retention_days)
+    archives = await db.audit_archives.find(
+        {"fin": {"$lte": limite}, "purge_at": None}
+    ).sort("debut", 1).to_list(None)
+
+    purges, supprimes = [], 0
+    for archive in archives:
+        query = {"timestamp": {"$gte": archive["debut"], "$lt": archive["fin"]}}
+        nombre = await db.audit_logs.count_documents(query)
+        if nombre != archive["nombre"]:
+            archive = await archiver_mois(archive["debut"])
+            if archive is None:
+                continue
+        resultat = await db.audit_logs.delete_many(query)
+        await db.audit_archives.update_one(
+            {"_id": archive["_id"]},
+            {"$set": {"purge_at": datetime.utcnow(), "supprimes": resultat.deleted_count}}
+        )
+        purges.append(archive["_id"])
+        supprimes += resultat.deleted_count
+        logger.info(f"🗄️  Audit {archive['_id']}: {resultat.deleted_count} logs purgés (archivés)")
+    return {"mois": purges, "logs": supprimes}
+
+
+async def ouvrir_archive(periode: str) -> Optional[Tuple[dict, AsyncIterator[bytes]]]:
+    """
+    Ouvrir le fichier d'archive d'un mois pour téléchargement.
+
+    Returns:
+        (entrée du manifeste, flux d'octets), ou None si le mois n'est pas archivé
+    """
+    archive = await db.audit_archives.find_one({"_id": periode})
+    if archive is None:
+        return None
+
+    async def lire() -> AsyncIterator[bytes]:
+        if archive.get("stockage") == "gridfs":
+            flux = await _bucket().open_download_stream(archive["gridfs_id"])
+            while True:
+                bloc = await flux.readchunk()
+                if not bloc:
+                    break
+                yield bloc
+        else:
+            with open(archive["fichier"], "rb") as f:
+                for bloc in iter(lambda: f.read(1 << 20), b""):
+                    yield bloc
+
+    return archive, lire()
+
+
+async def archiver_audit_logs() -> dict:
+    """
+    Archiver les mois terminés qui ne le sont pas encore, puis purger les
+    mois archivés hors rétention (tâche nocturne).
+
+    Returns:
+        dict: Mois archivés, nombre de logs et résultat de la purge
+    """
+    plus_ancien = await db.audit_logs.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+    if not plus_ancien:
+        return {"mois": [], "logs": 0}
+
+    archives = {a["_id"] for a in await db.audit_archives.find({}, {"_id": 1}).to_list(None)}
+    mois_courant = debut_mois(datetime.utcnow())
+    archives_creees = []
+    debut = debut_mois(plus_ancien["timestamp"])
+    while debut < mois_courant:
+        if debut.strftime("%Y-%m") not in archives:
+            entree = await archiver_mois(debut)
+            if entree:
+                archives_creees.append(entree)
+        debut = mois_suivant(debut)
+
+    return {
+        "mois": [a["_id"] for a in archives_creees],
+        "logs": sum(a["nombre"] for a in archives_creees),
+        # Purge après l'archivage : seuls les mois archivés sont supprimés
+        "purge": await purger_audit_logs()
+    }
+
+
+async def lister_archives() -> List[dict]:
+    """Manifeste des archives, du mois le plus récent au plus ancien"""
+    archives = await db.audit_archives.find({}).sort("debut", -1).to_list(None)
+    for archive in archives:
+        archive["periode"] = archive.pop("_id")
+        if archive.get("gridfs_id") is not None:
+            archive["gridfs_id"] = str(archive["gridfs_id"])
+    return archives
@@ -0,0 +1,276 @@
+"""
+Écriture différée des logs d'audit pour SAP.
+
+Les enregistrements d'audit sont déposés dans une file mémoire bornée ; une
+tâche de fond les écrit par lots (insert_many) toutes les AUDIT_BATCH_SIZE
+entrées ou AUDIT_FLUSH_MS millisecondes, avec w=1 sans attente du journal.
+La latence des requêtes ne dépend donc plus du volume d'audit.
+
+Si MongoDB est injoignable (ou si la file est pleine), les lots sont écrits
+dans un fichier JSON Lines par processus (AUDIT_SPILL_DIR), rejoué dans
+audit_logs par ce processus dès que MongoDB répond de nouveau ; les fichiers
+des processus arrêtés sont repris au démarrage suivant.
+"""
+
+from typing import List, Optional
+import asyncio
+import glob
+import logging
+import os
+import time
+
+from bson import json_util
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from backend.config import settings
+from backend.database import get_collection
+
+logger = logging.getLogger(__name__)
+
+
+# Pause avant une nouvelle tentative après un échec d'écriture
+PAUSE_APRES_ECHEC = 5.0
+
+_file: Optional[asyncio.Queue] = None
+_tache: Optional[asyncio.Task] = None
+_reliquat: List[dict] = []
+_fichiers_en_attente = False
+
+
+def _collection():
+    """Collection audit_logs avec w=1, sans attente du journal"""
+    return get_collection("audit_logs").with_options(write_concern=WriteConcern(w=1, j=False))
+
+
+def _fichier_debordement() -> str:
+    """Fichier de débordement propre à ce processus"""
+    return os.path.join(settings.audit_spill_dir, f"audit-{os.getpid()}.jsonl")
+
+
+def deborder(enregistrements: List[dict]) -> None:
+    """
+    Écrire des enregistrements dans le fichier de débordement (un seul
+    write en ajout, pour ne jamais laisser de ligne partielle).
+    """
+    global _fichiers_en_attente
+    try:
+        os.makedirs(settings.audit_spill_dir, exist_ok=True)
+        lignes = "".join(json_util.dumps(e) + "\n" for e in enregistrements)
+        with open(_fichier_debordement(), "a", encoding="utf-8") as f:
+            f.write(lignes)
+        _fichiers_en_attente = True
+    except OSError as e:
+        logger.error(f"❌ Audit: {len(enregistrements)} enregistrements perdus ({e})")
+
+
+async def _inserer(enregistrements: List[dict]) -> None:
+    """insert_many non ordonné ; les doublons (lot rejoué) sont ignorés"""
+    try:
+        await _collection().insert_many(enregistrements, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+def _processus_actif(pid: int) -> bool:
+    """Le processus `pid` existe-t-il encore (signal 0, sans effet) ?"""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Existe mais appartient à un autre utilisateur
+    return True
+
+
+def _pid_proprietaire(chemin: str) -> Optional[int]:
+    """
+    PID propriétaire d'un fichier de débordement : l'auteur pour
+    audit-<pid>.jsonl, le processus qui le rejoue pour
+    <...>.<pid>-<n>.replay.
+    """
+    nom = os.path.basename(chemin)
+    try:
+        if nom.endswith(".replay"):
+            return int(nom[:-len(".replay")].rsplit(".", 1)[1].split("-")[0])
+        return int(nom[len("audit-"):-len(".jsonl")])
+    except (IndexError, ValueError):
+        return None
+
+
+def _reprendre(chemin: str) -> Optional[str]:
+    """
+    Prendre un fichier de débordement pour le rejouer : renommage atomique
+    en <fichier>.<pid>-<n>.replay, nom unique qui n'écrase pas un rejeu
+    interrompu (un seul processus réussit le renommage).
+
+    Seuls les fichiers de ce processus et ceux de processus arrêtés sont
+    repris ; ceux des autres workers vivants sont laissés à leur propriétaire.
+
+    Returns:
+        Chemin du fichier à rejouer, ou None
+    """
+    pid = _pid_proprietaire(chemin)
+    if pid is None:
+        return None
+    if pid == os.getpid() and chemin.endswith(".replay"):
+        return chemin  # Rejeu interrompu de ce processus
+    if pid != os.getpid() and _processus_actif(pid):
+        return None
+    en_cours = f"{chemin}.{os.getpid()}-{time.time_ns()}.replay"
+    try:
+        os.rename(chemin, en_cours)
+    except OSError:
+        return None  # Pris par un autre processus
+    return en_cours
+
+
+async def rejouer_debordements() -> int:
+    """
+    Réinsérer les fichiers de débordement de ce processus et des processus
+    arrêtés (workers recyclés, démarrage précédent).
+
+    Chaque fichier est d'abord renommé (atomique) pour qu'un seul processus
+    le rejoue ; il n'est supprimé qu'après insertion complète. Un rejeu
+    interrompu est repris par le même processus, ou par un autre s'il s'est
+    arrêté.
+
+    Returns:
+        int: Nombre d'enregistrements réinsérés
+    """
+    global _fichiers_en_attente
+    total = 0
+    # Rejeux interrompus d'abord, puis nouveaux débordements
+    for motif in ("audit-*.replay", "audit-*.jsonl"):
+        for chemin in glob.glob(os.path.join(settings.audit_spill_dir, motif)):
+            en_cours = _reprendre(chemin)
+            if en_cours is not None:
+                total += await _rejouer_fichier(en_cours)
+    _fichiers_en_attente = False
+    if total:
+        logger.info(f"📝 Audit: {total} enregistrements réinsérés depuis le débordement disque")
+    return total
+
+
+async def _rejouer_fichier(chemin: str) -> int:
+    """
+    Insérer un fichier de débordement par lots puis le supprimer. Les lignes
+    illisibles (ligne finale tronquée par un arrêt brutal) sont ignorées.
+    """
+    enregistrements, illisibles = [], 0
+    with open(chemin, encoding="utf-8", errors="replace") as f:
+        for ligne in f:
+            if not ligne.strip():
+                continue
+            try:
+                enregistrements.append(json_util.loads(ligne))
+            except ValueError:
+                illisibles += 1
+    if illisibles:
+        logger.warning(f"⚠️  Audit: {illisibles} ligne(s) illisible(s) ignorée(s) dans {chemin}")
+    for debut in range(0, len(enregistrements), settings.audit_batch_size):
+        await _inserer(enregistrements[debut:debut + settings.audit_batch_size])
+    os.remove(chemin)
+    return len(enregistrements)
+
+
+def enregistrer(enregistrement: dict) -> bool:
+    """
+    Déposer un enregistrement d'audit dans la file (sans attente).
+
+    Returns:
+        bool: False si l'écriture différée n'est pas démarrée (scripts) ;
+        l'appelant écrit alors directement
+    """
+    if _file is None:
+        return False
+    try:
+        _file.put_nowait(enregistrement)
+    except asyncio.QueueFull:
+        deborder([enregistrement])
+    return True
+
+
+async def _vider(lot: List[dict]) -> bool:
+    """Écrire un lot ; le déborder sur disque si MongoDB ne répond pas"""
+    try:
+        await _inserer(lot)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️  Audit: écriture de {len(lot)} enregistrements impossible ({e}), débordement disque")
+        deborder(lot)
+        return False
+
+
+async def _boucle() -> None:
+    """Tâche de fond : lots de AUDIT_BATCH_SIZE ou toutes les AUDIT_FLUSH_MS ms"""
+    delai = settings.audit_flush_ms / 1000
+    while True:
+        lot = [await _file.get()]
+        try:
+            echeance = time.monotonic() + delai
+            while len(lot) < settings.audit_batch_size:
+                restant = echeance - time.monotonic()
+                if restant <= 0:
+                    break
+                try:
+                    lot.append(await asyncio.wait_for(_file.get(), restant))
+                except asyncio.TimeoutError:
+                    break
+            ecrit = await _vider(lot)
+        except asyncio.CancelledError:
+            # Arrêt pendant la constitution ou l'écriture du lot : il sera
+            # réécrit par stop_audit_sink (les _id déjà insérés sont ignorés)
+            _reliquat.extend(lot)
+            raise
+        if not ecrit:
+            await asyncio.sleep(PAUSE_APRES_ECHEC)
+        elif _fichiers_en_attente:
+            try:
+                await rejouer_debordements()
+            except Exception as e:
+                logger.warning(f"⚠️  Audit: rejeu du débordement reporté ({e})")
+
+
+async def start_audit_sink() -> None:
+    """Démarrer l'écriture différée et rejouer les débordements (lifespan)"""
+    global _file, _tache
+    if not settings.audit_buffer_enabled or _tache is not None:
+        return
+    _file = asyncio.Queue(maxsize=settings.audit_queue_size)
+    _tache = asyncio.create_task(_boucle())
+    try:
+        await rejouer_debordements()
+    except Exception as e:
+        logger.warning(f"⚠️  Audit: rejeu du débordement reporté ({e})")
+
+
+async def stop_audit_sink() -> None:
+    """Arrêter la tâche de fond et écrire les enregistrements restants"""
+    global _file, _tache
+    if _tache is None:
+        return
+    _tache.cancel()
+    await asyncio.gather(_tache, return_exceptions=True)
+    restants = _reliquat[:]
+    _reliquat.clear()
+    while not _file.empty():
+        restants.append(_file.get_nowait())
+    _file = None
+    _tache = None
+    for debut in range(0, len(restants), settings.audit_batch_size):
+        await _vider(restants[debut:debut + settings.audit_batch_size])
+    if restants:
+        logger.info(f"📝 Audit: {len(restants)} enregistrements écrits à l'arrêt")
+
+
+def get_audit_sink_stats() -> dict:
+    """État de la file d'audit"""
+    return {
+        "actif": _tache is not None,
+        "en_file": _file.qsize() if _file is not None else 0,
+        "debordement_en_attente": _fichiers_en_attente
+    }
@@ -11,10 +11,9 @@ import base64
 import bcrypt
 from jose import JWTError, jwt
 import pyotp
-import qrcode
-from io import BytesIO
 
 from backend.config import settings
+from backend.services.token_revocation import est_revoque
 
 
 # ============================================================================
@@ -82,8 +81,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
-        "type": "access"
+        "jti": secrets.token_urlsafe(16)
     })
+    # Type fourni conservé (ex: "mfa_pending", refusé partout sauf /verify-mfa)
+    to_encode.setdefault("type", "access")
 
     encoded_jwt = jwt.encode(
         to_encode,
@@ -113,6 +114,7 @@ def create_refresh_token(data: dict) -> str:
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
+        "jti": secrets.token_urlsafe(16),
         "type": "refresh"
     })
 
@@ -127,13 +129,13 @@ def create_refresh_token(data: dict) -> str:
 
 def decode_token(token: str) -> Optional[dict]:
     """
-    Décoder et vérifier un token JWT.
+    Décoder et vérifier un token JWT (signature, expiration, révocation).
 
     Args:
         token: Token JWT à décoder
 
     Returns:
-        Payload du token si valide, None sinon
+        Payload du token si valide et non révoqué, None sinon
     """
     try:
         payload = jwt.decode(
@@ -141,9 +143,12 @@ def decode_token(token: str) -> Optional[dict]:
             settings.jwt_secret_key,
             algorithms=[settings.jwt_algorithm]
         )
-        return payload
     except JWTError:
         return None
+    # Liste de révocation en mémoire : aucune lecture MongoDB
+    if est_revoque(payload):
+        return None
+    return payload
 
 
 # ============================================================================
@@ -188,6 +193,10 @@ def generate_qr_code(totp_uri: str) -> str:
     Returns:
         QR code en base64 (image PNG)
     """
+    # Import différé : qrcode et Pillow ne servent qu'à l'activation MFA
+    import qrcode
+    from io import BytesIO
+
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(totp_uri)
     qr.make(fit=True)
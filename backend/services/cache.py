@@ -0,0 +1,211 @@
+"""
+Cache mémoire à durée de vie limitée (TTL) pour SAP.
+Utilisé pour les réponses agrégées coûteuses (tableau de bord) : un calcul
+par clé et par worker, les requêtes concurrentes sur une même clé
+attendant le calcul en cours plutôt que de le relancer.
+
+Avec plusieurs workers, chaque cache reste propre à son processus (aucune
+valeur partagée) ; les invalidations sont propagées par un compteur de
+génération dans config_versions, relu toutes les CACHE_SYNC_SECONDS secondes.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from pymongo import ReturnDocument
+
+from backend.config import settings
+from backend.database import db
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Cache clé → valeur avec expiration, propre à un worker.
+
+    Args:
+        ttl_seconds: Durée de validité d'une entrée (0 désactive le cache)
+        max_entries: Nombre maximal d'entrées (les plus anciennes sont évincées)
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        # Incrémentée à chaque invalidation : un calcul démarré avant
+        # l'invalidation n'est pas mis en cache
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Valeur en cache non expirée, ou None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Mettre une valeur en cache"""
+        if self.ttl_seconds <= 0:
+            return
+        if len(self._entries) >= self.max_entries and key not in self._entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Valeur en cache, ou calculée par `compute` (un seul calcul concurrent
+        par clé).
+
+        Args:
+            key: Clé de cache
+            compute: Coroutine de calcul de la valeur
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        generation = self._generation
+        try:
+            value = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+            # Exception déjà remontée à l'appelant : ne pas la signaler
+            # comme non récupérée si aucune autre requête n'attendait
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if generation == self._generation:
+                self.set(key, value)
+            return value
+        finally:
+            self._pending.pop(key, None)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """
+        Invalider les entrées (toutes, ou celles dont la clé vérifie
+        `predicate`).
+        """
+        self._generation += 1
+        if predicate is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if predicate(k)]:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ============================================================================
+# Caches partagés
+# ============================================================================
+
+# Widgets du tableau de bord (GET /api/dashboard), par rôle et périmètre
+dashboard_cache = TTLCache(settings.dashboard_cache_ttl_seconds)
+
+# Statistiques /statistiques/resume, par filtres normalisés
+statistiques_cache = TTLCache(settings.statistics_cache_ttl_seconds)
+
+
+# Document de config_versions portant la génération des caches agrégés
+VERSION_ID = "caches_agregats"
+
+_sync_task: Optional[asyncio.Task] = None
+_generation_vue: Optional[int] = None
+_a_publier = False
+
+
+def _invalider_local() -> None:
+    dashboard_cache.invalidate()
+    statistiques_cache.invalidate()
+
+
+def invalidate_aggregates() -> None:
+    """
+    Invalider le tableau de bord et les statistiques après une écriture sur
+    les collectes ou les alertes. L'invalidation est immédiate dans ce
+    worker ; les autres workers l'appliquent à la synchronisation suivante
+    (au plus un TTL de retard si CACHE_SYNC_SECONDS=0).
+    """
+    global _a_publier
+    _invalider_local()
+    _a_publier = True
+
+
+async def synchroniser_caches() -> bool:
+    """
+    Publier les invalidations de ce worker (une écriture par intervalle,
+    quel que soit leur nombre) et appliquer celles des autres workers.
+
+    Returns:
+        bool: True si une invalidation d'un autre worker a été appliquée
+    """
+    global _generation_vue, _a_publier
+    if _a_publier:
+        _a_publier = False
+        doc = await db.config_versions.find_one_and_update(
+            {"_id": VERSION_ID}, {"$inc": {"generation": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        # Génération attendue : la précédente vue + notre incrément
+        attendue = (_generation_vue or 0) + 1
+    else:
+        doc = await db.config_versions.find_one({"_id": VERSION_ID})
+        attendue = _generation_vue
+    generation = doc["generation"] if doc else 0
+    applique = _generation_vue is not None and generation != attendue
+    if applique:
+        _invalider_local()
+    _generation_vue = generation
+    return applique
+
+
+async def _sync_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.cache_sync_seconds)
+        try:
+            await synchroniser_caches()
+        except Exception as e:
+            logger.warning(f"⚠️  Synchronisation des caches impossible: {e}")
+
+
+async def start_cache_sync() -> None:
+    """Démarrer la propagation des invalidations (appelé dans le lifespan)"""
+    global _sync_task
+    if _sync_task is not None or settings.cache_sync_seconds <= 0:
+        return
+    try:
+        await synchroniser_caches()
+    except Exception as e:
+        logger.warning(f"⚠️  Génération des caches non lue: {e}")
+    _sync_task = asyncio.create_task(_sync_loop())
+
+
+async def stop_cache_sync() -> None:
+    """Arrêter la synchronisation en publiant une invalidation en attente"""
+    global _sync_task
+    if _sync_task is None:
+        return
+    _sync_task.cancel()
+    await asyncio.gather(_sync_task, return_exceptions=True)
+    _sync_task = None
+    if _a_publier:
+        try:
+            await synchroniser_caches()
+        except Exception as e:
+            logger.warning(f"⚠️  Invalidation des caches non publiée: {e}")
@@ -0,0 +1,302 @@
+"""
+Service de prévision des prix pour SAP (projections à 3 mois).
+
+Un modèle léger par série (produit, département) : lissage exponentiel de
+Holt à tendance amortie sur le log du prix hebdomadaire, après retrait
+d'une saisonnalité annuelle lorsque l'historique couvre deux ans.
+Les paramètres (alpha, beta, phi) sont choisis par recherche sur grille
+vectorisée en NumPy ; les séries sont ajustées en parallèle dans un pool de
+processus. Les modèles et prévisions sont mis en cache dans la collection
+previsions_prix, lue directement par GET /api/prix/previsions.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import multiprocessing
+import warnings
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from backend.config import settings
+from backend.database import db, max_time_ms
+from backend.services.anomalies import load_price_history
+
+logger = logging.getLogger(__name__)
+
+
+# Période saisonnière (semaines) et historique minimal pour l'estimer
+SAISON = 52
+SEMAINES_SAISON_MIN = 2 * SAISON
+# Quantile normal de l'intervalle de prévision à 90%
+Z_INTERVALLE = 1.645
+
+# Grille de recherche des paramètres du lissage
+_ALPHAS = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+_BETAS = np.array([0.01, 0.05, 0.1, 0.2, 0.3])
+_PHIS = np.array([0.8, 0.9, 0.95, 0.98])
+GRILLE = np.array(np.meshgrid(_ALPHAS, _BETAS, _PHIS, indexing="ij")).reshape(3, -1)
+
+# Document de config_versions mémorisant la dernière mise à jour
+META_ID = "previsions_prix"
+
+
+# ============================================================================
+# Modèle (fonctions pures, exécutées dans les processus du pool)
+# ============================================================================
+
+def to_weekly(values: np.ndarray) -> np.ndarray:
+    """
+    Convertir une matrice (séries, jours) en moyennes hebdomadaires.
+    Les semaines sont alignées sur le dernier jour ; les jours en trop au
+    début sont ignorés.
+    """
+    series, days = values.shape
+    weeks = days // 7
+    trimmed = values[:, days - weeks * 7:].reshape(series, weeks, 7)
+    observed = ~np.isnan(trimmed)
+    counts = observed.sum(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, np.nansum(trimmed, axis=2) / counts, np.nan)
+
+
+def seasonal_index(y: np.ndarray) -> np.ndarray:
+    """
+    Indice saisonnier (log) par semaine de l'année : médiane de l'écart à
+    la moyenne mobile centrée 2x52, centrée sur 0.
+    """
+    kernel = np.ones(SAISON + 1)
+    kernel[0] = kernel[-1] = 0.5
+    kernel /= SAISON
+    trend = np.convolve(y, kernel, mode="same")
+    half = SAISON // 2
+    deviation = y - trend
+    deviation[:half] = np.nan
+    deviation[-half:] = np.nan
+
+    # Une ligne par année (semaine de rang 0 en première colonne)
+    years = -(-len(y) // SAISON)
+    padded = np.full(years * SAISON, np.nan)
+    padded[:len(y)] = deviation
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        index = np.nan_to_num(np.nanmedian(padded.reshape(years, SAISON), axis=0), nan=0.0)
+    return index - index.mean()
+
+
+def holt_filter(z: np.ndarray, alpha, beta, phi):
+    """
+    Lissage de Holt à tendance amortie (forme de correction d'erreur),
+    vectorisé sur des paramètres de même forme.
+
+    Returns:
+        (sse, niveau final, tendance final)
+    """
+    level = np.full(np.shape(alpha), z[0])
+    trend = np.full(np.shape(alpha), z[1] - z[0])
+    sse = np.zeros(np.shape(alpha))
+    for value in z[1:]:
+        prediction = level + phi * trend
+        error = value - prediction
+        sse += error * error
+        level = prediction + alpha * error
+        trend = phi * trend + alpha * beta * error
+    return sse, level, trend
+
+
+def fit_series(weekly: np.ndarray, horizon: int, params: Optional[Tuple[float, float, float]] = None) -> Optional[dict]:
+    """
+    Ajuster (ou, si `params` est fourni, seulement filtrer) le modèle d'une
+    série hebdomadaire et prévoir `horizon` semaines.
+
+    Args:
+        weekly: Prix moyens hebdomadaires (NaN si aucune collecte)
+        horizon: Nombre de semaines à prévoir
+        params: (alpha, beta, phi) d'un ajustement précédent
+
+    Returns:
+        Modèle et prévisions, ou None si l'historique est insuffisant
+    """
+    observed = ~np.isnan(weekly)
+    if observed.sum() < settings.forecast_min_weeks:
+        return None
+
+    # Série contiguë : des premières aux dernières semaines observées,
+    # semaines manquantes interpolées en log
+    first, last = np.argmax(observed), len(weekly) - 1 - np.argmax(observed[::-1])
+    indices = np.arange(first, last + 1)
+    y = np.interp(indices, np.nonzero(observed)[0], np.log(weekly[observed]))
+
+    seasonal = seasonal_index(y) if len(y) >= SEMAINES_SAISON_MIN else None
+    positions = np.arange(len(y) + horizon) % SAISON
+    z = y - seasonal[positions[:len(y)]] if seasonal is not None else y
+
+    if params is None:
+        sse, _, _ = holt_filter(z, *GRILLE)
+        params = tuple(float(p) for p in GRILLE[:, int(np.argmin(sse))])
+    alpha, beta, phi = params
+    sse, level, trend = holt_filter(z, alpha, beta, phi)
+    sigma = float(np.sqrt(sse / max(1, len(z) - 1)))
+
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(phi ** steps)
+    forecast_log = level + damped * trend
+    if seasonal is not None:
+        forecast_log = forecast_log + seasonal[positions[len(y):]]
+    spread = Z_INTERVALLE * sigma * np.sqrt(steps)
+
+    return {
+        "params": {"alpha": alpha, "beta": beta, "phi": phi},
+        "saisonnier": seasonal is not None,
+        "sigma": sigma,
+        "semaines_observees": int(observed.sum()),
+        # Décalage de la dernière semaine modélisée par rapport à la fin
+        "decalage_derniere_semaine": int(len(weekly) - 1 - last),
+        "prevision": np.exp(forecast_log).round(2).tolist(),
+        "bas": np.exp(forecast_log - spread).round(2).tolist(),
+        "haut": np.exp(forecast_log + spread).round(2).tolist()
+    }
+
+
+def fit_batch(batch: List[tuple], horizon: int) -> List[tuple]:
+    """Ajuster un lot de séries [(clé, semaines, params)] (exécuté dans le pool)"""
+    return [(key, fit_series(weekly, horizon, params)) for key, weekly, params in batch]
+
+
+# ============================================================================
+# Mise à jour du cache
+# ============================================================================
+
+async def changed_produits(since: datetime) -> List[str]:
+    """
+    Produits ayant reçu des collectes (nouvelles, modifiées ou validées)
+    depuis `since`. Chaque branche du $or suit son index (created_at,
+    updated_at) ; les validations et rejets renseignent updated_at, ou
+    created_at quand la collecte est validée à la saisie.
+    """
+    return await db.collectes_prix.distinct("produit_id", {
+        "$or": [
+            {"created_at": {"$gt": since}},
+            {"updated_at": {"$gt": since}}
+        ]
+    })
+
+
+async def update_forecasts(full: bool = False) -> dict:
+    """
+    Mettre à jour les prévisions en cache.
+
+    Mise à jour incrémentale : seules les séries des produits ayant reçu des
+    collectes depuis la dernière exécution sont recalculées. Leurs paramètres
+    en cache sont réutilisés (simple filtrage, peu coûteux) tant qu'ils ont
+    moins de FORECAST_REFIT_DAYS jours ; sinon la recherche sur grille est
+    relancée.
+
+    Args:
+        full: Recalculer toutes les séries et réajuster tous les paramètres
+
+    Returns:
+        dict: Nombre de séries ajustées, filtrées et ignorées
+    """
+    started_at = datetime.utcnow()
+    meta = await db.config_versions.find_one({"_id": META_ID})
+
+    produit_ids = None
+    if not full and meta and meta.get("last_run"):
+        produit_ids = await changed_produits(meta["last_run"])
+        if not produit_ids:
+            return {"ajustees": 0, "filtrees": 0, "ignorees": 0}
+
+    history = await load_price_history(settings.forecast_history_days, produit_ids=produit_ids)
+    weekly = to_weekly(history.values)
+    horizon = settings.forecast_horizon_weeks
+
+    cache = {}
+    if not full and history.keys:
+        cached = await db.previsions_prix.find(
+            {"produit_id": {"$in": list({k[0] for k in history.keys})}},
+            {"params": 1, "params_at": 1}
+        ).to_list(None)
+        cache = {c["_id"]: c for c in cached}
+
+    refit_limit = started_at - timedelta(days=settings.forecast_refit_days)
+    taches = []
+    for i, (produit_id, departement_id) in enumerate(history.keys):
+        cle = f"{produit_id}:{departement_id}"
+        cached = cache.get(cle)
+        params = None
+        if cached and cached.get("params") and cached.get("params_at", started_at) > refit_limit:
+            params = (cached["params"]["alpha"], cached["params"]["beta"], cached["params"]["phi"])
+        taches.append(((cle, cached.get("params_at") if params else None), weekly[i], params))
+
+    # Ajustement parallèle par lots (le coût IPC reste faible devant le calcul)
+    batch_size = max(1, len(taches) // (settings.forecast_workers * 4) or 1)
+    batches = [taches[i:i + batch_size] for i in range(0, len(taches), batch_size)]
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(
+        max_workers=settings.forecast_workers,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, fit_batch, batch, horizon) for batch in batches
+        ])
+
+    derniere_semaine = history.date(history.days - 1) - timedelta(days=6)
+    operations = []
+    resultat = {"ajustees": 0, "filtrees": 0, "ignorees": 0}
+    for (cle, params_at), modele in (item for batch in results for item in batch):
+        if modele is None:
+            resultat["ignorees"] += 1
+            continue
+        resultat["filtrees" if params_at else "ajustees"] += 1
+
+        produit_id, departement_id = cle.split(":", 1)
+        fin_serie = derniere_semaine - timedelta(weeks=modele.pop("decalage_derniere_semaine"))
+        points = [
+            {
+                "semaine": fin_serie + timedelta(weeks=h),
+                "prix": modele["prevision"][h - 1],
+                "bas": modele["bas"][h - 1],
+                "haut": modele["haut"][h - 1]
+            }
+            for h in range(1, horizon + 1)
+        ]
+        operations.append(ReplaceOne({"_id": cle}, {
+            "produit_id": produit_id,
+            "departement_id": departement_id,
+            "params": modele["params"],
+            "params_at": params_at or started_at,
+            "saisonnier": modele["saisonnier"],
+            "sigma": modele["sigma"],
+            "semaines_observees": modele["semaines_observees"],
+            "derniere_semaine": fin_serie,
+            "points": points,
+            "updated_at": started_at
+        }, upsert=True))
+
+    if operations:
+        await db.previsions_prix.bulk_write(operations, ordered=False)
+    await db.config_versions.update_one(
+        {"_id": META_ID}, {"$set": {"last_run": started_at}}, upsert=True
+    )
+    logger.info(f"📈 Prévisions mises à jour: {resultat}")
+    return resultat
+
+
+async def get_forecasts(produit_id: Optional[str] = None, departement_id: Optional[str] = None,
+                        limit: int = 100) -> List[dict]:
+    """Lire les prévisions en cache"""
+    query = {}
+    if produit_id:
+        query["produit_id"] = produit_id
+    if departement_id:
+        query["departement_id"] = departement_id
+    return await (
+        db.previsions_prix.find(query, {"params_at": 0})
+        .limit(limit)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
@@ -0,0 +1,205 @@
+"""
+Surveillance de santé de l'API SAP.
+
+Une tâche de fond pingue MongoDB toutes les HEALTH_CHECK_INTERVAL_SECONDS
+secondes et garde le résultat en cache : les sondes /health et
+/health/ready ne font aucun aller-retour vers la base, quelle que soit leur
+fréquence (HEALTH_CHECK_INTERVAL_SECONDS=0 : ping à chaque sonde). Les
+sondes publiques ne renvoient que des booléens ; le détail (adresses et
+pool MongoDB, files) est réservé à /internal/health. La disponibilité
+(readiness) combine cet état avec la saturation du pool de connexions, le
+planificateur et l'arriéré des files.
+
+Seuls les critères propres au worker (base injoignable depuis ce worker,
+pool saturé, planificateur arrêté, file d'audit pleine) le rendent non
+disponible ; l'arriéré global des notifications est rapporté sans retirer
+le worker du load balancer.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from backend.config import settings
+from backend.database import db, get_pool_stats, index_status, ping_database
+
+logger = logging.getLogger(__name__)
+
+
+# Au-delà de ce nombre d'intervalles sans vérification, l'état est périmé
+INTERVALLES_AVANT_PEREMPTION = 3
+
+_tache: Optional[asyncio.Task] = None
+_etat = {
+    "database": "unknown",
+    "latence_ms": None,
+    "verifie_at": None,
+    "echecs_consecutifs": 0,
+    "notifications_en_attente": None,
+}
+
+
+async def verifier() -> dict:
+    """
+    Pinguer MongoDB (borné par HEALTH_CHECK_TIMEOUT_MS) et compter les
+    notifications en attente ; met à jour l'état en cache.
+
+    Returns:
+        dict: État en cache
+    """
+    debut = time.perf_counter()
+    try:
+        connecte = await asyncio.wait_for(ping_database(), settings.health_check_timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        connecte = False
+    _etat["latence_ms"] = round((time.perf_counter() - debut) * 1000, 1)
+    _etat["database"] = "connected" if connecte else "disconnected"
+    _etat["echecs_consecutifs"] = 0 if connecte else _etat["echecs_consecutifs"] + 1
+    _etat["verifie_at"] = datetime.utcnow()
+
+    if connecte:
+        try:
+            from backend.services.notifications import EN_ATTENTE, A_REESSAYER
+            _etat["notifications_en_attente"] = await db.notifications_outbox.count_documents(
+                {"statut": {"$in": [EN_ATTENTE, A_REESSAYER]}},
+                maxTimeMS=settings.health_check_timeout_ms
+            )
+        except Exception as e:
+            logger.debug(f"Arriéré des notifications non lu: {e}")
+    return _etat
+
+
+def _est_perime() -> bool:
+    verifie_at = _etat["verifie_at"]
+    if verifie_at is None:
+        return True
+    age_max = timedelta(seconds=INTERVALLES_AVANT_PEREMPTION * max(1, settings.health_check_interval_seconds))
+    return datetime.utcnow() - verifie_at > age_max
+
+
+async def etat_base() -> str:
+    """
+    Statut MongoDB pour /health : en cache si la surveillance tourne, sinon
+    ping direct (HEALTH_CHECK_INTERVAL_SECONDS=0, scripts).
+    """
+    if _tache is None:
+        await verifier()
+    elif _est_perime():
+        return "unknown"
+    return _etat["database"]
+
+
+# ============================================================================
+# Disponibilité
+# ============================================================================
+
+def _verifier_base() -> dict:
+    perime = _est_perime()
+    return {
+        "ok": _etat["database"] == "connected" and not perime,
+        "statut": "unknown" if perime else _etat["database"],
+        "latence_ms": _etat["latence_ms"],
+        "verifie_at": _etat["verifie_at"],
+        "echecs_consecutifs": _etat["echecs_consecutifs"],
+    }
+
+
+def _verifier_pool() -> dict:
+    serveurs = {}
+    sature = False
+    for adresse, pool in get_pool_stats()["servers"].items():
+        utilisation = pool.get("utilisation") or 0
+        # Saturé : toutes les connexions (ou presque) prises et des requêtes en attente
+        sature_serveur = utilisation >= settings.health_pool_saturation and pool.get("waiting", 0) > 0
+        sature = sature or sature_serveur
+        serveurs[adresse] = {
+            "utilisation": utilisation,
+            "en_attente": pool.get("waiting", 0),
+            "sature": sature_serveur,
+        }
+    return {"ok": not sature, "serveurs": serveurs}
+
+
+def _verifier_planificateur() -> dict:
+    from backend.services.scheduler import get_scheduler_status
+
+    statut = get_scheduler_status()
+    return {
+        "ok": statut["running"] or not statut["enabled"],
+        "actif": statut["enabled"],
+        "en_cours": statut["running"],
+        "taches": len(statut["jobs"]),
+    }
+
+
+def _verifier_files() -> dict:
+    from backend.services.alert_stream import broadcaster
+    from backend.services.audit_sink import get_audit_sink_stats
+
+    audit = get_audit_sink_stats()
+    remplissage = audit["en_file"] / settings.audit_queue_size if settings.audit_queue_size else 0
+    return {
+        "ok": remplissage < settings.health_queue_saturation,
+        "audit": {**audit, "remplissage": round(remplissage, 3)},
+        "notifications_en_attente": _etat["notifications_en_attente"],
+        "abonnes_sse": broadcaster.nombre_abonnes,
+    }
+
+
+async def disponibilite(details: bool = False) -> dict:
+    """
+    Disponibilité du worker : sans accès à la base si la surveillance
+    tourne, sinon ping direct (HEALTH_CHECK_INTERVAL_SECONDS=0).
+
+    Args:
+        details: Inclure le détail des vérifications (adresses et pool
+            MongoDB, files) ; réservé aux routes /internal
+
+    Returns:
+        dict: {"ready": bool, "checks": {nom: bool}}, ou avec details
+        {"ready": bool, "checks": {nom: {"ok": bool, ...}}, "index": str}
+    """
+    if _tache is None:
+        await verifier()
+    checks = {
+        "database": _verifier_base(),
+        "pool": _verifier_pool(),
+        "scheduler": _verifier_planificateur(),
+        "files": _verifier_files(),
+    }
+    ready = all(check["ok"] for check in checks.values())
+    if not details:
+        return {"ready": ready, "checks": {nom: check["ok"] for nom, check in checks.items()}}
+    return {"ready": ready, "checks": checks, "index": index_status.get("etat")}
+
+
+# ============================================================================
+# Cycle de vie
+# ============================================================================
+
+async def _boucle() -> None:
+    while True:
+        await asyncio.sleep(settings.health_check_interval_seconds)
+        try:
+            await verifier()
+        except Exception as e:
+            logger.warning(f"⚠️  Vérification de santé impossible: {e}")
+
+
+async def start_health_monitor() -> None:
+    """Démarrer la surveillance de santé (appelé dans le lifespan)"""
+    global _tache
+    if _tache is None and settings.health_check_interval_seconds > 0:
+        await verifier()
+        _tache = asyncio.create_task(_boucle())
+
+
+async def stop_health_monitor() -> None:
+    """Arrêter la surveillance de santé"""
+    global _tache
+    if _tache is not None:
+        _tache.cancel()
+        await asyncio.gather(_tache, return_exceptions=True)
+        _tache = None
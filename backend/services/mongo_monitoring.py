@@ -0,0 +1,358 @@
+"""
+Service de monitoring du driver MongoDB (pymongo / Motor).
+Collecte les événements du pool de connexions pour dimensionner les workers
+et les commandes exécutées, globalement et par requête HTTP.
+"""
+
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+import json
+import logging
+import threading
+
+from pymongo import monitoring
+
+from backend.config import settings
+from backend.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Listener CMAP qui maintient l'état des pools de connexions par serveur.
+
+    Les callbacks sont appelés depuis les threads du driver : l'état est
+    protégé par un verrou et lu via snapshot().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, dict] = {}
+
+    def _pool(self, address) -> dict:
+        key = f"{address[0]}:{address[1]}"
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = {
+                "max_pool_size": None,
+                "min_pool_size": None,
+                "open": 0,
+                "checked_out": 0,
+                "waiting": 0,
+                "max_checked_out": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "checkout_wait_ms_total": 0.0,
+                "checkout_wait_ms_max": 0.0,
+                "cleared": 0,
+                "created_at": datetime.utcnow()
+            }
+            self._pools[key] = pool
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["max_pool_size"] = event.options.get("maxPoolSize")
+            pool["min_pool_size"] = event.options.get("minPoolSize")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] = max(0, pool["open"] - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address)["waiting"] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] = max(0, pool["waiting"] - 1)
+            pool["checkout_failures"] += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = getattr(event, "duration", 0.0) * 1000
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] = max(0, pool["waiting"] - 1)
+            pool["checked_out"] += 1
+            pool["checkouts"] += 1
+            pool["max_checked_out"] = max(pool["max_checked_out"], pool["checked_out"])
+            pool["checkout_wait_ms_total"] += wait_ms
+            pool["checkout_wait_ms_max"] = max(pool["checkout_wait_ms_max"], wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] = max(0, pool["checked_out"] - 1)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Obtenir une copie de l'état des pools avec le taux d'utilisation.
+
+        Returns:
+            Dict {adresse serveur: statistiques du pool}
+        """
+        with self._lock:
+            result = {}
+            for address, pool in self._pools.items():
+                stats = dict(pool)
+                max_size = stats["max_pool_size"]
+                stats["utilisation"] = (
+                    round(stats["checked_out"] / max_size, 3) if max_size else None
+                )
+                stats["checkout_wait_ms_avg"] = (
+                    round(stats["checkout_wait_ms_total"] / stats["checkouts"], 3)
+                    if stats["checkouts"] else 0.0
+                )
+                result[address] = stats
+            return result
+
+
+# Instance globale enregistrée sur le client Motor
+pool_stats = PoolStatsListener()
+
+
+# ============================================================================
+# Monitoring des commandes
+# ============================================================================
+
+mongodb_commands_total = registry.counter(
+    "sap_mongodb_commands_total",
+    "Nombre de commandes MongoDB exécutées",
+    ["command", "outcome"]
+)
+mongodb_command_duration = registry.histogram(
+    "sap_mongodb_command_duration_seconds",
+    "Durée des commandes MongoDB",
+    ["command"]
+)
+
+
+mongodb_slow_queries_total = registry.counter(
+    "sap_mongodb_slow_queries_total",
+    "Nombre de commandes MongoDB au-delà du seuil de lenteur",
+    ["command", "collection"]
+)
+mongodb_n_plus_one_total = registry.counter(
+    "sap_mongodb_n_plus_one_total",
+    "Nombre de requêtes HTTP ayant répété une même forme de requête MongoDB",
+    ["method", "route"]
+)
+
+# Commandes sans intérêt pour l'analyse des requêtes (handshake, sessions...)
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart",
+    "saslContinue", "buildInfo", "getMore", "killCursors"
+}
+
+
+def query_shape(value):
+    """
+    Réduire un filtre MongoDB à sa forme: les valeurs sont remplacées par "?"
+    pour que deux requêtes ne différant que par leurs paramètres soient égales.
+
+    Exemple: {"_id": {"$in": [id1, id2]}} -> {"_id": {"$in": "?"}}
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(val) for key, val in sorted(value.items())}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, dict) for v in value):
+        return [query_shape(v) for v in value]
+    return "?"
+
+
+def extract_command_filter(command_name: str, command) -> Optional[dict]:
+    """Extraire le filtre (ou le pipeline) d'une commande MongoDB"""
+    if command_name == "find":
+        return command.get("filter", {})
+    if command_name in ("count", "distinct", "findAndModify"):
+        return command.get("query", {})
+    if command_name == "aggregate":
+        return {"pipeline": command.get("pipeline", [])}
+    if command_name == "update":
+        updates = command.get("updates") or [{}]
+        return updates[0].get("q", {})
+    if command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        return deletes[0].get("q", {})
+    return None
+
+
+def describe_command(command_name: str, command) -> tuple:
+    """
+    Obtenir (collection, forme du filtre) d'une commande.
+
+    Returns:
+        Tuple (nom de collection ou None, forme JSON ou None)
+    """
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        collection = None
+
+    filtre = extract_command_filter(command_name, command)
+    shape = None
+    if filtre is not None:
+        shape = json.dumps(query_shape(filtre), sort_keys=True, default=str)
+
+    return collection, shape
+
+
+class RequestDbStats:
+    """
+    Statistiques MongoDB d'une requête HTTP.
+    Partagé entre la boucle asyncio et les threads du driver (Motor copie le
+    contexte vers ses threads), d'où le verrou.
+    """
+
+    __slots__ = ("count", "duration_ms", "shapes", "_lock")
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, duration_ms: float, shape_key: Optional[tuple] = None) -> None:
+        with self._lock:
+            self.count += 1
+            self.duration_ms += duration_ms
+            if shape_key is not None:
+                self.shapes[shape_key] += 1
+
+
+# Statistiques de la requête HTTP courante (positionné par le middleware)
+current_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar(
+    "current_request_db_stats", default=None
+)
+
+
+# Derniers rapports N+1 (consultables par les tests et /internal/db/queries)
+_n_plus_one_reports: deque = deque(maxlen=200)
+
+
+def check_n_plus_one(method: str, route: str, stats: RequestDbStats) -> List[dict]:
+    """
+    Détecter les formes de requête répétées plus de N fois dans une requête HTTP.
+    Appelé par le middleware d'instrumentation à la fin de chaque requête.
+
+    Args:
+        method: Méthode HTTP
+        route: Gabarit de route
+        stats: Statistiques MongoDB de la requête
+
+    Returns:
+        Liste des rapports générés (vide si aucun N+1)
+    """
+    threshold = settings.mongodb_n_plus_one_threshold
+    if threshold <= 0:
+        return []
+
+    with stats._lock:
+        repeated = [(key, count) for key, count in stats.shapes.items() if count > threshold]
+
+    reports = []
+    for (command_name, collection, shape), count in repeated:
+        report = {
+            "method": method,
+            "route": route,
+            "command": command_name,
+            "collection": collection,
+            "shape": shape,
+            "count": count,
+            "timestamp": datetime.utcnow()
+        }
+        reports.append(report)
+        _n_plus_one_reports.append(report)
+        logger.warning(
+            f"N+1 détecté: {method} {route} -> {count}x {command_name} "
+            f"{collection} {shape}"
+        )
+
+    if reports:
+        mongodb_n_plus_one_total.inc(method=method, route=route)
+    return reports
+
+
+def get_n_plus_one_reports() -> List[dict]:
+    """
+    Obtenir les rapports N+1 enregistrés depuis le démarrage (ou le dernier reset).
+    Permet aux tests d'échouer si une route répète une même requête.
+    """
+    return list(_n_plus_one_reports)
+
+
+def clear_n_plus_one_reports() -> None:
+    """Vider les rapports N+1 (à appeler en début de test)"""
+    _n_plus_one_reports.clear()
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Listener de commandes : alimente les métriques globales et les
+    statistiques de la requête HTTP en cours, journalise les requêtes lentes.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection, shape = describe_command(event.command_name, event.command)
+        with self._lock:
+            self._pending[event.request_id] = (collection, shape)
+
+    def _record(self, event, outcome: str) -> None:
+        duration_ms = event.duration_micros / 1000
+        mongodb_commands_total.inc(command=event.command_name, outcome=outcome)
+        mongodb_command_duration.observe(duration_ms / 1000, command=event.command_name)
+
+        with self._lock:
+            collection, shape = self._pending.pop(event.request_id, (None, None))
+
+        if duration_ms >= settings.mongodb_slow_query_threshold_ms:
+            mongodb_slow_queries_total.inc(command=event.command_name, collection=collection or "")
+            logger.warning(
+                f"Requête MongoDB lente ({duration_ms:.1f} ms): {event.command_name} "
+                f"{collection} filtre={shape}"
+            )
+
+        stats = current_request_db_stats.get()
+        if stats is not None:
+            shape_key = None
+            if event.command_name not in IGNORED_COMMANDS:
+                shape_key = (event.command_name, collection, shape)
+            stats.record(duration_ms, shape_key)
+
+    def succeeded(self, event):
+        self._record(event, "success")
+
+    def failed(self, event):
+        self._record(event, "failure")
+
+
+# Instance globale enregistrée sur le client Motor
+command_metrics = CommandMetricsListener()
@@ -0,0 +1,514 @@
+"""
+Service de notifications des alertes pour SAP.
+
+Les alertes créées ou aggravées sont déposées dans une boîte d'envoi
+MongoDB (notifications_outbox) sous forme de résumés par destinataire : les
+alertes d'un même destinataire et d'un même canal s'accumulent dans un seul
+message pendant NOTIFICATION_DIGEST_SECONDS secondes (moins pour les
+urgences). Un pool de workers asynchrones envoie ensuite les messages dus,
+avec limites de débit (par canal et par destinataire) et nouvelles
+tentatives à délai exponentiel.
+
+Canaux (activés par leur configuration) :
+- email: API HTTP SendGrid (SENDGRID_API_KEY, SENDGRID_API_URL)
+- sms: passerelle SMS HTTP (SMS_GATEWAY_URL), pour les sentinelles
+- webhook: POST JSON vers NOTIFICATION_WEBHOOK_URLS
+
+Pour les tests, backend/scripts/notification_sink.py simule ces trois
+services en local.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import logging
+import random
+import time
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.config import settings
+from backend.database import db
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+NIVEAUX = ("surveillance", "alerte", "urgence")
+
+EN_ATTENTE = "en_attente"      # Résumé ouvert, reçoit encore des alertes
+A_REESSAYER = "a_reessayer"    # Envoi reporté (échec temporaire, limite de débit)
+EN_COURS = "en_cours"          # Pris par un worker (bail de NOTIFICATION_LEASE_SECONDS)
+ENVOYEE = "envoyee"
+ECHEC = "echec"
+
+# Longueur maximale d'un SMS (3 segments concaténés)
+SMS_LONGUEUR_MAX = 459
+
+_client: Optional["httpx.AsyncClient"] = None
+_workers: List[asyncio.Task] = []
+
+
+class ErreurEnvoi(Exception):
+    """
+    Échec d'envoi d'un message.
+
+    Args:
+        message: Description de l'erreur
+        temporaire: L'envoi peut être retenté (délai, 429, 5xx)
+    """
+
+    def __init__(self, message: str, temporaire: bool = True):
+        super().__init__(message)
+        self.temporaire = temporaire
+
+
+# ============================================================================
+# Canaux
+# ============================================================================
+
+def rang_niveau(niveau: Optional[str]) -> int:
+    """Rang d'un niveau d'alerte (-1 si inconnu)"""
+    return NIVEAUX.index(niveau) if niveau in NIVEAUX else -1
+
+
+def ligne_alerte(item: dict) -> str:
+    """Ligne de texte décrivant une alerte"""
+    lieu = ", ".join(n for n in (item.get("commune_nom"), item.get("departement_nom")) if n)
+    return (
+        f"{item['niveau'].upper()} - {item.get('produit_nom')} à {item.get('marche_nom')}"
+        f"{f' ({lieu})' if lieu else ''}: {item['prix_actuel']:.0f} HTG "
+        f"({item['ecart_pourcentage']:+.0f}%)"
+    )
+
+
+def composer(items: List[dict]) -> Tuple[str, str]:
+    """
+    Sujet et texte d'un résumé. Une alerte présente plusieurs fois (aggravée
+    pendant la fenêtre) n'apparaît qu'avec son dernier état ; les plus
+    graves sont listées en premier.
+    """
+    par_alerte = {item["alerte_id"]: item for item in items}
+    alertes = sorted(par_alerte.values(), key=lambda i: -rang_niveau(i["niveau"]))
+    urgences = sum(1 for a in alertes if a["niveau"] == "urgence")
+    sujet = f"SAP: {len(alertes)} alerte(s) de prix"
+    if urgences:
+        sujet += f" dont {urgences} urgence(s)"
+    return sujet, "\n".join(ligne_alerte(a) for a in alertes)
+
+
+class Canal(ABC):
+    """Canal d'envoi (une requête HTTP par message)"""
+
+    nom = ""
+
+    @abstractmethod
+    def actif(self) -> bool:
+        """Canal configuré et utilisable"""
+
+    def niveau_minimal(self) -> int:
+        """Rang minimal des alertes notifiées sur ce canal"""
+        return 0
+
+    @abstractmethod
+    async def envoyer(self, adresse: str, items: List[dict]) -> None:
+        """Envoyer le résumé `items` à `adresse` (ErreurEnvoi en cas d'échec)"""
+
+    async def _post(self, url: str, json: dict, headers: Optional[dict] = None) -> None:
+        """POST JSON ; 429, 5xx et erreurs réseau sont temporaires, les autres 4xx définitifs"""
+        import httpx
+
+        try:
+            response = await _client.post(url, json=json, headers=headers)
+        except httpx.HTTPError as e:
+            raise ErreurEnvoi(f"{self.nom}: {e.__class__.__name__}: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise ErreurEnvoi(f"{self.nom}: HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise ErreurEnvoi(f"{self.nom}: HTTP {response.status_code} {response.text[:200]}", temporaire=False)
+
+
+class CanalEmail(Canal):
+    """Email via l'API HTTP v3 de SendGrid"""
+
+    nom = "email"
+
+    def actif(self) -> bool:
+        return bool(settings.sendgrid_api_key)
+
+    def niveau_minimal(self) -> int:
+        return rang_niveau(settings.notification_email_min_niveau)
+
+    async def envoyer(self, adresse: str, items: List[dict]) -> None:
+        sujet, texte = composer(items)
+        await self._post(
+            settings.sendgrid_api_url,
+            {
+                "personalizations": [{"to": [{"email": adresse}]}],
+                "from": {"email": settings.sendgrid_from_email, "name": settings.sendgrid_from_name},
+                "subject": sujet,
+                "content": [{"type": "text/plain", "value": texte}]
+            },
+            {"Authorization": f"Bearer {settings.sendgrid_api_key}"}
+        )
+
+
+class CanalSms(Canal):
+    """SMS via une passerelle HTTP (POST {"to", "message"})"""
+
+    nom = "sms"
+
+    def actif(self) -> bool:
+        return bool(settings.sms_gateway_url)
+
+    def niveau_minimal(self) -> int:
+        return rang_niveau(settings.notification_sms_min_niveau)
+
+    async def envoyer(self, adresse: str, items: List[dict]) -> None:
+        sujet, texte = composer(items)
+        message = f"{sujet}\n{texte}"
+        if len(message) > SMS_LONGUEUR_MAX:
+            message = message[:SMS_LONGUEUR_MAX - 3] + "..."
+        headers = {"Authorization": f"Bearer {settings.sms_gateway_token}"} if settings.sms_gateway_token else None
+        await self._post(settings.sms_gateway_url, {"to": adresse, "message": message}, headers)
+
+
+class CanalWebhook(Canal):
+    """Webhook : résumé JSON complet"""
+
+    nom = "webhook"
+
+    def actif(self) -> bool:
+        return bool(settings.notification_webhook_urls_list)
+
+    async def envoyer(self, adresse: str, items: List[dict]) -> None:
+        sujet, _ = composer(items)
+        await self._post(adresse, {
+            "type": "alertes",
+            "sujet": sujet,
+            "alertes": [
+                {**item, "at": item["at"].isoformat()}
+                for item in {item["alerte_id"]: item for item in items}.values()
+            ]
+        })
+
+
+CANAUX: Dict[str, Canal] = {canal.nom: canal for canal in (CanalEmail(), CanalSms(), CanalWebhook())}
+
+
+class LimiteurDebit:
+    """
+    Seau à jetons (par canal et par worker) : au plus `debit` envois par
+    seconde vers un fournisseur.
+    """
+
+    def __init__(self, debit: float):
+        self.debit = debit
+        self.jetons = debit
+        self.maj = time.monotonic()
+        self._verrou = asyncio.Lock()
+
+    async def acquerir(self) -> None:
+        if self.debit <= 0:
+            return
+        async with self._verrou:
+            while True:
+                maintenant = time.monotonic()
+                self.jetons = min(self.debit, self.jetons + (maintenant - self.maj) * self.debit)
+                self.maj = maintenant
+                if self.jetons >= 1:
+                    self.jetons -= 1
+                    return
+                await asyncio.sleep((1 - self.jetons) / self.debit)
+
+
+_limiteurs: Dict[str, LimiteurDebit] = {}
+
+
+# ============================================================================
+# Dépôt dans la boîte d'envoi
+# ============================================================================
+
+async def charger_destinataires() -> List[dict]:
+    """Utilisateurs actifs notifiés (NOTIFICATION_ROLES)"""
+    return await db.users.find(
+        {"actif": True, "roles": {"$in": settings.notification_roles_list}},
+        {"email": 1, "telephone": 1, "departement_id": 1}
+    ).to_list(None)
+
+
+def item_alerte(alerte: dict, maintenant: datetime) -> dict:
+    """Résumé d'une alerte enrichie stocké dans la boîte d'envoi"""
+    return {
+        "alerte_id": alerte["id"],
+        "niveau": alerte["niveau"],
+        "produit_nom": alerte.get("produit_nom"),
+        "marche_nom": alerte.get("marche_nom"),
+        "commune_nom": alerte.get("commune_nom"),
+        "departement_id": alerte.get("departement_id"),
+        "departement_nom": alerte.get("departement_nom"),
+        "prix_actuel": alerte["prix_actuel"],
+        "ecart_pourcentage": alerte["ecart_pourcentage"],
+        "at": maintenant
+    }
+
+
+async def enfiler_notifications(alertes: List[dict]) -> int:
+    """
+    Ajouter des alertes créées ou aggravées aux résumés des destinataires.
+
+    Chaque (canal, adresse) a au plus un résumé ouvert ; les alertes y sont
+    ajoutées et l'échéance d'envoi est avancée pour une urgence.
+
+    Args:
+        alertes: Documents d'alertes (avec _id)
+
+    Returns:
+        int: Nombre de résumés touchés
+    """
+    canaux = {nom: canal for nom, canal in CANAUX.items() if canal.actif()}
+    if not settings.notifications_enabled or not canaux or not alertes:
+        return 0
+
+    from backend.routers.alertes import enrichir_alertes
+
+    maintenant = datetime.utcnow()
+    enrichies, destinataires = await asyncio.gather(
+        enrichir_alertes(alertes, None), charger_destinataires()
+    )
+
+    # (canal, adresse) -> [items]
+    resumes: Dict[Tuple[str, str], List[dict]] = {}
+    urgents = set()
+    for alerte in enrichies:
+        item = item_alerte(alerte, maintenant)
+        rang = rang_niveau(alerte["niveau"])
+        cles = []
+        for destinataire in destinataires:
+            if destinataire.get("departement_id") and destinataire["departement_id"] != alerte.get("departement_id"):
+                continue
+            if "email" in canaux and destinataire.get("email") and rang >= canaux["email"].niveau_minimal():
+                cles.append(("email", destinataire["email"]))
+            if "sms" in canaux and destinataire.get("telephone") and rang >= canaux["sms"].niveau_minimal():
+                cles.append(("sms", destinataire["telephone"]))
+        if "webhook" in canaux:
+            cles.extend(("webhook", url) for url in settings.notification_webhook_urls_list)
+        for cle in cles:
+            resumes.setdefault(cle, []).append(item)
+            if alerte["niveau"] == "urgence":
+                urgents.add(cle)
+
+    if not resumes:
+        return 0
+
+    def operation(cle: Tuple[str, str]) -> UpdateOne:
+        delai = settings.notification_urgent_digest_seconds if cle in urgents else settings.notification_digest_seconds
+        return UpdateOne(
+            {"canal": cle[0], "adresse": cle[1], "statut": EN_ATTENTE},
+            {
+                "$push": {"items": {"$each": resumes[cle]}},
+                "$min": {"prochain_essai": maintenant + timedelta(seconds=delai)},
+                "$setOnInsert": {"tentatives": 0, "created_at": maintenant}
+            },
+            upsert=True
+        )
+
+    cles = list(resumes)
+    try:
+        await db.notifications_outbox.bulk_write([operation(c) for c in cles], ordered=False)
+    except BulkWriteError as e:
+        # Résumé ouvert en parallèle par un autre worker (index unique
+        # partiel) : rejouer uniquement les opérations en conflit
+        conflits = [cles[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+        if len(conflits) != len(e.details.get("writeErrors", [])):
+            raise
+        await db.notifications_outbox.bulk_write([operation(c) for c in conflits], ordered=False)
+
+    return len(resumes)
+
+
+async def notifier_alertes_par_ids(ids: List) -> None:
+    """
+    Relire des alertes créées ou aggravées et les notifier. Appelé par le
+    moteur d'alertes ; une erreur n'interrompt jamais l'écriture des alertes.
+    """
+    if not ids or not settings.notifications_enabled:
+        return
+    try:
+        alertes = await db.alertes.find({"_id": {"$in": list(ids)}, "statut": "active"}).to_list(None)
+        await enfiler_notifications(alertes)
+    except Exception as e:
+        logger.error(f"❌ Mise en file des notifications impossible: {e}")
+
+
+# ============================================================================
+# Envoi (pool de workers)
+# ============================================================================
+
+def delai_nouvel_essai(tentatives: int) -> float:
+    """Délai exponentiel (avec gigue) avant la tentative suivante, plafonné à 1 h"""
+    delai = settings.notification_retry_base_seconds * (2 ** max(0, tentatives - 1))
+    return min(3600, delai) * random.uniform(0.8, 1.2)
+
+
+async def reserver_message(worker_id: str) -> Optional[dict]:
+    """
+    Prendre le prochain message dû (ou dont le bail a expiré : worker arrêté
+    en cours d'envoi).
+    """
+    maintenant = datetime.utcnow()
+    return await db.notifications_outbox.find_one_and_update(
+        {"$or": [
+            {"statut": {"$in": [EN_ATTENTE, A_REESSAYER]}, "prochain_essai": {"$lte": maintenant}},
+            {"statut": EN_COURS, "verrou_jusqua": {"$lte": maintenant}}
+        ]},
+        {"$set": {
+            "statut": EN_COURS,
+            "worker": worker_id,
+            "verrou_jusqua": maintenant + timedelta(seconds=settings.notification_lease_seconds)
+        }},
+        sort=[("prochain_essai", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def report_limite_destinataire(message: dict) -> Optional[datetime]:
+    """
+    Date à laquelle le destinataire repasse sous NOTIFICATION_MAX_PER_HOUR
+    messages envoyés sur une heure glissante, ou None s'il y est déjà.
+    """
+    if settings.notification_max_per_hour <= 0:
+        return None
+    depuis = datetime.utcnow() - timedelta(hours=1)
+    envoyes = await db.notifications_outbox.find(
+        {"canal": message["canal"], "adresse": message["adresse"], "statut": ENVOYEE, "envoye_at": {"$gte": depuis}},
+        {"envoye_at": 1}
+    ).sort("envoye_at", 1).to_list(settings.notification_max_per_hour)
+    if len(envoyes) < settings.notification_max_per_hour:
+        return None
+    return envoyes[0]["envoye_at"] + timedelta(hours=1)
+
+
+async def traiter_message(message: dict) -> str:
+    """
+    Envoyer un message réservé et enregistrer le résultat.
+
+    Returns:
+        Nouveau statut du message
+    """
+    maintenant = datetime.utcnow()
+    canal = CANAUX.get(message["canal"])
+
+    report = await report_limite_destinataire(message)
+    if report is not None:
+        await db.notifications_outbox.update_one(
+            {"_id": message["_id"]},
+            {"$set": {"statut": A_REESSAYER, "prochain_essai": report, "erreur": "limite de débit du destinataire"}}
+        )
+        return A_REESSAYER
+
+    tentatives = message.get("tentatives", 0) + 1
+    try:
+        if canal is None or not canal.actif():
+            raise ErreurEnvoi(f"canal {message['canal']} inactif", temporaire=False)
+        await _limiteurs.setdefault(canal.nom, LimiteurDebit(settings.notification_channel_rate_per_second)).acquerir()
+        try:
+            await canal.envoyer(message["adresse"], message["items"])
+        except ErreurEnvoi:
+            raise
+        except Exception as e:
+            # Message inexploitable (contenu invalide) : inutile de réessayer
+            raise ErreurEnvoi(f"{canal.nom}: {e.__class__.__name__}: {e}", temporaire=False)
+    except ErreurEnvoi as e:
+        final = not e.temporaire or tentatives >= settings.notification_max_attempts
+        statut = ECHEC if final else A_REESSAYER
+        update = {"statut": statut, "tentatives": tentatives, "erreur": str(e)}
+        if final:
+            update["termine_at"] = maintenant
+        else:
+            update["prochain_essai"] = maintenant + timedelta(seconds=delai_nouvel_essai(tentatives))
+        await db.notifications_outbox.update_one({"_id": message["_id"]}, {"$set": update})
+        logger.warning(f"⚠️  Notification {message['canal']} -> {message['adresse']}: {e} ({statut})")
+        return statut
+
+    await db.notifications_outbox.update_one(
+        {"_id": message["_id"]},
+        {"$set": {"statut": ENVOYEE, "tentatives": tentatives, "envoye_at": maintenant, "termine_at": maintenant},
+         "$unset": {"erreur": ""}}
+    )
+    return ENVOYEE
+
+
+async def _worker(numero: int) -> None:
+    """Boucle d'un worker d'envoi"""
+    from backend.services.scheduler import WORKER_ID
+
+    worker_id = f"{WORKER_ID}#{numero}"
+    while True:
+        try:
+            message = await reserver_message(worker_id)
+            if message is None:
+                await asyncio.sleep(settings.notification_poll_seconds)
+                continue
+            await traiter_message(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Worker de notifications {numero}: {e}", exc_info=True)
+            await asyncio.sleep(settings.notification_poll_seconds)
+
+
+async def start_notifications() -> None:
+    """Démarrer le pool d'envoi (appelé dans le lifespan)"""
+    global _client
+    if not settings.notifications_enabled or _workers:
+        return
+    if not any(canal.actif() for canal in CANAUX.values()):
+        logger.info("📭 Notifications: aucun canal configuré")
+        return
+    # Import différé : httpx n'est chargé que si un canal est configuré
+    import httpx
+
+    _client = httpx.AsyncClient(timeout=settings.notification_http_timeout_seconds)
+    for numero in range(settings.notification_workers):
+        _workers.append(asyncio.create_task(_worker(numero)))
+    canaux = [nom for nom, canal in CANAUX.items() if canal.actif()]
+    logger.info(f"📬 Notifications: {settings.notification_workers} workers ({', '.join(canaux)})")
+
+
+async def stop_notifications() -> None:
+    """
+    Arrêter le pool d'envoi. Un message en cours d'envoi sera repris par un
+    autre worker à l'expiration de son bail.
+    """
+    global _client
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def get_outbox_stats() -> dict:
+    """Nombre de messages par canal et statut, et plus ancien message en attente"""
+    comptes = await db.notifications_outbox.aggregate([
+        {"$group": {"_id": {"canal": "$canal", "statut": "$statut"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    plus_ancien = await db.notifications_outbox.find_one(
+        {"statut": {"$in": [EN_ATTENTE, A_REESSAYER]}}, {"created_at": 1}, sort=[("created_at", 1)]
+    )
+    stats: Dict[str, Dict[str, int]] = {}
+    for c in comptes:
+        stats.setdefault(c["_id"]["canal"], {})[c["_id"]["statut"]] = c["count"]
+    return {
+        "workers": len(_workers),
+        "canaux": {nom: canal.actif() for nom, canal in CANAUX.items()},
+        "messages": stats,
+        "plus_ancien_en_attente": plus_ancien["created_at"] if plus_ancien else None
+    }
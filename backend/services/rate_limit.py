@@ -0,0 +1,285 @@
+"""
+Limitation de débit par fenêtre glissante pour SAP.
+
+Chaque règle compte les requêtes par clé (adresse IP, email) sur une
+fenêtre glissante approchée par deux compteurs : la fenêtre fixe courante
+et la précédente, pondérée par la part de la fenêtre glissante qui la
+recouvre. Mémoire constante par clé, précision suffisante pour freiner le
+bourrage d'identifiants.
+
+Stockage (RATE_LIMIT_STORE) :
+- memory: compteurs en mémoire du processus (un worker)
+- mongodb: compteurs partagés dans la collection rate_limits (multi-workers),
+  purgés par index TTL
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import math
+import re
+import time
+
+from fastapi import HTTPException, Request, status
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.config import settings
+from backend.database import db
+from backend.services.metrics import registry as metrics_registry
+
+
+rate_limit_decisions = metrics_registry.counter(
+    "sap_rate_limit_decisions_total",
+    "Décisions du limiteur de débit par règle",
+    ["regle", "decision"]
+)
+rate_limit_keys = metrics_registry.gauge(
+    "sap_rate_limit_keys",
+    "Clés suivies par le limiteur de débit en mémoire"
+)
+
+
+@dataclass(frozen=True)
+class Regle:
+    """Au plus `limite` requêtes par `fenetre` secondes et par clé"""
+    nom: str
+    limite: int
+    fenetre: int
+
+
+def estimer(courant: int, precedent: int, ecoule: float, fenetre: int) -> float:
+    """Nombre de requêtes sur la fenêtre glissante se terminant maintenant"""
+    return courant + precedent * (1 - ecoule / fenetre)
+
+
+def delai_avant_reprise(regle: Regle, courant: int, precedent: int, ecoule: float) -> int:
+    """Secondes avant que l'estimation repasse sous la limite"""
+    if courant >= regle.limite:
+        # Attendre la fenêtre suivante, où `courant` devient `precedent`
+        reste = regle.fenetre - ecoule
+        if courant > 0:
+            reste += regle.fenetre * (1 - (regle.limite - 1) / courant)
+        return max(1, math.ceil(reste))
+    if precedent <= 0:
+        return 1
+    # precedent * (1 - t / fenetre) + courant < limite
+    t = regle.fenetre * (1 - (regle.limite - courant - 1) / precedent)
+    return max(1, math.ceil(t - ecoule))
+
+
+# ============================================================================
+# Stockages
+# ============================================================================
+
+class MemoryStore:
+    """Compteurs en mémoire : clé -> [indice de fenêtre, courant, précédent]"""
+
+    def __init__(self, max_cles: int):
+        self.max_cles = max_cles
+        self._compteurs: Dict[Tuple[str, str], List[int]] = {}
+
+    async def incrementer(self, regle: Regle, cle: str, maintenant: float) -> Tuple[int, int]:
+        indice = int(maintenant // regle.fenetre)
+        compteur = self._compteurs.get((regle.nom, cle))
+        if compteur is None:
+            if len(self._compteurs) >= self.max_cles:
+                self._purger(maintenant)
+            compteur = self._compteurs[(regle.nom, cle)] = [indice, 0, 0]
+        elif compteur[0] != indice:
+            compteur[2] = compteur[1] if compteur[0] == indice - 1 else 0
+            compteur[1] = 0
+            compteur[0] = indice
+        compteur[1] += 1
+        return compteur[1], compteur[2]
+
+    async def reinitialiser(self, regle: Regle, cle: str) -> None:
+        self._compteurs.pop((regle.nom, cle), None)
+
+    def _purger(self, maintenant: float) -> None:
+        """
+        Retirer les clés inactives depuis deux fenêtres ; si la table reste
+        pleine (rotation d'emails), retirer le dixième le plus ancien pour
+        ne pas repurger à chaque nouvelle clé.
+        """
+        for (nom, cle), compteur in list(self._compteurs.items()):
+            regle = REGLES.get(nom)
+            if regle is None or compteur[0] < int(maintenant // regle.fenetre) - 1:
+                del self._compteurs[(nom, cle)]
+        if len(self._compteurs) >= self.max_cles:
+            for ancienne in list(self._compteurs)[:max(1, self.max_cles // 10)]:
+                del self._compteurs[ancienne]
+
+    def __len__(self) -> int:
+        return len(self._compteurs)
+
+
+class MongoStore:
+    """
+    Compteurs partagés : un document par (règle, clé, fenêtre fixe),
+    incrémenté atomiquement ; la fenêtre précédente est lue en parallèle.
+    """
+
+    async def incrementer(self, regle: Regle, cle: str, maintenant: float) -> Tuple[int, int]:
+        indice = int(maintenant // regle.fenetre)
+        expire_at = datetime.utcfromtimestamp((indice + 2) * regle.fenetre)
+        for tentative in range(2):
+            try:
+                courant, precedent = await asyncio.gather(
+                    db.rate_limits.find_one_and_update(
+                        {"_id": f"{regle.nom}:{cle}:{indice}"},
+                        {"$inc": {"count": 1}, "$setOnInsert": {"expire_at": expire_at}},
+                        upsert=True,
+                        return_document=ReturnDocument.AFTER
+                    ),
+                    db.rate_limits.find_one({"_id": f"{regle.nom}:{cle}:{indice - 1}"}, {"count": 1})
+                )
+                return courant["count"], precedent["count"] if precedent else 0
+            except DuplicateKeyError:
+                # Upsert concurrent sur la même fenêtre : rejouer
+                if tentative:
+                    raise
+
+    async def reinitialiser(self, regle: Regle, cle: str) -> None:
+        await db.rate_limits.delete_many({"_id": {"$regex": f"^{re.escape(f'{regle.nom}:{cle}:')}"}})
+
+
+def _creer_store():
+    if settings.rate_limit_store == "mongodb":
+        return MongoStore()
+    return MemoryStore(settings.rate_limit_max_keys)
+
+
+REGLES: Dict[str, Regle] = {
+    regle.nom: regle for regle in (
+        Regle("login_ip", settings.login_rate_limit_ip, settings.login_rate_limit_window_seconds),
+        Regle("login_email", settings.login_rate_limit_email, settings.login_rate_limit_window_seconds),
+        Regle("mfa_ip", settings.mfa_rate_limit_ip, settings.login_rate_limit_window_seconds),
+        Regle("mfa_user", settings.mfa_rate_limit_user, settings.login_rate_limit_window_seconds),
+    )
+}
+
+store = _creer_store()
+
+
+# ============================================================================
+# Vérification
+# ============================================================================
+
+async def verifier(regle: Regle, cle: Optional[str]) -> Optional[int]:
+    """
+    Compter une requête pour `cle` et vérifier la règle.
+
+    Args:
+        regle: Règle appliquée (limite 0 = désactivée)
+        cle: Clé comptée (None = non comptée)
+
+    Returns:
+        None si la requête est autorisée, sinon le délai (secondes) avant
+        de pouvoir réessayer
+    """
+    if not settings.rate_limit_enabled or regle.limite <= 0 or not cle:
+        return None
+    maintenant = time.time()
+    courant, precedent = await store.incrementer(regle, cle, maintenant)
+    ecoule = maintenant - int(maintenant // regle.fenetre) * regle.fenetre
+    if isinstance(store, MemoryStore):
+        rate_limit_keys.set(len(store))
+
+    if estimer(courant, precedent, ecoule, regle.fenetre) <= regle.limite:
+        rate_limit_decisions.inc(regle=regle.nom, decision="autorise")
+        return None
+    rate_limit_decisions.inc(regle=regle.nom, decision="refuse")
+    return delai_avant_reprise(regle, courant, precedent, ecoule)
+
+
+async def reinitialiser(nom_regle: str, cle: Optional[str]) -> None:
+    """Remettre à zéro le compteur d'une clé (ex: après une connexion réussie)"""
+    regle = REGLES[nom_regle]
+    if settings.rate_limit_enabled and regle.limite > 0 and cle:
+        await store.reinitialiser(regle, cle)
+
+
+def _refuser(delai: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Trop de tentatives de connexion, réessayez plus tard",
+        headers={"Retry-After": str(delai)}
+    )
+
+
+async def email_de_requete(request: Request) -> Optional[str]:
+    """Email du corps JSON (déjà lu par FastAPI), normalisé"""
+    try:
+        corps = await request.json()
+    except Exception:
+        return None
+    email = corps.get("email") if isinstance(corps, dict) else None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+async def limiter_connexion(request: Request) -> None:
+    """
+    Dépendance de POST /api/auth/login : limites par IP et par email,
+    vérifiées avant la recherche de l'utilisateur et le hachage bcrypt.
+
+    Raises:
+        HTTPException: 429 avec en-tête Retry-After
+    """
+    from backend.middleware.audit import get_client_ip
+
+    ip_address = get_client_ip(request)
+    email = await email_de_requete(request)
+    delais = [
+        d for d in await asyncio.gather(
+            verifier(REGLES["login_ip"], ip_address),
+            verifier(REGLES["login_email"], email)
+        ) if d is not None
+    ]
+    if delais:
+        raise _refuser(max(delais))
+
+
+async def utilisateur_mfa_de_requete(request: Request) -> Optional[str]:
+    """Utilisateur du token temporaire MFA du corps JSON (None si invalide)"""
+    from backend.services.auth import decode_token
+
+    try:
+        corps = await request.json()
+    except Exception:
+        return None
+    temp_token = corps.get("temp_token") if isinstance(corps, dict) else None
+    payload = decode_token(temp_token) if isinstance(temp_token, str) else None
+    if not payload or payload.get("type") != "mfa_pending":
+        return None
+    return payload.get("sub")
+
+
+async def limiter_mfa(request: Request) -> None:
+    """
+    Dépendance de POST /api/auth/verify-mfa : limites par IP et par
+    utilisateur du token temporaire (codes TOTP et codes de secours hachés).
+    La limite par utilisateur borne la recherche d'un code TOTP quel que
+    soit le nombre d'adresses ou de tokens temporaires utilisés.
+
+    Raises:
+        HTTPException: 429 avec en-tête Retry-After
+    """
+    from backend.middleware.audit import get_client_ip
+
+    delais = [
+        d for d in await asyncio.gather(
+            verifier(REGLES["mfa_ip"], get_client_ip(request)),
+            verifier(REGLES["mfa_user"], await utilisateur_mfa_de_requete(request))
+        ) if d is not None
+    ]
+    if delais:
+        raise _refuser(max(delais))
+
+
+def rate_limit_indexes() -> List[IndexModel]:
+    """Purge des compteurs partagés après leur fenêtre (store mongodb)"""
+    if settings.rate_limit_store == "mongodb":
+        return [IndexModel("expire_at", expireAfterSeconds=0)]
+    return []
@@ -0,0 +1,341 @@
+"""
+Service de tâches planifiées pour SAP.
+Planificateur APScheduler démarré dans le lifespan de l'application, avec
+verrou distribué MongoDB (un seul worker exécute chaque tâche) et
+historique des exécutions.
+"""
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+import logging
+import os
+import socket
+import time
+import uuid
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from pymongo.errors import DuplicateKeyError
+
+from backend.config import settings
+from backend.database import db, max_time_ms
+from backend.services.alert_stream import publier_alertes_par_ids
+from backend.services.cache import invalidate_aggregates
+
+logger = logging.getLogger(__name__)
+
+
+# Identifiant unique de ce worker (détenteur des verrous)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_scheduler: Optional[AsyncIOScheduler] = None
+
+
+# ============================================================================
+# Verrou distribué
+# ============================================================================
+
+async def acquire_lock(name: str, ttl_seconds: int) -> bool:
+    """
+    Acquérir le verrou d'une tâche dans la collection scheduler_locks.
+
+    Le verrou expire après `ttl_seconds` pour qu'un worker arrêté en cours
+    d'exécution ne bloque pas la tâche indéfiniment.
+
+    Args:
+        name: Nom de la tâche
+        ttl_seconds: Durée de validité du verrou
+
+    Returns:
+        True si ce worker détient le verrou
+    """
+    now = datetime.utcnow()
+    try:
+        await db.scheduler_locks.find_one_and_update(
+            {"_id": name, "$or": [{"locked_until": {"$lte": now}}, {"owner": WORKER_ID}]},
+            {"$set": {
+                "owner": WORKER_ID,
+                "locked_at": now,
+                "locked_until": now + timedelta(seconds=ttl_seconds)
+            }},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Verrou détenu (et non expiré) par un autre worker
+        return False
+
+
+async def release_lock(name: str) -> None:
+    """Libérer le verrou d'une tâche s'il appartient à ce worker"""
+    await db.scheduler_locks.update_one(
+        {"_id": name, "owner": WORKER_ID},
+        {"$set": {"locked_until": datetime.utcnow()}}
+    )
+
+
+# ============================================================================
+# Exécution et historique
+# ============================================================================
+
+async def run_job(name: str, func: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+    """
+    Exécuter une tâche sous verrou et enregistrer son exécution dans
+    scheduler_runs (durée, statut, résultat ou erreur).
+
+    Args:
+        name: Nom de la tâche
+        func: Coroutine de la tâche, retournant un résumé optionnel
+
+    Returns:
+        Document d'exécution, ou None si un autre worker détient le verrou
+    """
+    if not await acquire_lock(name, settings.scheduler_lock_ttl_seconds):
+        logger.info(f"⏭️  Tâche {name} ignorée: verrou détenu par un autre worker")
+        return None
+
+    run = {
+        "job": name,
+        "worker": WORKER_ID,
+        "started_at": datetime.utcnow(),
+        "statut": "en_cours"
+    }
+    start = time.perf_counter()
+    try:
+        run["resultat"] = await func()
+        run["statut"] = "succes"
+    except Exception as e:
+        run["statut"] = "echec"
+        run["erreur"] = str(e)
+        logger.error(f"❌ Tâche {name} en échec: {e}", exc_info=True)
+    finally:
+        run["finished_at"] = datetime.utcnow()
+        run["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        await release_lock(name)
+
+    await db.scheduler_runs.insert_one(run)
+    logger.info(f"⏱️  Tâche {name}: {run['statut']} en {run['duration_ms']} ms")
+    return run
+
+
+async def get_job_runs(job: Optional[str] = None, limit: int = 50) -> List[dict]:
+    """Obtenir les dernières exécutions (toutes tâches ou une seule)"""
+    query = {"job": job} if job else {}
+    runs = await (
+        db.scheduler_runs.find(query)
+        .sort("started_at", -1)
+        .limit(limit)
+        .max_time_ms(max_time_ms("read"))
+        .to_list(None)
+    )
+    for run in runs:
+        run["id"] = str(run.pop("_id"))
+    return runs
+
+
+# ============================================================================
+# Tâches
+# ============================================================================
+
+async def rafraichir_rollups() -> dict:
+    """
+    Recalculer les agrégats journaliers (prix_journaliers) des derniers jours,
+    ou de tout l'historique si la collection est vide. La fenêtre couvre les
+    collectes hors-ligne synchronisées en retard ; les agrégats de la fenêtre
+    qui n'ont plus de collecte validée sont supprimés.
+
+    Returns:
+        dict: Début de la fenêtre et `couverture` (jours complets agrégés,
+        date exclue ; voir couverture_rollups)
+    """
+    maintenant = datetime.utcnow()
+    couverture = maintenant.replace(hour=0, minute=0, second=0, microsecond=0)
+    depuis = None
+    if await db.prix_journaliers.find_one({}, {"_id": 1}):
+        depuis = couverture - timedelta(days=settings.rollup_refresh_days)
+
+    match = {"statut": "validee"}
+    if depuis is not None:
+        match["date"] = {"$gte": depuis}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "marche_id": "$marche_id",
+                "produit_id": "$produit_id",
+                "unite_id": "$unite_id",
+                "date": {"$dateTrunc": {"date": "$date", "unit": "day"}}
+            },
+            "prix_moyen": {"$avg": "$prix"},
+            "prix_min": {"$min": "$prix"},
+            "prix_max": {"$max": "$prix"},
+            "nombre": {"$sum": 1}
+        }},
+        {"$set": {"updated_at": maintenant}},
+        {"$merge": {
+            "into": "prix_journaliers",
+            "on": "_id",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    # $merge écrit : exécuté sur le primaire
+    await db.collectes_prix.aggregate(
+        pipeline, allowDiskUse=True, maxTimeMS=max_time_ms("analytics")
+    ).to_list(None)
+
+    # Jours de la fenêtre dont les collectes ont été rejetées ou supprimées
+    obsoletes = {"updated_at": {"$lt": maintenant}}
+    if depuis is not None:
+        obsoletes["_id.date"] = {"$gte": depuis}
+    supprimes = (await db.prix_journaliers.delete_many(obsoletes)).deleted_count
+    return {"depuis": depuis, "couverture": couverture, "supprimes": supprimes}
+
+
+async def couverture_rollups() -> Optional[datetime]:
+    """
+    Borne des agrégats journaliers utilisables : les jours antérieurs au jour
+    du dernier rafraîchissement réussi (journée en cours incomplète).
+
+    Returns:
+        Premier jour non couvert par prix_journaliers, ou None si aucun
+        rafraîchissement n'est connu (historique de scheduler_runs)
+    """
+    run = await db.scheduler_runs.find_one(
+        {"job": "rollups_journaliers", "statut": "succes"},
+        sort=[("started_at", -1)]
+    )
+    if run is None:
+        return None
+    return (run.get("resultat") or {}).get("couverture")
+
+
+async def recalculer_alertes_nocturne() -> dict:
+    """Recalcul en lot de toutes les alertes (voir routers.alertes)"""
+    from backend.routers.alertes import recalculer_alertes
+
+    return await recalculer_alertes()
+
+
+async def mettre_a_jour_previsions() -> dict:
+    """Mise à jour incrémentale des prévisions de prix (voir services.forecasting)"""
+    from backend.services.forecasting import update_forecasts
+
+    return await update_forecasts()
+
+
+async def archiver_audit() -> dict:
+    """Archivage des mois d'audit terminés (voir services.audit_archive)"""
+    from backend.services.audit_archive import archiver_audit_logs
+
+    return await archiver_audit_logs()
+
+
+async def resoudre_alertes_obsoletes() -> dict:
+    """
+    Résoudre les alertes actives dont le couple (marché, produit) n'a reçu
+    aucune collecte validée depuis ALERT_STALE_DAYS jours.
+    """
+    maintenant = datetime.utcnow()
+    limite = maintenant - timedelta(days=settings.alert_stale_days)
+
+    actives = await db.alertes.find(
+        {"statut": "active", "created_at": {"$lt": limite}},
+        {"marche_id": 1, "produit_id": 1}
+    ).to_list(None)
+    if not actives:
+        return {"resolues": 0}
+
+    # Couples encore collectés récemment (une seule agrégation)
+    recents = await db.collectes_prix.aggregate([
+        {"$match": {
+            "statut": "validee",
+            "date": {"$gte": limite},
+            "marche_id": {"$in": list({a["marche_id"] for a in actives})}
+        }},
+        {"$group": {"_id": {"marche_id": "$marche_id", "produit_id": "$produit_id"}}}
+    ], maxTimeMS=max_time_ms("analytics")).to_list(None)
+    couples_recents = {(c["_id"]["marche_id"], c["_id"]["produit_id"]) for c in recents}
+
+    obsoletes = [
+        a["_id"] for a in actives
+        if (a["marche_id"], a["produit_id"]) not in couples_recents
+    ]
+    if obsoletes:
+        await db.alertes.update_many(
+            {"_id": {"$in": obsoletes}, "statut": "active"},
+            {"$set": {
+                "statut": "resolue",
+                "motif_resolution": "obsolete",
+                "resolved_at": maintenant,
+                "updated_at": maintenant
+            }}
+        )
+        invalidate_aggregates()
+        await publier_alertes_par_ids(obsoletes)
+    return {"resolues": len(obsoletes)}
+
+
+# Tâches nocturnes (nom, coroutine, minute après ALERT_CALCULATION_HOUR).
+# Les agrégats sont rafraîchis avant le recalcul des alertes.
+JOBS: Dict[str, tuple] = {
+    "rollups_journaliers": (rafraichir_rollups, 0),
+    "recalcul_alertes": (recalculer_alertes_nocturne, 20),
+    "alertes_obsoletes": (resoudre_alertes_obsoletes, 40),
+    "previsions_prix": (mettre_a_jour_previsions, 50),
+    "archives_audit": (archiver_audit, 55),
+}
+
+
+# ============================================================================
+# Cycle de vie
+# ============================================================================
+
+def start_scheduler() -> Optional[AsyncIOScheduler]:
+    """
+    Démarrer le planificateur (appelé dans le lifespan).
+    Chaque worker planifie les tâches ; le verrou garantit une seule exécution.
+    """
+    global _scheduler
+    if not settings.scheduler_enabled or _scheduler is not None:
+        return _scheduler
+
+    _scheduler = AsyncIOScheduler(timezone=settings.scheduler_timezone)
+    for name, (func, minute) in JOBS.items():
+        _scheduler.add_job(
+            run_job,
+            CronTrigger(hour=settings.alert_calculation_hour, minute=minute,
+                        timezone=settings.scheduler_timezone),
+            args=[name, func],
+            id=name,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=3600
+        )
+    _scheduler.start()
+    logger.info(f"⏰ Planificateur démarré ({len(JOBS)} tâches à {settings.alert_calculation_hour}h)")
+    return _scheduler
+
+
+def shutdown_scheduler() -> None:
+    """Arrêter le planificateur sans attendre les tâches en cours"""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+        logger.info("⏰ Planificateur arrêté")
+
+
+def get_scheduler_status() -> dict:
+    """État du planificateur et prochaine exécution de chaque tâche"""
+    if _scheduler is None:
+        return {"enabled": settings.scheduler_enabled, "running": False, "worker": WORKER_ID, "jobs": []}
+    return {
+        "enabled": settings.scheduler_enabled,
+        "running": _scheduler.running,
+        "worker": WORKER_ID,
+        "jobs": [
+            {"id": job.id, "next_run_time": job.next_run_time}
+            for job in _scheduler.get_jobs()
+        ]
+    }
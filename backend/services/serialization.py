@@ -0,0 +1,65 @@
+"""
+Service de sérialisation rapide pour les lectures de confiance.
+Les documents lus en base sont déjà valides : on les met en forme selon le
+modèle de réponse sans repasser par la validation Pydantic.
+"""
+
+from typing import Any, Dict, Iterable, Type
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+# Cache des valeurs par défaut par modèle de réponse
+_model_defaults: Dict[Type[BaseModel], Dict[str, Any]] = {}
+
+
+def _get_defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Obtenir les champs d'un modèle avec leur valeur par défaut.
+    Les champs requis sans valeur par défaut sont associés à None.
+    """
+    defaults = _model_defaults.get(model)
+    if defaults is None:
+        defaults = {
+            name: None if field.is_required() else field.get_default(call_default_factory=True)
+            for name, field in model.model_fields.items()
+        }
+        _model_defaults[model] = defaults
+    return defaults
+
+
+def shape_rows(model: Type[BaseModel], rows: Iterable[dict]) -> list[dict]:
+    """
+    Mettre en forme des documents selon les champs d'un modèle de réponse.
+
+    Args:
+        model: Modèle Pydantic de réponse (ex: CollecteResponse)
+        rows: Documents déjà enrichis (clés = noms des champs du modèle)
+
+    Returns:
+        Liste de dicts contenant exactement les champs du modèle
+    """
+    defaults = _get_defaults(model)
+    return [
+        {name: row.get(name, default) for name, default in defaults.items()}
+        for row in rows
+    ]
+
+
+def trusted_list_response(model: Type[BaseModel], rows: Iterable[dict]) -> ORJSONResponse:
+    """
+    Construire une réponse JSON pour une liste de documents de confiance.
+
+    Retourner directement une Response court-circuite la validation du
+    response_model par FastAPI : le modèle reste déclaré pour la documentation
+    OpenAPI, mais aucune instance Pydantic n'est construite par ligne.
+
+    Args:
+        model: Modèle Pydantic de réponse
+        rows: Documents déjà enrichis
+
+    Returns:
+        ORJSONResponse prête à être envoyée
+    """
+    return ORJSONResponse(shape_rows(model, rows))
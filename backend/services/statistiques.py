@@ -0,0 +1,113 @@
+"""
+Service de statistiques pour SAP.
+Les endpoints /statistiques/resume des collectes et des alertes calculent
+toutes leurs répartitions en une seule agrégation $facet (un seul passage
+sur les documents filtrés), puis résolvent les noms des produits et des
+départements par requêtes $in.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+
+from backend.database import analytics_db, find_by_ids, max_time_ms
+
+
+def normaliser_date(valeur: Optional[str]) -> Optional[str]:
+    """Normaliser un filtre de date (YYYY-MM-DD ou ISO) pour les clés de cache"""
+    return datetime.fromisoformat(valeur).isoformat() if valeur else None
+
+
+def filtre_periode(champ: str, date_debut: Optional[str], date_fin: Optional[str]) -> dict:
+    """Filtre $match sur une période (bornes incluses)"""
+    if not (date_debut or date_fin):
+        return {}
+    date_query = {}
+    if date_debut:
+        date_query["$gte"] = datetime.fromisoformat(date_debut)
+    if date_fin:
+        date_query["$lte"] = datetime.fromisoformat(date_fin)
+    return {champ: date_query}
+
+
+async def calculer_repartitions(collection: str, match: dict, champ_date: str,
+                                groupes: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    Calculer plusieurs répartitions (comptes par valeur) en une agrégation $facet.
+
+    Les répartitions par produit, par marché et par jour sont toujours
+    calculées en plus de `groupes`.
+
+    Args:
+        collection: Collection analysée
+        match: Filtre commun à toutes les répartitions
+        champ_date: Champ daté utilisé pour la répartition par jour
+        groupes: Répartitions supplémentaires (nom → "$champ")
+
+    Returns:
+        dict: Nom de répartition → {valeur: nombre}
+    """
+    groupes = {
+        **groupes,
+        "par_produit": "$produit_id",
+        "par_marche": "$marche_id",
+        "par_jour": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${champ_date}"}}
+    }
+    pipeline = [
+        {"$match": match},
+        {"$facet": {
+            nom: [{"$group": {"_id": expression, "count": {"$sum": 1}}}]
+            for nom, expression in groupes.items()
+        }}
+    ]
+    resultat = await getattr(analytics_db, collection).aggregate(
+        pipeline, maxTimeMS=max_time_ms("analytics")
+    ).to_list(None)
+    facettes = resultat[0] if resultat else {}
+    return {
+        nom: {g["_id"]: g["count"] for g in facettes.get(nom, [])}
+        for nom in groupes
+    }
+
+
+async def ventiler_par_nom(repartitions: Dict[str, Dict]) -> Dict[str, List[dict]]:
+    """
+    Remplacer les répartitions par produit et par marché par des
+    répartitions nommées par produit et par département.
+
+    Returns:
+        dict: par_produit et par_departement, triés par nombre décroissant
+    """
+    par_produit = repartitions.pop("par_produit", {})
+    par_marche = repartitions.pop("par_marche", {})
+
+    produits, marches = await asyncio.gather(
+        find_by_ids("produits", par_produit.keys(), {"nom": 1}),
+        find_by_ids("marches", par_marche.keys(), {"commune_id": 1})
+    )
+    communes = await find_by_ids(
+        "communes", {m.get("commune_id") for m in marches.values()}, {"departement_id": 1}
+    )
+    departements = await find_by_ids(
+        "departements", {c.get("departement_id") for c in communes.values()}, {"nom": 1}
+    )
+
+    comptes_departements: Dict[Optional[str], int] = {}
+    for marche_id, count in par_marche.items():
+        commune = communes.get((marches.get(marche_id) or {}).get("commune_id"))
+        departement_id = commune.get("departement_id") if commune else None
+        comptes_departements[departement_id] = comptes_departements.get(departement_id, 0) + count
+
+    def trier(lignes: List[dict]) -> List[dict]:
+        return sorted(lignes, key=lambda l: l["count"], reverse=True)
+
+    return {
+        "par_produit": trier([
+            {"produit_id": pid, "produit_nom": produits.get(pid, {}).get("nom"), "count": count}
+            for pid, count in par_produit.items()
+        ]),
+        "par_departement": trier([
+            {"departement_id": did, "departement_nom": departements.get(did, {}).get("nom"), "count": count}
+            for did, count in comptes_departements.items()
+        ])
+    }
@@ -0,0 +1,254 @@
+"""
+Service des seuils d'alerte pour SAP.
+Les seuils par défaut viennent de la configuration (ALERT_THRESHOLD_*) et
+peuvent être surchargés par catégorie de produit ou par produit dans la
+collection seuils_alertes. L'ensemble est compilé en une table en mémoire
+(un seuil résolu par produit) : classer un couple (marché, produit) ne
+demande aucune lecture MongoDB.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+from bson import ObjectId
+
+from backend.config import settings
+from backend.database import db
+
+logger = logging.getLogger(__name__)
+
+
+NIVEAUX = ("surveillance", "alerte", "urgence")
+PORTEES = ("categorie", "produit")
+
+# Document de version partagé entre workers (incrémenté à chaque modification)
+VERSION_ID = "seuils_alertes"
+
+Seuils = Tuple[float, float, float]
+
+
+class ThresholdTable:
+    """
+    Table compilée des seuils (surveillance, alerte, urgence) en pourcentage.
+    Immuable : un rechargement construit une nouvelle table.
+
+    Args:
+        defaut: Seuils par défaut
+        par_categorie: Surcharges par catégorie
+        par_produit: Seuils résolus par produit (produit > catégorie > défaut)
+        version: Version des surcharges en base
+    """
+
+    __slots__ = ("defaut", "par_categorie", "par_produit", "version", "loaded_at")
+
+    def __init__(self, defaut: Seuils, par_categorie: Optional[Dict[str, Seuils]] = None,
+                 par_produit: Optional[Dict[str, Seuils]] = None, version: int = 0):
+        self.defaut = defaut
+        self.par_categorie = par_categorie or {}
+        self.par_produit = par_produit or {}
+        self.version = version
+        self.loaded_at = datetime.utcnow()
+
+    def for_produit(self, produit_id: Optional[str]) -> Seuils:
+        """Seuils applicables à un produit (défaut si inconnu)"""
+        return self.par_produit.get(produit_id, self.defaut)
+
+    def classify(self, ecart_pourcent: float, produit_id: Optional[str] = None) -> str:
+        """
+        Niveau d'alerte correspondant à un écart au prix de référence.
+
+        Args:
+            ecart_pourcent: Écart en pourcentage
+            produit_id: Produit concerné (seuils surchargés éventuels)
+
+        Returns:
+            "normal", "surveillance", "alerte" ou "urgence"
+        """
+        surveillance, alerte, urgence = self.par_produit.get(produit_id, self.defaut)
+        if ecart_pourcent >= urgence:
+            return "urgence"
+        if ecart_pourcent >= alerte:
+            return "alerte"
+        if ecart_pourcent >= surveillance:
+            return "surveillance"
+        return "normal"
+
+
+def default_thresholds() -> Seuils:
+    """Seuils par défaut issus de la configuration"""
+    return (
+        float(settings.alert_threshold_surveillance),
+        float(settings.alert_threshold_alerte),
+        float(settings.alert_threshold_urgence)
+    )
+
+
+# Table courante : seuils par défaut tant que load_thresholds() n'a pas tourné
+_table = ThresholdTable(default_thresholds())
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def get_threshold_table() -> ThresholdTable:
+    """Obtenir la table de seuils courante"""
+    return _table
+
+
+def _seuils(doc: dict) -> Seuils:
+    return tuple(float(doc[niveau]) for niveau in NIVEAUX)
+
+
+# ============================================================================
+# Chargement et rafraîchissement
+# ============================================================================
+
+async def load_thresholds() -> ThresholdTable:
+    """
+    Compiler la table des seuils depuis MongoDB et la rendre courante.
+    Appelé au démarrage puis à chaque changement de version.
+    """
+    global _table
+
+    version_doc = await db.config_versions.find_one({"_id": VERSION_ID})
+    overrides = await db.seuils_alertes.find().to_list(None)
+
+    par_categorie = {o["cible_id"]: _seuils(o) for o in overrides if o["portee"] == "categorie"}
+    surcharges_produit = {o["cible_id"]: _seuils(o) for o in overrides if o["portee"] == "produit"}
+
+    defaut = default_thresholds()
+    par_produit = {}
+    if par_categorie or surcharges_produit:
+        produits = await db.produits.find({}, {"id_categorie": 1}).to_list(None)
+        for produit in produits:
+            produit_id = str(produit["_id"])
+            seuils = surcharges_produit.get(produit_id) or par_categorie.get(produit.get("id_categorie"))
+            if seuils and seuils != defaut:
+                par_produit[produit_id] = seuils
+
+    _table = ThresholdTable(
+        defaut, par_categorie, par_produit,
+        version=version_doc["version"] if version_doc else 0
+    )
+    logger.info(
+        f"📏 Seuils d'alerte chargés (version {_table.version}, "
+        f"{len(par_categorie)} catégorie(s), {len(par_produit)} produit(s) surchargé(s))"
+    )
+    return _table
+
+
+async def refresh_if_changed() -> bool:
+    """
+    Recharger la table si un autre worker a modifié les seuils.
+
+    Returns:
+        True si la table a été rechargée
+    """
+    version_doc = await db.config_versions.find_one({"_id": VERSION_ID})
+    version = version_doc["version"] if version_doc else 0
+    if version == _table.version:
+        return False
+    await load_thresholds()
+    return True
+
+
+async def notify_thresholds_changed() -> None:
+    """
+    Signaler une modification (seuils ou catégorie d'un produit) : incrémente
+    la version partagée et recharge la table de ce worker immédiatement.
+    """
+    await db.config_versions.update_one(
+        {"_id": VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    await load_thresholds()
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.thresholds_refresh_seconds)
+        try:
+            await refresh_if_changed()
+        except Exception as e:
+            logger.warning(f"⚠️  Rafraîchissement des seuils impossible: {e}")
+
+
+async def start_thresholds() -> None:
+    """Charger la table et surveiller les changements (appelé dans le lifespan)"""
+    global _refresh_task
+    try:
+        await load_thresholds()
+    except Exception as e:
+        logger.warning(f"⚠️  Seuils par défaut utilisés: {e}")
+    if _refresh_task is None and settings.thresholds_refresh_seconds > 0:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_thresholds() -> None:
+    """Arrêter la surveillance des changements"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+
+
+# ============================================================================
+# Surcharges
+# ============================================================================
+
+async def list_overrides() -> List[dict]:
+    """Lister les surcharges de seuils"""
+    overrides = await db.seuils_alertes.find().sort([("portee", 1), ("cible_id", 1)]).to_list(None)
+    for override in overrides:
+        override["id"] = str(override.pop("_id"))
+    return overrides
+
+
+async def upsert_override(portee: str, cible_id: str, seuils: dict, user_id: str) -> dict:
+    """
+    Créer ou remplacer la surcharge d'une catégorie ou d'un produit.
+
+    Args:
+        portee: "categorie" ou "produit"
+        cible_id: ID de la catégorie ou du produit
+        seuils: {"surveillance": ..., "alerte": ..., "urgence": ...}
+        user_id: Auteur de la modification
+
+    Returns:
+        La surcharge enregistrée
+    """
+    override = {
+        "portee": portee,
+        "cible_id": cible_id,
+        **{niveau: float(seuils[niveau]) for niveau in NIVEAUX},
+        "updated_by": user_id,
+        "updated_at": datetime.utcnow()
+    }
+    await db.seuils_alertes.update_one(
+        {"portee": portee, "cible_id": cible_id},
+        {"$set": override},
+        upsert=True
+    )
+    await notify_thresholds_changed()
+    return override
+
+
+async def delete_override(portee: str, cible_id: str) -> bool:
+    """Supprimer une surcharge (retour aux seuils hérités)"""
+    result = await db.seuils_alertes.delete_one({"portee": portee, "cible_id": cible_id})
+    if result.deleted_count:
+        await notify_thresholds_changed()
+    return bool(result.deleted_count)
+
+
+async def target_exists(portee: str, cible_id: str) -> bool:
+    """Vérifier que la catégorie ou le produit ciblé existe"""
+    if not ObjectId.is_valid(cible_id):
+        return False
+    collection = db.categories_produit if portee == "categorie" else db.produits
+    return await collection.find_one({"_id": ObjectId(cible_id)}, {"_id": 1}) is not None
@@ -0,0 +1,268 @@
+"""
+Révocation des tokens JWT pour SAP.
+
+Deux formes de révocation, enregistrées dans la collection revoked_tokens
+(purgée par index TTL à l'expiration des tokens concernés) :
+- un token précis (claim jti), ex: déconnexion d'une session ;
+- tous les tokens d'un utilisateur émis avant un instant (claim iat), ex:
+  déconnexion de partout ou compte compromis.
+
+Chaque worker garde la liste en mémoire : un filtre de Bloom écarte en
+O(1) les jti jamais révoqués (cas de presque toutes les requêtes), un
+ensemble exact confirme les autres. La liste est synchronisée de façon
+incrémentale toutes les TOKEN_REVOCATION_REFRESH_SECONDS secondes et
+reconstruite complètement toutes les TOKEN_REVOCATION_REBUILD_SECONDS
+secondes (retrait des entrées expirées).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
+import hashlib
+import logging
+import math
+import time
+
+from pymongo import IndexModel
+
+from backend.config import settings
+from backend.database import db
+
+logger = logging.getLogger(__name__)
+
+
+# Recouvrement de la synchronisation incrémentale (écritures concurrentes
+# d'autres workers horodatées juste avant la dernière lecture)
+MARGE_SYNCHRONISATION = timedelta(seconds=5)
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom : faux positifs possibles (taux `taux_erreur` à pleine
+    capacité), jamais de faux négatif.
+
+    Args:
+        capacite: Nombre d'éléments prévus
+        taux_erreur: Taux de faux positifs visé
+    """
+
+    def __init__(self, capacite: int, taux_erreur: float = 0.01):
+        self.capacite = max(1, capacite)
+        self.nb_bits = max(64, int(-self.capacite * math.log(taux_erreur) / math.log(2) ** 2))
+        self.nb_hachages = max(1, round(self.nb_bits / self.capacite * math.log(2)))
+        self._bits = bytearray((self.nb_bits + 7) // 8)
+        self.nombre = 0
+
+    def _positions(self, valeur: str):
+        # Double hachage (Kirsch-Mitzenmacher) à partir d'un seul condensat
+        condensat = hashlib.blake2b(valeur.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(condensat[:8], "little")
+        h2 = int.from_bytes(condensat[8:], "little") | 1
+        return ((h1 + i * h2) % self.nb_bits for i in range(self.nb_hachages))
+
+    def ajouter(self, valeur: str) -> None:
+        for position in self._positions(valeur):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.nombre += 1
+
+    def __contains__(self, valeur: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(valeur))
+
+
+class RevocationList:
+    """
+    Liste de révocation en mémoire.
+
+    Args:
+        jtis: jti révoqués
+        coupures: user_id -> timestamp (secondes) avant lequel les tokens sont révoqués
+    """
+
+    def __init__(self, jtis: Optional[Set[str]] = None, coupures: Optional[Dict[str, int]] = None):
+        self.jtis: Set[str] = set()
+        self.coupures: Dict[str, int] = {}
+        self.bloom = BloomFilter(max(1024, 2 * len(jtis or ())))
+        for jti in jtis or ():
+            self.ajouter_jti(jti)
+        for user_id, avant in (coupures or {}).items():
+            self.ajouter_coupure(user_id, avant)
+
+    def ajouter_jti(self, jti: str) -> None:
+        if jti in self.jtis:
+            return
+        if self.bloom.nombre >= self.bloom.capacite:
+            # Capacité dépassée : filtre agrandi pour garder le taux d'erreur
+            self.bloom = BloomFilter(2 * self.bloom.capacite)
+            for existant in self.jtis:
+                self.bloom.ajouter(existant)
+        self.jtis.add(jti)
+        self.bloom.ajouter(jti)
+
+    def ajouter_coupure(self, user_id: str, avant: int) -> None:
+        self.coupures[user_id] = max(avant, self.coupures.get(user_id, 0))
+
+    def est_revoque(self, payload: dict) -> bool:
+        """Vérifier un payload décodé (sans accès à la base)"""
+        jti = payload.get("jti")
+        if jti and jti in self.bloom and jti in self.jtis:
+            return True
+        avant = self.coupures.get(payload.get("sub"))
+        return avant is not None and payload.get("iat", 0) < avant
+
+
+_liste = RevocationList()
+_synchronise_jusqua: Optional[datetime] = None
+
+
+def est_revoque(payload: dict) -> bool:
+    """Vérifier si un token décodé a été révoqué (lookup en mémoire)"""
+    return _liste.est_revoque(payload)
+
+
+def _appliquer(doc: dict) -> None:
+    if doc.get("jti"):
+        _liste.ajouter_jti(doc["jti"])
+    elif doc.get("user_id"):
+        _liste.ajouter_coupure(doc["user_id"], doc["avant"])
+
+
+def _expiration(exp: Optional[int]) -> datetime:
+    """Date d'expiration d'un token (durée maximale si inconnue)"""
+    if exp:
+        return datetime.utcfromtimestamp(exp)
+    return datetime.utcnow() + timedelta(days=settings.jwt_refresh_token_expire_days)
+
+
+# ============================================================================
+# Révocation
+# ============================================================================
+
+async def revoquer_token(payload: dict, revoque_par: Optional[str] = None) -> bool:
+    """
+    Révoquer un token précis (jti) jusqu'à son expiration.
+
+    Args:
+        payload: Payload décodé du token
+        revoque_par: Utilisateur à l'origine de la révocation
+
+    Returns:
+        False si le token n'a pas de jti (émis avant la révocation par jti)
+    """
+    jti = payload.get("jti")
+    if not jti:
+        return False
+    doc = {
+        "jti": jti,
+        "user_id": payload.get("sub"),
+        "type": payload.get("type"),
+        "revoque_par": revoque_par,
+        "revoked_at": datetime.utcnow(),
+        "expire_at": _expiration(payload.get("exp"))
+    }
+    await db.revoked_tokens.update_one({"_id": f"jti:{jti}"}, {"$setOnInsert": doc}, upsert=True)
+    _appliquer(doc)
+    return True
+
+
+async def revoquer_utilisateur(user_id: str, revoque_par: Optional[str] = None) -> int:
+    """
+    Révoquer tous les tokens d'un utilisateur émis jusqu'à maintenant.
+
+    Les tokens émis dans la même seconde sont inclus (iat en secondes) ;
+    l'entrée expire quand le plus long token possible (refresh) a expiré.
+
+    Returns:
+        int: Instant de coupure (timestamp en secondes)
+    """
+    maintenant = datetime.utcnow()
+    avant = int(time.time()) + 1
+    doc = {
+        "user_id": user_id,
+        "avant": avant,
+        "revoque_par": revoque_par,
+        "revoked_at": maintenant,
+        "expire_at": maintenant + timedelta(days=settings.jwt_refresh_token_expire_days, seconds=60)
+    }
+    await db.revoked_tokens.update_one(
+        {"_id": f"user:{user_id}"},
+        {"$max": {"avant": avant}, "$set": {k: v for k, v in doc.items() if k != "avant"}},
+        upsert=True
+    )
+    _appliquer(doc)
+    return avant
+
+
+# ============================================================================
+# Synchronisation
+# ============================================================================
+
+async def charger_revocations() -> int:
+    """Reconstruire la liste en mémoire (entrées non expirées)"""
+    global _liste, _synchronise_jusqua
+    maintenant = datetime.utcnow()
+    docs = await db.revoked_tokens.find({"expire_at": {"$gt": maintenant}}).to_list(None)
+    _liste = RevocationList(
+        {d["jti"] for d in docs if d.get("jti")},
+        {d["user_id"]: d["avant"] for d in docs if not d.get("jti") and d.get("user_id")}
+    )
+    _synchronise_jusqua = max((d["revoked_at"] for d in docs), default=maintenant)
+    logger.info(f"🔑 Révocations chargées: {len(_liste.jtis)} token(s), {len(_liste.coupures)} utilisateur(s)")
+    return len(docs)
+
+
+async def synchroniser() -> int:
+    """Appliquer les révocations écrites par les autres workers"""
+    global _synchronise_jusqua
+    if _synchronise_jusqua is None:
+        _synchronise_jusqua = datetime.utcnow()
+    docs = await db.revoked_tokens.find(
+        {"revoked_at": {"$gt": _synchronise_jusqua - MARGE_SYNCHRONISATION}}
+    ).to_list(None)
+    for doc in docs:
+        _appliquer(doc)
+        _synchronise_jusqua = max(_synchronise_jusqua, doc["revoked_at"])
+    return len(docs)
+
+
+async def _refresh_loop() -> None:
+    derniere_reconstruction = asyncio.get_running_loop().time()
+    while True:
+        await asyncio.sleep(settings.token_revocation_refresh_seconds)
+        try:
+            if asyncio.get_running_loop().time() - derniere_reconstruction >= settings.token_revocation_rebuild_seconds:
+                await charger_revocations()
+                derniere_reconstruction = asyncio.get_running_loop().time()
+            else:
+                await synchroniser()
+        except Exception as e:
+            logger.warning(f"⚠️  Synchronisation des révocations impossible: {e}")
+
+
+async def start_revocation() -> None:
+    """Charger les révocations et synchroniser (appelé dans le lifespan)"""
+    global _refresh_task
+    try:
+        await charger_revocations()
+    except Exception as e:
+        logger.warning(f"⚠️  Révocations non chargées: {e}")
+    if _refresh_task is None and settings.token_revocation_refresh_seconds > 0:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_revocation() -> None:
+    """Arrêter la synchronisation"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+
+
+def revocation_indexes() -> List[IndexModel]:
+    """Purge à l'expiration et synchronisation incrémentale"""
+    return [IndexModel("expire_at", expireAfterSeconds=0), IndexModel("revoked_at")]
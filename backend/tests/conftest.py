@@ -0,0 +1,202 @@
+"""
+Fixtures des tests backend.
+
+Par défaut, l'application tourne sur une base MongoDB en mémoire
+(mongomock-motor, voir requirements-dev.txt) : les tests s'exécutent dans
+tous les environnements. Les commandes passées à mongomock sont transmises
+au listener de commandes (services.mongo_monitoring) sous forme
+d'événements synthétiques, pour que la détection N+1 fonctionne comme avec
+le driver.
+
+SAP_TEST_MONGODB_URL désigne une vraie base (avec données de référence,
+python -m backend.scripts.seed_data) pour les tests marqués `mongodb_reel`,
+ignorés sinon.
+
+Usage:
+    python -m pytest backend/tests
+    SAP_TEST_MONGODB_URL=mongodb://localhost:27017 python -m pytest backend/tests
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import itertools
+import os
+import threading
+import time
+
+import pytest
+
+MONGODB_REEL = os.environ.get("SAP_TEST_MONGODB_URL")
+
+os.environ.setdefault("MONGODB_URL", MONGODB_REEL or "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB_NAME", "sap_test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-" + "x" * 32)
+os.environ.setdefault("MFA_ENCRYPTION_KEY", "test")
+os.environ.setdefault("SCHEDULER_ENABLED", "False")
+os.environ.setdefault("AUDIT_BUFFER_ENABLED", "False")
+
+from bson import ObjectId  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import backend.database as database  # noqa: E402
+from backend.services.auth import create_access_token  # noqa: E402
+from backend.services.mongo_monitoring import command_metrics  # noqa: E402
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "mongodb_reel: nécessite SAP_TEST_MONGODB_URL")
+
+
+def pytest_collection_modifyitems(config, items):
+    if MONGODB_REEL:
+        ignores = [item for item in items if "mongodb_reel" not in item.keywords]
+        raison = "SAP_TEST_MONGODB_URL défini : seuls les tests mongodb_reel s'exécutent"
+    else:
+        ignores = [item for item in items if "mongodb_reel" in item.keywords]
+        raison = "SAP_TEST_MONGODB_URL non défini"
+    for item in ignores:
+        item.add_marker(pytest.mark.skip(reason=raison))
+
+
+# ============================================================================
+# Base en mémoire
+# ============================================================================
+
+# Méthodes de mongomock traduites en commandes MongoDB (nom, document)
+_COMMANDES = {
+    "find": lambda nom, filtre=None, *a, **k: ("find", {"find": nom, "filter": filtre or {}}),
+    "aggregate": lambda nom, pipeline, *a, **k: ("aggregate", {"aggregate": nom, "pipeline": pipeline}),
+    "distinct": lambda nom, cle, filtre=None, *a, **k: ("distinct", {"distinct": nom, "query": filtre or {}}),
+    "count_documents": lambda nom, filtre, *a, **k: ("aggregate", {"aggregate": nom, "pipeline": [{"$match": filtre}]}),
+    "update_one": lambda nom, filtre, *a, **k: ("update", {"update": nom, "updates": [{"q": filtre}]}),
+    "update_many": lambda nom, filtre, *a, **k: ("update", {"update": nom, "updates": [{"q": filtre}]}),
+    "find_one_and_update": lambda nom, filtre, *a, **k: ("findAndModify", {"findAndModify": nom, "query": filtre}),
+    "delete_many": lambda nom, filtre, *a, **k: ("delete", {"delete": nom, "deletes": [{"q": filtre}]}),
+}
+
+_identifiants = itertools.count(1)
+_imbrication = threading.local()
+
+
+def _instrumenter(methode: str, origine):
+    """Émettre started/succeeded autour d'un appel mongomock (appel externe seulement)"""
+    def appel(self, *args, **kwargs):
+        if getattr(_imbrication, "actif", False):
+            return origine(self, *args, **kwargs)
+        nom, commande = _COMMANDES[methode](self.name, *args, **kwargs)
+        evenement = SimpleNamespace(command_name=nom, command=commande, request_id=next(_identifiants))
+        command_metrics.started(evenement)
+        _imbrication.actif = True
+        debut = time.perf_counter()
+        try:
+            return origine(self, *args, **kwargs)
+        finally:
+            _imbrication.actif = False
+            evenement.duration_micros = int((time.perf_counter() - debut) * 1e6)
+            command_metrics.succeeded(evenement)
+    return appel
+
+
+if not MONGODB_REEL:
+    import mongomock.collection
+    from mongomock_motor import AsyncMongoMockClient
+
+    for _methode in _COMMANDES:
+        setattr(
+            mongomock.collection.Collection, _methode,
+            _instrumenter(_methode, getattr(mongomock.collection.Collection, _methode))
+        )
+
+    class ClientEnMemoire(AsyncMongoMockClient):
+        """Client mongomock-motor acceptant les options du driver"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+
+    database.AsyncIOMotorClient = ClientEnMemoire
+
+
+# ============================================================================
+# Application et données
+# ============================================================================
+
+@pytest.fixture(scope="session")
+def client():
+    from backend.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def db(client):
+    return database.get_database()
+
+
+async def inserer_referentiel(db, collectes: int = 20) -> dict:
+    """
+    Insérer un référentiel minimal (département, commune, unité, catégorie,
+    produit, marché, décideur) et des collectes validées quotidiennes.
+
+    Returns:
+        dict: Identifiants (chaînes) des documents créés
+    """
+    suffixe = str(ObjectId())  # Noms et codes uniques d'un référentiel à l'autre
+    departement = (await db.departements.insert_one({"code": f"D{suffixe}", "nom": f"Ouest {suffixe}", "actif": True})).inserted_id
+    commune = (await db.communes.insert_one({
+        "code": f"C{suffixe}", "nom": f"Port-au-Prince {suffixe}", "departement_id": str(departement),
+        "type_zone": "urbaine", "actif": True
+    })).inserted_id
+    unite = (await db.unites_mesure.insert_one({"unite": f"Kilogramme {suffixe}", "symbole": "kg"})).inserted_id
+    categorie = (await db.categories_produit.insert_one({"nom": f"Céréales {suffixe}"})).inserted_id
+    produit = (await db.produits.insert_one({
+        "nom": f"Riz {suffixe}", "code": f"P{suffixe}", "id_categorie": str(categorie),
+        "id_unite_mesure": str(unite), "actif": True
+    })).inserted_id
+    marche = (await db.marches.insert_one({
+        "nom": f"Croix-des-Bossales {suffixe}", "code": f"M{suffixe}", "commune_id": str(commune),
+        "type_marche": "quotidien", "actif": True,
+        "produits": [{"id_produit": str(produit), "id_unite_mesure": str(unite), "actif": True}]
+    })).inserted_id
+    decideur = (await db.users.insert_one({
+        "email": f"decideur-{suffixe}@sap.ht", "password_hash": "x", "roles": ["décideur"],
+        "nom": "Test", "prenom": "Décideur", "actif": True, "created_at": datetime.utcnow()
+    })).inserted_id
+
+    jour = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if collectes:
+        await db.collectes_prix.insert_many([{
+            "marche_id": str(marche), "produit_id": str(produit), "unite_id": str(unite),
+            "quantite": 1, "prix": 100 + i % 5, "date": jour - timedelta(days=i),
+            "periode": "matin1", "agent_id": str(decideur), "statut": "validee",
+            "created_at": datetime.utcnow()
+        } for i in range(collectes)])
+
+    return {
+        "departement": str(departement), "commune": str(commune), "unite": str(unite),
+        "categorie": str(categorie), "produit": str(produit), "marche": str(marche),
+        "decideur": str(decideur)
+    }
+
+
+def entetes_utilisateur(user_id: str) -> dict:
+    """En-tête Authorization d'un token d'accès pour `user_id`"""
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+@pytest.fixture
+def creer_referentiel(client, db):
+    """Fabrique de référentiels : creer_referentiel(collectes=20) -> identifiants"""
+    return lambda collectes=20: client.portal.call(inserer_referentiel, db, collectes)
+
+
+@pytest.fixture
+def referentiel(creer_referentiel) -> dict:
+    """Référentiel minimal et 20 jours de collectes validées (voir inserer_referentiel)"""
+    return creer_referentiel()
+
+
+@pytest.fixture
+def entetes(referentiel) -> dict:
+    """En-têtes d'authentification du décideur du référentiel"""
+    return entetes_utilisateur(referentiel["decideur"])
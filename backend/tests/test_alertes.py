@@ -0,0 +1,55 @@
+"""
+Réévaluation des alertes après une décision en lot sur des collectes.
+"""
+
+from datetime import datetime, timedelta
+
+from backend.routers import alertes
+from backend.services.auth import create_access_token
+
+
+def inserer_collecte(client, db, ids: dict, prix: float, jours: int) -> str:
+    """Insérer une collecte validée datée d'il y a `jours` jours"""
+    jour = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=jours)
+    resultat = client.portal.call(db.collectes_prix.insert_one, {
+        "marche_id": ids["marche"], "produit_id": ids["produit"], "unite_id": ids["unite"],
+        "quantite": 1, "prix": prix, "date": jour, "periode": "matin1",
+        "agent_id": ids["decideur"], "statut": "validee", "created_at": datetime.utcnow()
+    })
+    return str(resultat.inserted_id)
+
+
+def attendre_reevaluation(client) -> None:
+    """Attendre la fin de la réévaluation mise en file (planifier_reevaluation)"""
+    async def attendre():
+        if alertes._reevaluation is not None:
+            await alertes._reevaluation
+    client.portal.call(attendre)
+
+
+def test_rejet_resout_l_alerte_d_un_couple_plus_evaluable(client, db, creer_referentiel):
+    ids = creer_referentiel(collectes=0)
+    for jours in (10, 11, 12):
+        inserer_collecte(client, db, ids, 100, jours)
+    recente = inserer_collecte(client, db, ids, 300, 0)
+
+    client.portal.call(alertes.recalculer_alertes)
+    couple = {"marche_id": ids["marche"], "produit_id": ids["produit"]}
+    alerte = client.portal.call(db.alertes.find_one, {**couple, "statut": "active"})
+    assert alerte is not None
+
+    # Sans la collecte rejetée, plus aucune collecte récente : couple non évaluable
+    reponse = client.post(
+        "/api/collectes/batch/rejeter",
+        json={"ids": [recente], "motif": "Prix aberrant"},
+        headers={"Authorization": f"Bearer {create_access_token({'sub': ids['decideur']})}"}
+    )
+    assert reponse.status_code == 200
+    assert reponse.json()["couples_reevalues"] == 1
+    attendre_reevaluation(client)
+
+    alerte = client.portal.call(db.alertes.find_one, {"_id": alerte["_id"]})
+    assert alerte["statut"] == "resolue"
+    assert alerte["motif_resolution"] == "donnees_insuffisantes"
+    assert client.portal.call(db.alertes.count_documents, {**couple, "statut": "active"}) == 0
+
@@ -0,0 +1,33 @@
+"""
+Décisions en lot sur les collectes (validation, rejet).
+"""
+
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def test_compteurs_du_rejet_en_lot(client, db, creer_referentiel, entetes):
+    ids = creer_referentiel(collectes=0)
+    autre = creer_referentiel(collectes=0)
+
+    def inserer(referentiel: dict) -> str:
+        return str(client.portal.call(db.collectes_prix.insert_one, {
+            "marche_id": referentiel["marche"], "produit_id": referentiel["produit"],
+            "unite_id": referentiel["unite"], "quantite": 1, "prix": 100,
+            "date": datetime.utcnow(), "periode": "matin1", "agent_id": referentiel["decideur"],
+            "statut": "en_attente", "created_at": datetime.utcnow()
+        }).inserted_id)
+
+    selection = [inserer(ids), inserer(autre), str(ObjectId()), "invalide"]
+    reponse = client.post(
+        "/api/collectes/batch/rejeter",
+        json={"ids": selection, "marche_id": ids["marche"], "motif": "Doublon"},
+        headers=entetes
+    )
+    assert reponse.status_code == 200
+    resultat = reponse.json()
+    assert resultat["modifiees"] == 1
+    # Collecte de l'autre marché : existante mais hors sélection, pas introuvable
+    assert resultat["hors_selection"] == 1
+    assert resultat["introuvables"] == 2
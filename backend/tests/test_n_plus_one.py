@@ -0,0 +1,80 @@
+"""
+Détection N+1 sur les routes de liste les plus sollicitées.
+
+Parcourt les routes de liste avec un décideur et échoue si la détection
+N+1 (services.mongo_monitoring, seuil MONGODB_N_PLUS_ONE_THRESHOLD) a
+produit des rapports. Par défaut sur la base en mémoire (voir conftest) ;
+test_routes_de_liste_base_reelle rejoue le parcours sur SAP_TEST_MONGODB_URL.
+"""
+
+from bson import ObjectId
+import pytest
+
+from backend.config import settings
+from backend.services.mongo_monitoring import (
+    RequestDbStats, check_n_plus_one, clear_n_plus_one_reports,
+    current_request_db_stats, get_n_plus_one_reports
+)
+from backend.services.auth import create_access_token
+
+
+# Routes de liste des pages principales (tableau de bord, collectes, référentiels)
+ROUTES_LISTE = [
+    "/api/collectes",
+    "/api/marches",
+    "/api/produits",
+    "/api/alertes",
+    "/api/dashboard",
+    "/api/departements",
+    "/api/communes",
+    "/api/unites-mesure",
+    "/api/categories-produit",
+]
+
+
+def parcourir(client, entetes: dict, routes: list) -> list:
+    """Appeler chaque route (200 attendu) et retourner les rapports N+1"""
+    clear_n_plus_one_reports()
+    for route in routes:
+        reponse = client.get(route, headers=entetes)
+        assert reponse.status_code == 200, f"GET {route}: {reponse.status_code}"
+    return get_n_plus_one_reports()
+
+
+def test_detection_des_requetes_repetees(client, db):
+    """La détection signale une même forme de requête répétée (contrôle du montage)"""
+    async def repeter():
+        stats = RequestDbStats()
+        jeton = current_request_db_stats.set(stats)
+        try:
+            for _ in range(settings.mongodb_n_plus_one_threshold + 1):
+                await db.produits.find_one({"_id": ObjectId()})
+        finally:
+            current_request_db_stats.reset(jeton)
+        return check_n_plus_one("GET", "/test", stats)
+
+    rapports = client.portal.call(repeter)
+    assert len(rapports) == 1
+    assert rapports[0]["collection"] == "produits"
+    assert rapports[0]["count"] == settings.mongodb_n_plus_one_threshold + 1
+
+
+def test_routes_de_liste_sans_n_plus_un(client, entetes):
+    rapports = parcourir(client, entetes, ROUTES_LISTE)
+    assert rapports == [], f"Requêtes N+1 détectées: {rapports}"
+
+
+@pytest.mark.mongodb_reel
+def test_routes_de_liste_base_reelle(client, db):
+    """Même parcours sur une base réelle, grille de saisie comprise ($lookup pipeline)"""
+    decideur = client.portal.call(db.users.find_one, {"roles": "décideur", "actif": True})
+    if decideur is None:
+        pytest.skip("Aucun décideur actif (python -m backend.scripts.seed_data)")
+    entetes = {"Authorization": f"Bearer {create_access_token({'sub': str(decideur['_id'])})}"}
+
+    routes = list(ROUTES_LISTE)
+    marches = client.get("/api/marches", headers=entetes).json()
+    if marches:
+        routes.append(f"/api/collectes/grille?marche_id={marches[0]['id']}")
+    rapports = parcourir(client, entetes, routes)
+    assert rapports == [], f"Requêtes N+1 détectées: {rapports}"
@@ -4,7 +4,7 @@
  */
 
 import auth from '../modules/auth.js';
-import api from '../modules/api.js';
+import api, { API_BASE_URL } from '../modules/api.js';
 import { Card, Button, Modal, showToast, Spinner, Badge } from '../modules/ui.js';
 
 export default function AlertesPage() {
@@ -958,8 +958,112 @@ export default function AlertesPage() {
         }
     }
 
+    // Flux temps réel : les alertes créées, mises à jour ou résolues sont
+    // poussées par le serveur (Server-Sent Events) au lieu de recharger la liste
+    let eventSource = null;
+    let lastEventId = null;
+    let reopenTimer = null;
+    let reopenDelay = 0;
+
+    async function startAlertStream() {
+        if (!api.getAccessToken() || typeof EventSource === 'undefined' || !container.isConnected) {
+            return;
+        }
+
+        // EventSource ne peut pas envoyer d'en-tête Authorization : le token
+        // d'accès (rafraîchi si besoin par api.post) est échangé contre un
+        // ticket à usage unique, seul élément placé dans l'URL
+        let ticket;
+        try {
+            ({ ticket } = await api.post('/api/alertes/flux/ticket', {}));
+        } catch (error) {
+            scheduleReopen();
+            return;
+        }
+        if (!container.isConnected) {
+            return;
+        }
+
+        let url = `${API_BASE_URL}/api/alertes/flux?ticket=${encodeURIComponent(ticket)}`;
+        if (lastEventId) {
+            url += `&last_event_id=${encodeURIComponent(lastEventId)}`;
+        }
+        eventSource = new EventSource(url);
+        eventSource.onopen = () => {
+            reopenDelay = 0;
+        };
+        ['alerte.creee', 'alerte.mise_a_jour', 'alerte.resolue'].forEach(type => {
+            eventSource.addEventListener(type, (event) => {
+                if (!container.isConnected) {
+                    stopAlertStream();
+                    return;
+                }
+                lastEventId = event.lastEventId || lastEventId;
+                applyAlerteEvent(type, JSON.parse(event.data));
+            });
+        });
+        // Token d'accès expiré ou révoqué : nouveau ticket tout de suite
+        eventSource.addEventListener('session.expiree', () => {
+            stopAlertStream();
+            startAlertStream();
+        });
+        // La reconnexion automatique réutiliserait le ticket déjà consommé :
+        // le flux est rouvert avec un nouveau ticket (et Last-Event-ID)
+        eventSource.onerror = () => {
+            stopAlertStream();
+            scheduleReopen();
+        };
+    }
+
+    function scheduleReopen() {
+        if (reopenTimer || !container.isConnected) {
+            return;
+        }
+        reopenDelay = Math.min(reopenDelay ? reopenDelay * 2 : 5000, 60000);
+        reopenTimer = setTimeout(() => {
+            reopenTimer = null;
+            startAlertStream();
+        }, reopenDelay);
+    }
+
+    function stopAlertStream() {
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
+    }
+
+    function applyAlerteEvent(type, alerte) {
+        const index = alertes.findIndex(a => a.id === alerte.id);
+
+        if (type === 'alerte.resolue') {
+            // La liste n'affiche que les alertes actives
+            if (index >= 0) {
+                alertes.splice(index, 1);
+            }
+        } else if (index >= 0) {
+            alertes[index] = { ...alerte, vue: alertes[index].vue };
+        } else {
+            alertes.unshift({ ...alerte, vue: false });
+        }
+
+        filterAlertes();
+        updateTableAndStats();
+    }
+
+    // Fermer le flux en quittant la page
+    window.addEventListener('hashchange', () => {
+        setTimeout(() => {
+            if (!container.isConnected) {
+                stopAlertStream();
+                clearTimeout(reopenTimer);
+                reopenTimer = null;
+            }
+        }, 0);
+    });
+
     // Initialisation
-    loadAll();
+    loadAll().then(startAlertStream);
 
     return container;
 }
@@ -1,6 +1,7 @@
 /**
  * Page Collectes du Jour
- * Affiche uniquement les collectes du jour avec tableau paginé et recherche
+ * Affiche la grille du jour d'un marché (GET /api/collectes/grille) avec
+ * tableau paginé et recherche
  */
 
 import auth from '../modules/auth.js';
@@ -12,7 +13,7 @@ export default function CollectesJourPage() {
     container.className = 'space-y-6';
 
     // État
-    let collectes = [];
+    let grille = null;
     let marches = [];
     let produits = [];
     let isLoading = true;
@@ -68,7 +69,6 @@ export default function CollectesJourPage() {
 
         const marcheSelect = document.createElement('select');
         marcheSelect.className = 'w-full rounded-lg border-gray-300 p-2 border focus:ring-2 focus:ring-green-500';
-        marcheSelect.innerHTML = '<option value="">Tous les marchés</option>';
         marches.forEach(m => {
             const option = document.createElement('option');
             option.value = m.id;
@@ -79,7 +79,7 @@ export default function CollectesJourPage() {
         marcheSelect.addEventListener('change', (e) => {
             searchFilters.marche = e.target.value;
             currentPage = 1;
-            render();
+            loadGrille();
         });
 
         marcheDiv.appendChild(marcheLabel);
@@ -118,9 +118,14 @@ export default function CollectesJourPage() {
         resetBtn.className = 'w-full px-4 py-2 bg-gray-200 text-gray-700 rounded-lg hover:bg-gray-300 transition';
         resetBtn.textContent = 'Réinitialiser';
         resetBtn.addEventListener('click', () => {
-            searchFilters = { marche: '', produit: '' };
+            const marcheChange = searchFilters.marche !== (marches[0]?.id || '');
+            searchFilters = { marche: marches[0]?.id || '', produit: '' };
             currentPage = 1;
-            render();
+            if (marcheChange) {
+                loadGrille();
+            } else {
+                render();
+            }
         });
 
         resetDiv.appendChild(resetBtn);
@@ -140,45 +145,22 @@ export default function CollectesJourPage() {
         const section = document.createElement('div');
         section.className = 'bg-white rounded-lg shadow overflow-hidden';
 
-        // Filtrer les collectes du jour
-        const today = new Date().toISOString().split('T')[0];
-        let filteredCollectes = collectes.filter(c => {
-            const collecteDate = new Date(c.date).toISOString().split('T')[0];
-            return collecteDate === today;
-        });
-
-        if (searchFilters.marche) {
-            filteredCollectes = filteredCollectes.filter(c => c.marche_id === searchFilters.marche);
-        }
+        // Lignes de la grille (une par produit, une case par période)
+        let lignes = grille ? grille.produits : [];
 
         if (searchFilters.produit) {
-            filteredCollectes = filteredCollectes.filter(c => c.produit_id === searchFilters.produit);
+            lignes = lignes.filter(l => l.produit_id === searchFilters.produit);
         }
 
-        // Grouper les collectes par marché, produit
-        const groupedCollectes = {};
-        filteredCollectes.forEach(c => {
-            const key = `${c.marche_id}_${c.produit_id}`;
-            if (!groupedCollectes[key]) {
-                groupedCollectes[key] = {
-                    marche_id: c.marche_id,
-                    marche_nom: c.marche_nom,
-                    produit_id: c.produit_id,
-                    produit_nom: c.produit_nom,
-                    date: c.date,
-                    matin1: null,
-                    matin2: null,
-                    soir1: null,
-                    soir2: null
-                };
-            }
-
-            if (c.periode) {
-                groupedCollectes[key][c.periode] = c.prix;
-            }
-        });
-
-        const groupedArray = Object.values(groupedCollectes);
+        const groupedArray = lignes.map(l => ({
+            marche_nom: grille.marche.nom,
+            produit_nom: l.produit_nom,
+            date: grille.date,
+            matin1: l.prix.matin1 ? l.prix.matin1.prix : null,
+            matin2: l.prix.matin2 ? l.prix.matin2.prix : null,
+            soir1: l.prix.soir1 ? l.prix.soir1.prix : null,
+            soir2: l.prix.soir2 ? l.prix.soir2.prix : null
+        }));
 
         // Pagination
         const totalItems = groupedArray.length;
@@ -193,7 +175,9 @@ export default function CollectesJourPage() {
 
         const headerTitle = document.createElement('h2');
         headerTitle.className = 'text-lg font-semibold text-gray-900';
-        headerTitle.textContent = `Total: ${totalItems} collecte(s) aujourd'hui`;
+        headerTitle.textContent = grille
+            ? `${totalItems} produit(s) - ${grille.cases_saisies}/${grille.cases_attendues} prix saisis aujourd'hui`
+            : 'Aucun marché sélectionné';
 
         // Sélecteur items par page
         const itemsPerPageDiv = document.createElement('div');
@@ -340,24 +324,48 @@ export default function CollectesJourPage() {
         });
     }
 
+    // Charger la grille du jour du marché sélectionné
+    async function loadGrille() {
+        if (!searchFilters.marche) {
+            grille = null;
+            isLoading = false;
+            render();
+            return;
+        }
+        try {
+            isLoading = true;
+            render();
+
+            const params = new URLSearchParams({ marche_id: searchFilters.marche });
+            grille = await api.get(`/api/collectes/grille?${params.toString()}`);
+        } catch (error) {
+            console.error('Erreur lors du chargement de la grille:', error);
+            grille = null;
+            showToast({
+                message: 'Erreur lors du chargement des collectes du jour',
+                type: 'error'
+            });
+        }
+        isLoading = false;
+        render();
+    }
+
     // Charger les données
     async function loadData() {
         try {
             isLoading = true;
             render();
 
-            const [collectesData, marchesData, produitsData] = await Promise.all([
-                api.get('/api/collectes'),
+            const [marchesData, produitsData] = await Promise.all([
                 api.get('/api/marches'),
                 api.get('/api/produits')
             ]);
 
-            collectes = collectesData;
             marches = marchesData;
             produits = produitsData;
+            searchFilters.marche = marches[0]?.id || '';
 
-            isLoading = false;
-            render();
+            await loadGrille();
         } catch (error) {
             console.error('Erreur lors du chargement:', error);
             showToast({
@@ -2669,15 +2669,17 @@ export default function CollectesPage() {
                 date: formData.date
             });
 
-            const collectes = await api.get(`/api/collectes?${params.toString()}`);
+            // Grille du jour : une ligne par produit, une case par période
+            const grille = await api.get(`/api/collectes/grille?${params.toString()}`);
 
             // Indexer par produit_id et periode
             existingCollectes = {};
-            collectes.forEach(c => {
-                if (c.periode) {
-                    const key = `${c.produit_id}_${c.periode}`;
-                    existingCollectes[key] = c;
-                }
+            grille.produits.forEach(ligne => {
+                Object.entries(ligne.prix).forEach(([periode, cellule]) => {
+                    if (cellule) {
+                        existingCollectes[`${ligne.produit_id}_${periode}`] = cellule;
+                    }
+                });
             });
 
         } catch (error) {
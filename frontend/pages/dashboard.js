@@ -119,15 +119,9 @@ export default function DashboardPage() {
             ));
 
             // Tuile 2: Collectes du jour
-            const today = new Date().toISOString().split('T')[0];
-            const collectesToday = collectes.filter(c => {
-                const collecteDate = new Date(c.date).toISOString().split('T')[0];
-                return collecteDate === today;
-            }).length;
-
             statsGrid.appendChild(renderStatCard(
                 'Collectes du jour',
-                collectesToday,
+                stats.collectes_du_jour || 0,
                 'Voir mes collectes d\'aujourd\'hui',
                 'success',
                 () => window.location.hash = '#/collectes-jour'
@@ -418,28 +412,17 @@ export default function DashboardPage() {
     // Chargement des données
     async function loadData() {
         try {
-            // Charger les statistiques selon les rôles
-            if (auth.hasRole('agent')) {
-                const statsData = await api.get('/api/collectes/statistiques/resume');
-                stats = statsData;
+            // Tous les widgets du rôle en un seul appel (calculés et mis en cache côté serveur)
+            const dashboard = await api.get('/api/dashboard');
 
-                const collectesData = await api.get('/api/collectes?limit=10');
-                collectes = collectesData;
+            if (auth.hasRole('agent')) {
+                stats = dashboard.collectes;
+                collectes = dashboard.dernieres_collectes || [];
             }
 
             if (auth.hasRole('décideur')) {
-                const [alertesStats, alertesData] = await Promise.all([
-                    api.get('/api/alertes/statistiques/resume'),
-                    api.get('/api/alertes?limit=10')
-                ]);
-
-                stats = {
-                    alertes_actives: alertesStats.total_alertes_actives || 0,
-                    alertes_urgentes: alertesStats.par_niveau?.urgence || 0,
-                    marches_surveilles: 0 // À implémenter
-                };
-
-                alertes = alertesData;
+                stats = dashboard.alertes;
+                alertes = dashboard.dernieres_alertes || [];
             }
 
             // Les bailleurs n'ont pas besoin de charger de statistiques
@@ -122,6 +122,11 @@ self.addEventListener('fetch', (event) => {
         return;
     }
 
+    // Ignorer les flux temps réel (Server-Sent Events) : ni cache ni relais
+    if (request.headers.get('Accept') === 'text/event-stream') {
+        return;
+    }
+
     // ═══════════════════════════════════════════════════════
     // MODE ONLINE : Network First (toujours données fraîches)
     // ═══════════════════════════════════════════════════════